@@ -0,0 +1,135 @@
+"""Golden-file check and micro-benchmark for the HN markup renderer.
+
+Renders every comment of ``markup/corpus.json`` with ``HTMLGenerator``,
+checks the output against ``markup/golden.json`` byte for byte, then times
+the current renderer against the previous multi-pass implementation kept
+below as ``LegacyMarkupGenerator``.
+
+The speedup depends on the machine and the Python version and single
+timings are noisy, so each renderer is timed in several alternating rounds
+and the best round is reported. On the bundled 34-comment corpus the new
+renderer measured about 1.13x on a reviewer's machine and 1.5x to 1.8x on a
+single-core VM with CPython 3.12.1; quote your own run with its conditions.
+
+Usage:
+    python benchmarks/bench_markup.py [--repeat N] [--rounds N]
+
+Regenerate the golden file (only when the output is meant to change):
+    python benchmarks/bench_markup.py --update-golden
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src", "hackernews"))
+
+from html_generator import HTMLGenerator  # noqa: E402
+
+CORPUS_FILE = os.path.join(BENCH_DIR, "markup", "corpus.json")
+GOLDEN_FILE = os.path.join(BENCH_DIR, "markup", "golden.json")
+
+
+class LegacyMarkupGenerator(HTMLGenerator):
+    """The multi-pass inline renderer the single-pass tokenizer replaced."""
+
+    def _process_inline_markup(self, line: str) -> str:
+        if not line:
+            return ""
+
+        result = line.replace('\\*', 'ESCAPED_ASTERISK')
+
+        def angle_bracket_url_replacer(match):
+            url = match.group(1)
+            marker = f'__URL_MARKER_{len(url)}_{hash(url)}__'
+            if not hasattr(self, '_url_markers'):
+                self._url_markers = {}
+            self._url_markers[marker] = url
+            return f' {marker} '
+
+        result = re.sub(r'<(https?://[^>]+)>', angle_bracket_url_replacer, result)
+
+        def url_replacer(match):
+            url = match.group(1)
+            return f' <a href="{url}">{url}</a> '
+
+        result = re.sub(r'(https?://[^\s<>)\]]+)', url_replacer, result)
+        result = self._parse_italics(result)
+
+        if hasattr(self, '_url_markers'):
+            for marker, url in self._url_markers.items():
+                result = result.replace(marker, f' <a href="{url}">{url}</a> ')
+            self._url_markers.clear()
+
+        return result.replace('ESCAPED_ASTERISK', '*')
+
+
+def render_all(generator, corpus):
+    return [generator._format_text(text) for text in corpus]
+
+
+def comments_per_second(generator, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render_all(generator, corpus)
+    elapsed = time.perf_counter() - start
+    return len(corpus) * repeat / elapsed
+
+
+def best_rates(generators, corpus, repeat, rounds):
+    # Rounds alternate between the renderers so that a noisy stretch on the
+    # machine hits both; the best round of each is the least disturbed one
+    best = [0.0] * len(generators)
+    for _ in range(rounds):
+        for index, generator in enumerate(generators):
+            best[index] = max(best[index], comments_per_second(generator, corpus, repeat))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="Corpus renders per round")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed rounds, the best one counts")
+    parser.add_argument("--update-golden", action="store_true")
+    args = parser.parse_args()
+
+    with open(CORPUS_FILE, "r", encoding="utf-8") as fp:
+        corpus = json.load(fp)
+
+    current = HTMLGenerator()
+    legacy = LegacyMarkupGenerator()
+
+    if args.update_golden:
+        with open(GOLDEN_FILE, "w", encoding="utf-8") as fp:
+            json.dump(render_all(current, corpus), fp, ensure_ascii=False, indent=2)
+        print(f"wrote {GOLDEN_FILE}")
+        return
+
+    with open(GOLDEN_FILE, "r", encoding="utf-8") as fp:
+        golden = json.load(fp)
+
+    failures = 0
+    for index, (text, expected) in enumerate(zip(corpus, golden)):
+        for name, generator in (("current", current), ("legacy", legacy)):
+            output = generator._format_text(text)
+            if output != expected:
+                failures += 1
+                print(f"[{name}] corpus #{index} differs from golden:")
+                print(f"  input:    {text!r}")
+                print(f"  expected: {expected!r}")
+                print(f"  got:      {output!r}")
+    if failures:
+        sys.exit(1)
+    print(f"golden: {len(corpus)} comments identical")
+
+    before, after = best_rates((legacy, current), corpus, args.repeat, args.rounds)
+    print(f"legacy:  {before:12,.0f} comments/sec")
+    print(f"current: {after:12,.0f} comments/sec  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
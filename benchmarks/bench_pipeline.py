@@ -0,0 +1,310 @@
+"""Offline benchmark of the full download -> EPUB -> PDF pipeline.
+
+All HTTP traffic (Algolia, Firebase, origin pages, images) is replayed from
+a fixture set through ``http_client.set_transport``, so runs are repeatable
+and comparable between commits. Caches are disabled, every run is cold.
+
+Reports wall time and peak RSS per stage, request counts per host and a set
+of per-stage micro-benchmarks as JSON.
+
+Usage:
+    python benchmarks/bench_pipeline.py [-o report.json] [--compare old.json]
+    python benchmarks/bench_pipeline.py --fixtures DIR        # replay a recording
+    python benchmarks/bench_pipeline.py --record DIR -n 15    # record a live run
+
+Without ``--fixtures`` a synthetic fixture set is generated (see
+``fixtures.synthesize``). Playwright is never launched for the synthetic
+articles, as they pass the content quality check.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src", "hackernews"))
+
+import fixtures  # noqa: E402
+import http_client  # noqa: E402
+from image_cache import configure_image_cache  # noqa: E402
+from item_cache import configure_item_cache  # noqa: E402
+
+
+def peak_rss_kb():
+    """Peak RSS of this process and of its finished children, in KiB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == "darwin":  # bytes instead of KiB
+        own, children = own // 1024, children // 1024
+    return {"self": own, "children": children}
+
+
+class Stages:
+    """Collects wall time and peak RSS of named stages."""
+
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except ImportError as err:
+            # Optional parts of the pipeline (e.g. weasyprint) may be missing
+            self.results[name] = {"skipped": str(err)}
+            print(f"{name:>12}: skipped ({err})")
+            return None
+        wall = time.perf_counter() - start
+        self.results[name] = {"wall_s": round(wall, 4), "peak_rss_kb": peak_rss_kb()}
+        print(f"{name:>12}: {wall:8.3f} s")
+        return result
+
+
+def micro(name, func, repeat, results):
+    """Time ``func`` ``repeat`` times, keeping the best run."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results[name] = {"best_s": round(best, 6), "repeat": repeat}
+    print(f"{name:>28}: {best * 1000:10.2f} ms")
+
+
+def run_micro_benchmarks(store, work_dir, repeat):
+    """Per-stage benchmarks on the fixture data, without the event loop."""
+    from concat_htmls import html_files_to_pdf
+    from content_quality import score_content
+    from handlers.default import convert_trafilatura_tables
+    from hn_models import Story
+    from html_document import parse_html
+    from html_generator import HTMLGenerator
+    from html_img_embedder import compress_image_data
+    from item_stream import prune_item
+
+    items, pages, images = [], [], []
+    for key, entry in sorted(store.index.items()):
+        if "/api/v1/items/" in key:
+            items.append(json.loads(store.body(entry)))
+        elif entry["headers"].get("content-type", "").startswith("text/html"):
+            pages.append(store.body(entry).decode("utf-8"))
+        elif entry["headers"].get("content-type", "").startswith("image/"):
+            images.append(store.body(entry))
+
+    generator = HTMLGenerator(max_depth=3, max_comments_per_level=[5, 2, 1])
+    stories = [Story.from_item(prune_item(item, 3), 3) for item in items]
+    results = {}
+
+    micro("prune_item", lambda: [prune_item(i, 3) for i in items], repeat, results)
+    micro("story_models", lambda: [Story.from_item(i, 3) for i in items], repeat, results)
+    micro("generate_html", lambda: [generator.generate_html(s) for s in stories], repeat, results)
+    micro("score_content", lambda: [score_content(p) for p in pages], repeat, results)
+    micro(
+        "parse_and_convert_tables",
+        lambda: [convert_trafilatura_tables(parse_html(p)) for p in pages],
+        repeat,
+        results,
+    )
+    micro(
+        "compress_images",
+        lambda: [compress_image_data(i, (900, 1200)) for i in images],
+        max(1, repeat // 5),
+        results,
+    )
+
+    chapters = []
+    for n, story in enumerate(stories[:5]):
+        path = os.path.join(work_dir, f"micro_{n}.html")
+        generator.save_html(story, path)
+        chapters.append(path)
+    try:
+        micro(
+            "pdf_5_chapters",
+            lambda: html_files_to_pdf(chapters, os.path.join(work_dir, "micro.pdf")),
+            1,
+            results,
+        )
+    except ImportError as err:
+        results["pdf_5_chapters"] = {"skipped": str(err)}
+    return results
+
+
+def run_pipeline(store, work_dir, num_stories, latency, pdf_workers):
+    """Search, download, EPUB and PDF against the fixture set."""
+    import hacker_spider
+
+    transport = fixtures.ReplayTransport(store, latency=latency)
+    http_client.set_transport(transport)
+    stages = Stages()
+
+    os.makedirs(os.path.join(work_dir, "outs"), exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        hits = stages.run(
+            "search",
+            http_client.run,
+            hacker_spider.search_stories_byTimeRange(num_stories, 0, 2**31),
+        )
+        hit_ids = [hit["objectID"] for hit in hits]
+        chapters = stages.run(
+            "download",
+            http_client.run,
+            hacker_spider.download_stories(
+                hit_ids, save_to_file=True, output_dir="stories/", inline_images=False
+            ),
+        )
+        target_dir = hacker_spider.get_story_dir("stories/")
+        stages.run(
+            "epub",
+            hacker_spider.construct_epub_book,
+            chapters,
+            image_dir=os.path.join(target_dir, "images"),
+        )
+        html_files = [
+            os.path.join(target_dir, name)
+            for name in sorted(os.listdir(target_dir))
+            if name.endswith(".html")
+        ]
+        stages.run(
+            "pdf",
+            hacker_spider.html_files_to_pdf,
+            html_files,
+            "outs/output.pdf",
+            paper_size="A5",
+            workers=pdf_workers,
+        )
+    finally:
+        os.chdir(cwd)
+        http_client.set_transport(None)
+
+    return stages.results, transport.stats(), len(hit_ids)
+
+
+def record(path, num_stories):
+    """Record a live download of last week's top stories into a fixture set."""
+    import hacker_spider
+    from utils import get_time_range_last_week
+
+    store = fixtures.FixtureStore(path)
+    http_client.set_transport(fixtures.RecordingTransport(store))
+    work_dir = tempfile.mkdtemp(prefix="hn-record-")
+    try:
+        start, end = asyncio.run(get_time_range_last_week())
+        hits = http_client.run(
+            hacker_spider.search_stories_byTimeRange(num_stories, start, end)
+        )
+        # Replays search without the time filter, so the query is dropped
+        entry = store.index.pop(
+            next(k for k in store.index if "/api/v1/search" in k)
+        )
+        store.index[fixtures.request_key("GET", fixtures.ALGOLIA + "/search", False)] = entry
+        http_client.run(
+            hacker_spider.download_stories(
+                [hit["objectID"] for hit in hits],
+                output_dir=work_dir + "/",
+                inline_images=False,
+            )
+        )
+    finally:
+        http_client.set_transport(None)
+        store.save()
+    print(f"recorded {len(store.index)} responses into {path}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, old_path):
+    """Print relative changes against an earlier report."""
+    with open(old_path, "r", encoding="utf-8") as fp:
+        old = json.load(fp)
+    print(f"\ncompared with {old_path} ({old.get('commit')}):")
+    for section, key in (("stages", "wall_s"), ("micro", "best_s")):
+        for name, result in report[section].items():
+            before = old.get(section, {}).get(name, {}).get(key)
+            after = result.get(key)
+            if before and after:
+                print(f"  {section}.{name:<26} {before:10.4f} -> {after:10.4f}  ({after / before - 1:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="Fixture set to replay (default: synthetic)")
+    parser.add_argument("--record", metavar="DIR", help="Record a live run into DIR and exit")
+    parser.add_argument("-n", "--stories", type=int, default=15)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per response")
+    parser.add_argument("--pdf-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per micro-benchmark")
+    parser.add_argument("--skip-pipeline", action="store_true")
+    parser.add_argument("-o", "--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Earlier JSON report to compare with")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.stories)
+        return
+
+    configure_item_cache(None)
+    configure_image_cache(None)
+
+    work_dir = tempfile.mkdtemp(prefix="hn-bench-")
+    if args.fixtures:
+        store = fixtures.FixtureStore(args.fixtures)
+    else:
+        store = fixtures.synthesize(os.path.join(work_dir, "fixtures"), args.stories)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "fixtures": args.fixtures or "synthetic",
+        "stages": {},
+        "requests": {},
+        "micro": {},
+    }
+
+    if not args.skip_pipeline:
+        print("pipeline:")
+        report["stages"], report["requests"], report["stories"] = run_pipeline(
+            store, work_dir, args.stories, args.latency, args.pdf_workers
+        )
+        print(f"{'requests':>12}: {report['requests']['total']} ({report['requests']['misses']} without fixture)")
+
+    print("micro-benchmarks:")
+    report["micro"] = run_micro_benchmarks(store, work_dir, args.repeat)
+    report["peak_rss_kb"] = peak_rss_kb()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+        print(f"report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""HTTP fixtures for the offline benchmarks.
+
+A fixture set is a directory holding ``index.json`` and a ``bodies/`` folder.
+The index maps ``"<METHOD> <url>"`` to the recorded status, headers and body
+file of a response. ``ReplayTransport`` answers requests from a fixture set
+in-process, so plugging it into ``http_client.set_transport`` replays a whole
+run without touching the network; ``RecordingTransport`` creates fixture sets
+from real runs.
+
+``synthesize`` writes a deterministic fixture set (search results, story
+items, Firebase rankings, origin articles and images) for when no recording
+is at hand.
+"""
+
+import asyncio
+import collections
+import datetime
+import hashlib
+import io
+import json
+import os
+import random
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+# Headers worth replaying; hop-by-hop and encoding headers would not match
+# the decoded bodies that are stored
+REPLAYED_HEADERS = ("content-type", "etag", "last-modified", "retry-after")
+
+ALGOLIA = "https://hn.algolia.com/api/v1"
+FIREBASE = "https://hacker-news.firebaseio.com/v0"
+ORIGIN_HOST = "origin.bench.test"
+
+
+def request_key(method, url, with_query=True):
+    """Index key of a request; query parameters are sorted."""
+    parts = urlsplit(str(url))
+    query = urlencode(sorted(parse_qsl(parts.query))) if with_query else ""
+    return f"{method.upper()} {urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))}"
+
+
+class FixtureStore:
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Fixture set directory, created if missing
+        """
+        self.path = path
+        self.body_dir = os.path.join(path, "bodies")
+        self.index_path = os.path.join(path, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as fp:
+                self.index = json.load(fp)
+
+    def add(self, method, url, status, headers, body, with_query=True):
+        """Store one response; bodies are deduplicated by content hash."""
+        os.makedirs(self.body_dir, exist_ok=True)
+        body_name = hashlib.sha256(body).hexdigest()[:32]
+        body_path = os.path.join(self.body_dir, body_name)
+        if not os.path.exists(body_path):
+            with open(body_path, "wb") as fp:
+                fp.write(body)
+        self.index[request_key(method, url, with_query)] = {
+            "status": status,
+            "headers": {
+                k: v for k, v in headers.items() if k.lower() in REPLAYED_HEADERS
+            },
+            "body": body_name,
+        }
+
+    def lookup(self, method, url):
+        """Recorded response for a request, matching without the query last."""
+        entry = self.index.get(request_key(method, url))
+        if entry is None:
+            entry = self.index.get(request_key(method, url, with_query=False))
+        return entry
+
+    def body(self, entry):
+        with open(os.path.join(self.body_dir, entry["body"]), "rb") as fp:
+            return fp.read()
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.index_path, "w", encoding="utf-8") as fp:
+            json.dump(self.index, fp, indent=1, sort_keys=True)
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Answers requests from a ``FixtureStore``; unknown requests get a 404."""
+
+    def __init__(self, store, latency=0.0):
+        """
+        Args:
+            store: Fixture set to replay
+            latency: Seconds every response is delayed by, to mimic the network
+        """
+        self.store = store
+        self.latency = latency
+        self.requests = collections.Counter()
+        self.bytes = collections.Counter()
+        self.misses = []
+
+    async def handle_async_request(self, request):
+        host = request.url.host
+        self.requests[host] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        entry = self.store.lookup(request.method, request.url)
+        if entry is None:
+            self.misses.append(str(request.url))
+            return httpx.Response(404, content=b"no fixture", request=request)
+
+        body = self.store.body(entry)
+        self.bytes[host] += len(body)
+        return httpx.Response(
+            entry["status"], headers=entry["headers"], content=body, request=request
+        )
+
+    def stats(self):
+        return {
+            "total": sum(self.requests.values()),
+            "by_host": dict(self.requests),
+            "bytes_by_host": dict(self.bytes),
+            "misses": len(self.misses),
+        }
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards requests to the network and stores every response."""
+
+    def __init__(self, store):
+        self.store = store
+        self.inner = httpx.AsyncHTTPTransport(verify=False)
+
+    async def handle_async_request(self, request):
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        self.store.add(
+            request.method, request.url, response.status_code, response.headers, body
+        )
+        return httpx.Response(
+            response.status_code,
+            headers=[
+                (k, v)
+                for k, v in response.headers.items()
+                if k.lower() not in ("content-encoding", "transfer-encoding", "content-length")
+            ],
+            content=body,
+            request=request,
+        )
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+WORDS = (
+    "latency throughput kernel compiler cache memory database query index "
+    "network protocol packet browser render layout thread lock queue scheduler "
+    "startup founder market revenue license open source community release "
+    "benchmark profile allocation garbage collector runtime type system"
+).split()
+
+
+def _sentence(rng, words=(8, 20)):
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(*words)))
+    return text.capitalize() + "."
+
+
+def _comment_text(rng, comment_id):
+    paragraphs = []
+    for _ in range(rng.randint(1, 3)):
+        sentence = _sentence(rng)
+        roll = rng.random()
+        if roll < 0.2:
+            sentence += f" See https://{ORIGIN_HOST}/ref/{comment_id}"
+        elif roll < 0.35:
+            sentence = sentence.replace(" ", " *really* ", 1)
+        elif roll < 0.45:
+            sentence += f" <https://{ORIGIN_HOST}/doc/{comment_id}>"
+        paragraphs.append(sentence)
+    if rng.random() < 0.1:
+        paragraphs.append("  def f(x):\n      return x * 2")
+    return "\n\n".join(paragraphs)
+
+
+def _image(rng, size):
+    from PIL import Image
+
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    pixels = image.load()
+    for _ in range(200):
+        pixels[rng.randrange(size[0]), rng.randrange(size[1])] = (0, 0, 0)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _article(rng, story_id, image_names):
+    paragraphs = "\n".join(
+        f"<p>{' '.join(_sentence(rng) for _ in range(5))}</p>" for _ in range(12)
+    )
+    images = "\n".join(f'<img src="/img/{name}" alt="figure">' for name in image_names)
+    table = "<table><tr><th>name</th><th>value</th></tr>" + "".join(
+        f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 999)}</td></tr>"
+        for _ in range(5)
+    ) + "</table>"
+    return (
+        f"<html><head><title>Article {story_id}</title></head><body>"
+        f"<nav><a href='/'>Home</a></nav><article><h1>Article {story_id}</h1>"
+        f"{paragraphs}{images}{table}</article></body></html>"
+    ).encode("utf-8")
+
+
+def synthesize(path, stories=15, top_level=(10, 30), seed=0):
+    """Write a deterministic fixture set.
+
+    Args:
+        path: Fixture set directory
+        stories: Number of stories returned by the search
+        top_level: Range of first-level comments per story; each comment
+            gets 0-4 replies down to five levels
+        seed: Random seed
+
+    Returns:
+        The written ``FixtureStore``
+    """
+    rng = random.Random(seed)
+    store = FixtureStore(path)
+    json_headers = {"content-type": "application/json"}
+    created = datetime.datetime(2025, 1, 6, tzinfo=datetime.timezone.utc)
+    next_id = 40_000_000
+
+    hits = []
+    for index in range(stories):
+        story_id = next_id
+        next_id += 1
+        url = f"https://{ORIGIN_HOST}/article/{story_id}"
+        hits.append({"objectID": str(story_id), "title": f"Story {index}", "url": url})
+
+        def build(parent_id, depth, count):
+            nonlocal next_id
+            nodes = []
+            for _ in range(count):
+                comment_id = next_id
+                next_id += 1
+                replies = rng.randint(0, 4) if depth < 4 else 0
+                nodes.append(
+                    {
+                        "id": comment_id,
+                        "author": f"user{rng.randint(1, 500)}",
+                        "text": _comment_text(rng, comment_id),
+                        "points": None,
+                        "parent_id": parent_id,
+                        "created_at": created.isoformat().replace("+00:00", ".000Z"),
+                        "children": build(comment_id, depth + 1, replies),
+                    }
+                )
+            return nodes
+
+        children = build(story_id, 0, rng.randint(*top_level))
+        item = {
+            "id": story_id,
+            "title": f"Story {index}",
+            "url": url,
+            "author": f"user{rng.randint(1, 500)}",
+            "points": rng.randint(10, 2000),
+            "created_at": created.isoformat().replace("+00:00", ".000Z"),
+            "created_at_i": int(created.timestamp()),
+            "type": "story",
+            "children": children,
+        }
+        store.add(
+            "GET", f"{ALGOLIA}/items/{story_id}", 200, json_headers,
+            json.dumps(item).encode("utf-8"),
+        )
+
+        # Firebase gives the official order of every item's replies
+        def rank(node_id, nodes):
+            kids = [node["id"] for node in nodes]
+            rng.shuffle(kids)
+            store.add(
+                "GET", f"{FIREBASE}/item/{node_id}.json", 200, json_headers,
+                json.dumps({"id": node_id, "kids": kids}).encode("utf-8"),
+            )
+            for node in nodes:
+                rank(node["id"], node["children"])
+
+        rank(story_id, children)
+
+        image_names = [f"{story_id}-{n}.png" for n in range(rng.randint(1, 3))]
+        for name in image_names:
+            store.add(
+                "GET", f"https://{ORIGIN_HOST}/img/{name}", 200,
+                {"content-type": "image/png", "etag": f'"{name}"'},
+                _image(rng, (rng.randint(800, 1600), rng.randint(600, 1400))),
+            )
+        store.add(
+            "GET", url, 200, {"content-type": "text/html; charset=utf-8"},
+            _article(rng, story_id, image_names),
+        )
+
+    search = {"hits": hits, "nbPages": 1, "hitsPerPage": len(hits), "page": 0}
+    store.add(
+        "GET", f"{ALGOLIA}/search", 200, json_headers,
+        json.dumps(search).encode("utf-8"), with_query=False,
+    )
+    store.save()
+    return store
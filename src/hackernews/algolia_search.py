@@ -0,0 +1,95 @@
+"""Algolia Hacker News search with concurrent page prefetch.
+
+The first page tells how many pages exist (``nbPages``) and how many hits
+each page holds (``hitsPerPage``); all further pages needed to reach the
+requested number of stories are then fetched concurrently.
+
+Pages are sized to the request, up to Algolia's limit of 1000 hits per page,
+so a search for 1000 stories or fewer is a single request; the prefetch only
+runs for larger searches. The scripts ask for 15 to 50 stories, so today only
+``hngtr search --num`` above 1000 reaches it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+
+import http_client
+from instrumentation import span
+from retry_policy import call_with_retries
+
+URL_ENDPOINT = "https://hn.algolia.com/api/v1"
+
+# Algolia refuses larger pages
+MAX_HITS_PER_PAGE = 1000
+
+
+async def _fetch_page(search_url: str, params: dict, page: int) -> dict:
+    client = http_client.get_client(search_url)
+
+    async def fetch() -> dict:
+        response = await client.get(
+            search_url, params={**params, "page": page}, timeout=5
+        )
+
+        print(
+            f"Fetched {response.url} - {response.status_code}: {response.text if len(response.text) < 1000 else 'maybe normal'}"
+        )
+
+        response.raise_for_status()
+        return response.json()
+
+    return await call_with_retries(fetch, f"search page {page}")
+
+
+async def search_stories(
+    num_stories: int,
+    start_time: int,
+    end_time: int,
+    title: str | None = None,
+) -> list[dict]:
+    """Search stories created within a time range.
+
+    Args:
+        num_stories: Number of stories wanted
+        start_time: Earliest creation timestamp (exclusive)
+        end_time: Latest creation timestamp (exclusive)
+        title: Optional full-text query
+
+    Returns:
+        Up to ``num_stories`` hits, fewer if the results are exhausted
+    """
+    if num_stories <= 0:
+        return []
+
+    with span("search", num_stories=num_stories) as attributes:
+        search_url = URL_ENDPOINT + "/search"
+        params = {
+            "tags": "story",
+            "numericFilters": f"created_at_i>{start_time},created_at_i<{end_time}",
+            "hitsPerPage": min(num_stories, MAX_HITS_PER_PAGE),
+        }
+        if title:
+            params["query"] = title
+
+        first_page = await _fetch_page(search_url, params, 0)
+        hits = list(first_page.get("hits", []))
+
+        nb_pages = first_page.get("nbPages", 1)
+        hits_per_page = first_page.get("hitsPerPage") or params["hitsPerPage"]
+        pages_needed = min(math.ceil(num_stories / hits_per_page), nb_pages)
+
+        if len(hits) < num_stories and pages_needed > 1:
+            pages = await asyncio.gather(
+                *(_fetch_page(search_url, params, page) for page in range(1, pages_needed))
+            )
+            for page in pages:
+                page_hits = page.get("hits", [])
+                if not page_hits:
+                    break
+                hits += page_hits
+
+        attributes["hits"] = len(hits)
+
+    return hits[:num_stories]
@@ -0,0 +1,141 @@
+"""Long-lived Playwright browsers with bounded page pools.
+
+Launching Chromium costs seconds, so one browser per headless mode is kept
+for the whole run and pages are handed out from a bounded pool. Every page
+gets its own browser context so cookies do not leak between sites.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from patchright.async_api import Browser, Page, Playwright, async_playwright
+
+# Default pool sizes: headless pages are cheap, the visible browser used for
+# human verification (xcancel) is kept to a single page
+DEFAULT_POOL_SIZES = {True: 4, False: 1}
+
+
+class BrowserPool:
+
+    def __init__(self, headless: bool = True, max_pages: int = 4):
+        """
+        Args:
+            headless: Whether the browser runs headless
+            max_pages: Maximum number of pages open at the same time
+        """
+        self.headless = headless
+        self.max_pages = max_pages
+        self._semaphore = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+
+    async def _ensure_browser(self) -> Browser:
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(
+                    headless=self.headless
+                )
+        return self._browser
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """Borrow a fresh page, waiting if the pool is exhausted."""
+        async with self._semaphore:
+            browser = await self._ensure_browser()
+            context = await browser.new_context()
+            try:
+                yield await context.new_page()
+            finally:
+                await context.close()
+
+    async def close(self) -> None:
+        """Close the browser and stop Playwright."""
+        async with self._lock:
+            if self._browser is not None:
+                await self._browser.close()
+                self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+# Registry: headless -> pool, bound to one event loop like http_client
+_POOLS: dict[bool, BrowserPool] = {}
+_pools_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_browser_pool(headless: bool = True) -> BrowserPool:
+    """Get the shared pool for a headless mode, creating it on first use."""
+    global _pools_loop
+
+    loop = asyncio.get_running_loop()
+    if _pools_loop is not loop:
+        _POOLS.clear()
+        _pools_loop = loop
+
+    pool = _POOLS.get(headless)
+    if pool is None:
+        pool = BrowserPool(headless, DEFAULT_POOL_SIZES[headless])
+        _POOLS[headless] = pool
+    return pool
+
+
+async def close_browser_pools() -> None:
+    """Close every browser of the current event loop."""
+    pools = list(_POOLS.values())
+    _POOLS.clear()
+    await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
+
+
+async def wait_for_content_ready(
+    page: Page,
+    min_text_length: int = 500,
+    stable_checks: int = 3,
+    interval: float = 0.5,
+    timeout: float = 15.0,
+) -> None:
+    """Wait until the page text stops changing instead of sleeping blindly.
+
+    The page counts as ready once its visible text has not changed length for
+    ``stable_checks`` polls and is at least ``min_text_length`` characters
+    long. Pages that stay short are accepted after twice as many stable polls.
+
+    Args:
+        page: Page to watch
+        min_text_length: Text length that counts as real content
+        stable_checks: Number of unchanged polls required
+        interval: Seconds between polls
+        timeout: Maximum seconds to wait
+    """
+    deadline = time.monotonic() + timeout
+    last_length = -1
+    stable = 0
+
+    while time.monotonic() < deadline:
+        try:
+            length = await page.evaluate(
+                "() => document.body ? document.body.innerText.length : 0"
+            )
+        except Exception:
+            # Navigation in progress, the execution context was destroyed
+            length = -1
+
+        if length == last_length:
+            stable += 1
+        else:
+            stable = 0
+            last_length = length
+
+        if length >= min_text_length and stable >= stable_checks:
+            return
+        if stable >= stable_checks * 2:
+            return
+
+        await asyncio.sleep(interval)
@@ -0,0 +1,145 @@
+"""Build manifest for incremental story builds.
+
+The manifest lives next to the generated chapters (``stories/YYYY-M/``) and
+records, for every story, a hash of its inputs (item JSON with the comments
+in their ranked order, plus generator settings) and the artifacts produced
+from them. A story whose input hash is unchanged and whose artifacts still
+exist does not need to be rendered again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = "manifest.json"
+
+# Bump when the rendering code changes in a way that invalidates old chapters
+MANIFEST_VERSION = 2
+
+
+def input_hash(item: dict, settings: dict) -> str:
+    """Hash a story item together with the settings used to render it.
+
+    Args:
+        item: Story item as returned by the Algolia ``/items/`` endpoint,
+            after ranking, so that a new official comment order changes the hash
+        settings: Generator settings affecting the output
+
+    Returns:
+        Hex digest identifying this exact input
+    """
+    digest = hashlib.sha256()
+    digest.update(str(MANIFEST_VERSION).encode("utf-8"))
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    digest.update(json.dumps(item, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class BuildManifest:
+
+    def __init__(self, target_dir: str):
+        """
+        Load the manifest of a story folder, or start an empty one.
+
+        Args:
+            target_dir: Folder holding the generated chapters
+        """
+        self.target_dir = target_dir
+        self.path = os.path.join(target_dir, MANIFEST_NAME)
+        self.stories: dict[str, dict] = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as fp:
+                    data = json.load(fp)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.stories = data.get("stories", {})
+            except (OSError, ValueError) as err:
+                print(f"manifest {self.path} unreadable, rebuilding: {err}")
+
+    def _artifact_exists(self, entry: dict, name: str) -> bool:
+        artifact = entry.get("artifacts", {}).get(name)
+        return artifact is not None and os.path.exists(
+            os.path.join(self.target_dir, artifact)
+        )
+
+    def is_current(self, story_id: int | str, story_hash: str) -> bool:
+        """Whether the rendered discussion chapter is up to date.
+
+        Args:
+            story_id: Hacker News story ID
+            story_hash: Current ``input_hash`` of the story
+
+        Returns:
+            True if the recorded hash matches and the chapter file exists
+        """
+        entry = self.stories.get(str(story_id))
+        return (
+            entry is not None
+            and entry.get("input_hash") == story_hash
+            and self._artifact_exists(entry, "html")
+        )
+
+    def origin_reusable(
+        self, story_id: int | str, url: str | None, inline_images: bool
+    ) -> bool:
+        """Whether a previously fetched origin page can be reused.
+
+        Origin pages do not depend on comments, so they are reused whenever
+        the story URL and image mode are unchanged and the last fetch succeeded.
+        """
+        entry = self.stories.get(str(story_id))
+        return (
+            entry is not None
+            and entry.get("url") == url
+            and entry.get("inline_images") == inline_images
+            and not entry.get("origin_error", True)
+            and self._artifact_exists(entry, "origin")
+        )
+
+    def record(
+        self,
+        story_id: int | str,
+        story_hash: str,
+        title: str,
+        url: str | None,
+        artifacts: dict[str, str],
+        origin_error: bool,
+        inline_images: bool,
+    ) -> None:
+        """Record the outputs of a story and save the manifest.
+
+        Args:
+            story_id: Hacker News story ID
+            story_hash: ``input_hash`` the artifacts were built from
+            title: Story title
+            url: Story URL
+            artifacts: Artifact name -> file name relative to the story folder
+            origin_error: Whether fetching the origin page failed
+            inline_images: Whether the origin page inlines its images
+        """
+        self.stories[str(story_id)] = {
+            "input_hash": story_hash,
+            "title": title,
+            "url": url,
+            "artifacts": artifacts,
+            "origin_error": origin_error,
+            "inline_images": inline_images,
+            "updated_at": time.time(),
+        }
+        self.save()
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(
+                {"version": MANIFEST_VERSION, "stories": self.stories},
+                fp,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
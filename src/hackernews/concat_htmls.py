@@ -1,37 +1,20 @@
 import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
 from tqdm import tqdm
 
-def html_files_to_pdf(html_files, output_pdf, paper_size="A4"):
-    import os
-    from weasyprint import HTML, CSS
-    from weasyprint.text.fonts import FontConfiguration
+from instrumentation import span
 
-    """
-    将多个HTML文件合并为一个PDF文件，每个HTML文件从新页面开始
+try:
+    from pypdf import PdfWriter
+except ImportError:  # pypdf 是必需依赖，缺失时（如未同步的环境）退回串行渲染
+    PdfWriter = None
 
-    Args:
-        html_files: HTML文件路径列表
-        output_pdf: 输出PDF文件路径
-        paper_size: 纸张大小，如'A4', 'Letter', 'Legal'等
-    """
-    # 创建字体配置
-    html_files.sort()
-    html_files.reverse()
-    font_config = FontConfiguration()
 
-    # # 定义基础CSS样式，确保每个HTML从新页面开始
-    # base_css = CSS(
-    #     string=f"""
-    #     @page {{
-    #         size: {paper_size};
-    #         margin: 1in;
-    #     }}
-    #     .new-page {{
-    #         page-break-before: always;
-    #     }}
-    # """,
-    #     font_config=font_config,
-    # )
+def _build_stylesheets(paper_size, page_break, font_config):
+    from weasyprint import CSS
 
     # 自定义边距和方向
     base_css = CSS(
@@ -59,40 +42,110 @@ def html_files_to_pdf(html_files, output_pdf, paper_size="A4"):
     """,
         font_config=font_config,
     )
+    if not page_break:
+        return [base_css]
 
-    # 创建PDF文档
-    all_docs = []
-    for i, html_file in tqdm(enumerate(html_files), total=len(html_files)):
+    # 添加分页样式
+    specific_css = CSS(
+        string="body { page-break-before: always; }", font_config=font_config
+    )
+    return [base_css, specific_css]
+
+
+def _render_html_file(html_file, paper_size, page_break, font_config=None):
+    from weasyprint import HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    if font_config is None:
+        font_config = FontConfiguration()
+
+    html_text = open(html_file, "r", encoding="utf-8").read()
+    html_text = html.unescape(html_text)
+    # base_url 让章节中 images/ 下的本地图片引用按文件路径解析
+    html_ = HTML(string=html_text, base_url=os.path.abspath(html_file))
+    return html_.render(
+        stylesheets=_build_stylesheets(paper_size, page_break, font_config),
+        font_config=font_config,
+    )
+
+
+def _render_html_file_to_pdf(html_file, paper_size, page_break):
+    """在子进程中渲染单个章节，返回 PDF 字节"""
+    return _render_html_file(html_file, paper_size, page_break).write_pdf()
+
+
+def html_files_to_pdf(html_files, output_pdf, paper_size="A4", workers=1):
+    """
+    将多个HTML文件合并为一个PDF文件，每个HTML文件从新页面开始
+
+    Args:
+        html_files: HTML文件路径列表
+        output_pdf: 输出PDF文件路径
+        paper_size: 纸张大小，如'A4', 'Letter', 'Legal'等
+        workers: 并行渲染的进程数。大于 1 时每个章节在进程池中单独渲染为
+            PDF 再按顺序合并（需要 pypdf），否则在当前进程中逐个渲染
+    """
+    html_files.sort()
+    html_files.reverse()
+
+    # 保留原始序号：第一个文件不添加分页，其他文件添加分页
+    chapters = []
+    for i, html_file in enumerate(html_files):
         if not os.path.exists(html_file):
             print(f"警告: 文件 {html_file} 不存在，跳过")
             continue
+        chapters.append((html_file, i > 0))
 
-        # print(f"处理文件: {html_file}")
-        # 为每个HTML文件创建文档对象
-        html_text = open(html_file, "r", encoding="utf-8").read()
-        html_text = html.unescape(html_text)
-        html_ = HTML(string=html_text)
-
-        # 如果是第一个文档，不添加分页；其他文档添加分页
-        if i > 0:
-            # 添加分页样式
-            specific_css = CSS(
-                string="body { page-break-before: always; }", font_config=font_config
-            )
-            all_docs.append(
-                html_.render(
-                    stylesheets=[base_css, specific_css], font_config=font_config
+    if not chapters:
+        print("错误: 没有有效的HTML文件可处理")
+        return
+
+    if workers > 1 and PdfWriter is None:
+        print("警告: 未安装 pypdf，无法并行渲染，改为串行渲染")
+        workers = 1
+
+    with span("pdf.render", chapters=len(chapters), workers=workers):
+        _write_pdf(chapters, output_pdf, paper_size, workers)
+    print(f"PDF已保存至: {output_pdf}")
+
+
+def _write_pdf(chapters, output_pdf, paper_size, workers):
+    from weasyprint.text.fonts import FontConfiguration
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pdfs = list(
+                tqdm(
+                    pool.map(
+                        _render_html_file_to_pdf,
+                        [html_file for html_file, _ in chapters],
+                        [paper_size] * len(chapters),
+                        [page_break for _, page_break in chapters],
+                    ),
+                    total=len(chapters),
                 )
             )
-        else:
-            all_docs.append(
-                html_.render(stylesheets=[base_css], font_config=font_config)
-            )
 
-    if not all_docs:
-        print("错误: 没有有效的HTML文件可处理")
+        # 按章节顺序合并
+        writer = PdfWriter()
+        for pdf in pdfs:
+            writer.append(BytesIO(pdf))
+        with open(output_pdf, "wb") as fp:
+            writer.write(fp)
+        writer.close()
         return
 
+    # 创建字体配置
+    font_config = FontConfiguration()
+
+    # 创建PDF文档
+    all_docs = []
+    for html_file, page_break in tqdm(chapters, total=len(chapters)):
+        # 为每个HTML文件创建文档对象
+        all_docs.append(
+            _render_html_file(html_file, paper_size, page_break, font_config)
+        )
+
     # 合并所有文档
     first_doc = all_docs[0]
     for doc in all_docs[1:]:
@@ -100,7 +153,6 @@ def html_files_to_pdf(html_files, output_pdf, paper_size="A4"):
 
     # 保存PDF
     first_doc.write_pdf(output_pdf)
-    print(f"PDF已保存至: {output_pdf}")
 
 
 if __name__ == "__main__":
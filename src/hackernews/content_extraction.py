@@ -0,0 +1,223 @@
+"""Article extraction with trafilatura, off the event loop.
+
+``trafilatura.extract`` is synchronous lxml work that takes hundreds of
+milliseconds on big pages, during which every other download would be
+frozen. ``extract_content`` runs it in a worker pool (processes by default,
+threads selectable) and gives up after a per-document timeout, so one
+pathological page turns into an empty extraction instead of stalling the run.
+In process mode the stuck worker is killed; a stuck thread cannot be stopped
+and keeps running until trafilatura returns. Pages smaller than
+``inline_threshold`` are cheap enough to extract inline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import weakref
+from concurrent.futures import (
+    BrokenExecutor,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any
+from urllib.parse import urlparse
+
+import trafilatura
+
+from instrumentation import count, span
+
+EXTRACTION_MODES = ("process", "thread")
+
+# Options passed to ``trafilatura.extract``
+EXTRACT_OPTIONS: dict[str, Any] = {
+    "output_format": "html",
+    "include_formatting": False,  # Must be False to preserve table content with bold tags
+    "favor_recall": True,
+    "include_tables": True,
+    "include_images": True,
+}
+
+# Pool settings, see ``configure_extraction``
+_EXTRACTION_CONFIG: dict[str, Any] = {
+    "mode": "process",
+    "max_workers": min(4, os.cpu_count() or 1),
+    "timeout": 20.0,
+    "inline_threshold": 16 * 1024,
+}
+_pool: Executor | None = None
+
+# Documents handed to the pool at once, so the timeout only counts the time a
+# worker spends on the document; bound to the event loop it was created on
+_slots: asyncio.Semaphore | None = None
+_slots_loop: asyncio.AbstractEventLoop | None = None
+
+# Process pools killed after a timeout; documents that were running next to
+# the stuck one fail with ``BrokenProcessPool`` and are retried once
+_terminated: weakref.WeakSet[Executor] = weakref.WeakSet()
+
+# Queue every worker of a process pool reports its PID to when it starts, so
+# the workers of a stuck pool can be killed
+_worker_pids: weakref.WeakKeyDictionary[Executor, Any] = weakref.WeakKeyDictionary()
+
+
+def configure_extraction(
+    mode: str | None = None,
+    max_workers: int | None = None,
+    timeout: float | None = None,
+    inline_threshold: int | None = None,
+) -> None:
+    """Configure the extraction pool.
+
+    Args:
+        mode: ``"process"`` or ``"thread"``
+        max_workers: Workers in the pool, 0 extracts on the event loop
+        timeout: Seconds one document may take before it is given up on
+        inline_threshold: Pages smaller than this many characters are
+            extracted on the event loop
+
+    Raises:
+        ValueError: Unknown mode
+    """
+    global _slots_loop
+    if mode is not None and mode not in EXTRACTION_MODES:
+        raise ValueError(f"unknown extraction mode {mode!r}, expected one of {EXTRACTION_MODES}")
+
+    updates = {
+        "mode": mode,
+        "max_workers": max_workers,
+        "timeout": timeout,
+        "inline_threshold": inline_threshold,
+    }
+    for key, value in updates.items():
+        if value is not None:
+            _EXTRACTION_CONFIG[key] = value
+
+    if mode is not None or max_workers is not None:
+        _discard_pool(_pool)
+        _slots_loop = None
+
+
+def _get_pool() -> Executor | None:
+    global _pool
+    if _EXTRACTION_CONFIG["max_workers"] <= 0:
+        return None
+    if _pool is None:
+        if _EXTRACTION_CONFIG["mode"] == "thread":
+            _pool = ThreadPoolExecutor(
+                max_workers=_EXTRACTION_CONFIG["max_workers"],
+                thread_name_prefix="extract",
+            )
+        else:
+            pids = multiprocessing.SimpleQueue()
+            _pool = ProcessPoolExecutor(
+                max_workers=_EXTRACTION_CONFIG["max_workers"],
+                initializer=_report_pid,
+                initargs=(pids,),
+            )
+            _worker_pids[_pool] = pids
+    return _pool
+
+
+def _report_pid(pids) -> None:
+    # Initializer of the process pool, runs once in every worker
+    pids.put(os.getpid())
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots_loop is not loop:
+        _slots = asyncio.Semaphore(_EXTRACTION_CONFIG["max_workers"])
+        _slots_loop = loop
+    return _slots
+
+
+def _discard_pool(pool: Executor | None, terminate: bool = False) -> None:
+    # New documents go to a fresh pool instead of queueing behind a stuck or
+    # broken worker. With ``terminate``, the workers of a process pool are
+    # killed, otherwise a stuck worker keeps burning CPU and the interpreter
+    # waits for it at exit. Threads cannot be killed: a stuck thread keeps
+    # running until its document is done and delays exit until then.
+    global _pool
+    if pool is None:
+        return
+    if _pool is pool:
+        _pool = None
+    if terminate and isinstance(pool, ProcessPoolExecutor):
+        _terminated.add(pool)
+        if hasattr(pool, "terminate_workers"):  # Python 3.14+
+            pool.terminate_workers()
+            return
+        pids = _worker_pids.pop(pool, None)
+        while pids is not None and not pids.empty():
+            try:
+                os.kill(pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    pool.shutdown(wait=False)
+
+
+def extract_html(content: str) -> str | None:
+    """Extract the article of a page; runs inside the pool workers.
+
+    Args:
+        content: Full HTML of the page
+
+    Returns:
+        Extracted HTML, or None when trafilatura found nothing
+    """
+    return trafilatura.extract(content, **EXTRACT_OPTIONS)
+
+
+async def extract_content(content: str | None, url: str = "") -> str | None:
+    """Extract the article of a page without blocking the event loop.
+
+    Args:
+        content: Full HTML of the page
+        url: Page URL, for log messages
+
+    Returns:
+        Extracted HTML, or None when nothing was found, the document timed
+        out or the worker pool broke down
+    """
+    if not content:
+        return None
+
+    pool = _get_pool()
+    if pool is None or len(content) < _EXTRACTION_CONFIG["inline_threshold"]:
+        return extract_html(content)
+
+    loop = asyncio.get_running_loop()
+    async with _get_slots():
+        for attempt in range(2):
+            # The pool may have been replaced while waiting for a slot
+            pool = _get_pool()
+            with span(
+                "origin.extract", host=urlparse(url).netloc, chars=len(content)
+            ) as attributes:
+                try:
+                    return await asyncio.wait_for(
+                        loop.run_in_executor(pool, extract_html, content),
+                        _EXTRACTION_CONFIG["timeout"],
+                    )
+                except asyncio.TimeoutError:
+                    print(
+                        f"extraction of {str(url)[8:50]:>45} timed out after {_EXTRACTION_CONFIG['timeout']:.0f}s"
+                    )
+                    count("extract.timeouts")
+                    attributes["timed_out"] = True
+                    _discard_pool(pool, terminate=True)
+                    return None
+                except BrokenExecutor as err:
+                    if pool in _terminated and attempt == 0:
+                        # Killed because of another page, not this one
+                        continue
+                    print(f"extraction of {str(url)[8:50]:>45} failed: {err!r}")
+                    count("extract.broken_pool")
+                    _discard_pool(pool)
+                    return None
+    return None
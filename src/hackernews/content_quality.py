@@ -0,0 +1,93 @@
+"""Cheap quality scoring of extracted origin pages.
+
+Decides whether the trafilatura output of a plain request is good enough or
+the page has to be rendered with Playwright. The score comes from a regex
+scan over the HTML, no DOM is built:
+
+- word count of the visible text (CJK characters count as half a word)
+- link density, the share of the text that sits inside ``<a>`` tags
+- boilerplate phrases of error, bot-check and paywall pages
+"""
+
+from __future__ import annotations
+
+import html
+import re
+from typing import NamedTuple
+
+# Pages with fewer words are too thin to be the article
+MIN_WORDS = 50
+
+# Pages whose text is mostly links are navigation, not content
+MAX_LINK_DENSITY = 0.5
+
+# Boilerplate phrases only condemn pages shorter than this; a long article
+# may well mention "404" or "cookies"
+BOILERPLATE_MAX_WORDS = 400
+
+_INVISIBLE = re.compile(
+    r"<!--.*?-->|<(script|style|noscript|template)\b[^>]*>.*?</\1\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+_LINK = re.compile(r"<a\b[^>]*>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]*>")
+_WORD = re.compile(r"[^\W぀-ヿ㐀-䶿一-鿿가-힯]+")
+_CJK_CHAR = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+_BOILERPLATE = re.compile(
+    r"enable javascript|javascript is (?:disabled|required)"
+    r"|access denied|403 forbidden|404 not found|page not found"
+    r"|just a moment|checking your browser|verify you are (?:a )?human"
+    r"|are you a robot|captcha|attention required"
+    r"|subscribe to (?:continue|read)|sign in to (?:continue|read)"
+    r"|this content is (?:not available|unavailable)"
+    r"|httpx error|result is none",
+    re.IGNORECASE,
+)
+
+
+class ContentScore(NamedTuple):
+    """Quality signals of an extracted page."""
+
+    words: int
+    link_density: float
+    boilerplate: bool
+
+    @property
+    def is_good(self) -> bool:
+        """Whether the page looks like real article content."""
+        if self.words < MIN_WORDS or self.link_density > MAX_LINK_DENSITY:
+            return False
+        return not (self.boilerplate and self.words < BOILERPLATE_MAX_WORDS)
+
+
+def _count_words(text: str) -> int:
+    return len(_WORD.findall(text)) + len(_CJK_CHAR.findall(text)) // 2
+
+
+def score_content(content: str | None) -> ContentScore:
+    """Score extracted HTML without parsing it into a tree.
+
+    Args:
+        content: HTML returned by the extractor, or None
+
+    Returns:
+        Word count, link density and boilerplate signal of the page
+    """
+    if not content:
+        return ContentScore(0, 0.0, False)
+
+    visible = _INVISIBLE.sub(" ", content)
+    text = html.unescape(_TAG.sub(" ", visible))
+    words = _count_words(text)
+    if not words:
+        return ContentScore(0, 0.0, bool(_BOILERPLATE.search(text)))
+
+    link_words = sum(
+        _count_words(html.unescape(_TAG.sub(" ", match)))
+        for match in _LINK.findall(visible)
+    )
+    return ContentScore(
+        words,
+        min(link_words / words, 1.0),
+        bool(_BOILERPLATE.search(text)),
+    )
@@ -0,0 +1,146 @@
+"""Size-bounded persistent key-value cache backed by SQLite.
+
+Entries carry an optional expiry time and are evicted least-recently-used
+first once the total stored size exceeds ``max_bytes``.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+
+
+class DiskCache:
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Open (or create) a cache database.
+
+        Args:
+            path: SQLite database file path
+            max_bytes: Maximum total size of stored values before LRU eviction
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)"
+        )
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        self.total_bytes = row[0]
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Look up a value, refreshing its LRU position.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Stored bytes, or None if missing or expired
+        """
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            self.delete(key)
+            return None
+
+        self._conn.execute(
+            "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        self._conn.commit()
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        """
+        Store a value.
+
+        Args:
+            key: Cache key
+            value: Bytes to store
+            ttl: Seconds until the entry expires, None for never
+        """
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+
+        old = self._conn.execute(
+            "SELECT size FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if old is not None:
+            self.total_bytes -= old[0]
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), expires_at, now),
+        )
+        self.total_bytes += len(value)
+        self._evict()
+        self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        """Remove a value if present."""
+        row = self._conn.execute(
+            "SELECT size FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._conn.commit()
+        self.total_bytes -= row[0]
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones until under the size cap."""
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        self._conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        )
+        self.total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+        while self.total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self._conn.close()
@@ -0,0 +1,301 @@
+"""EPUB writer that streams chapters into the zip container.
+
+``ebooklib.epub.write_epub`` needs the whole book (every chapter and image)
+in memory before it writes anything. ``StreamingEpubBook`` instead writes
+each chapter and image into the zip file as soon as it is added and keeps
+only file names and titles; the package document (OPF), NCX and navigation
+document are written when the book is closed.
+
+Chapters are converted to XHTML by ebooklib's ``EpubHtml``, exactly as
+``write_epub`` does, one chapter at a time.
+"""
+
+from __future__ import annotations
+
+import datetime
+import os
+import textwrap
+import uuid
+import zipfile
+from typing import NamedTuple
+from xml.sax.saxutils import escape, quoteattr
+
+import ebooklib.epub as epub
+
+FOLDER_NAME = "EPUB"
+NCX_NAME = "toc.ncx"
+NAV_NAME = "nav.xhtml"
+
+CONTAINER_XML = f"""<?xml version="1.0" encoding="utf-8"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles>
+    <rootfile media-type="application/oebps-package+xml" full-path="{FOLDER_NAME}/content.opf"/>
+  </rootfiles>
+</container>
+"""
+
+
+class _ManifestItem(NamedTuple):
+    uid: str
+    file_name: str
+    media_type: str
+    properties: str = ""
+
+
+class StreamingEpubBook:
+    """EPUB 3 book (with an NCX for EPUB 2 readers) written incrementally.
+
+    Use as a context manager; leaving the block normally finishes the book,
+    an exception removes the partly written file::
+
+        with StreamingEpubBook("outs/book.epub", "Title", "Author") as book:
+            book.add_chapter("Chapter 1", html)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        title: str,
+        author: str | None = None,
+        language: str = "en",
+        toc_title: str | None = None,
+    ):
+        """
+        Args:
+            path: Output file, its directory is created if missing
+            title: Book title
+            author: Book author
+            language: Language of the book and its chapters
+            toc_title: Title of a section grouping all chapters in the table
+                of contents; chapters are listed flat when None
+        """
+        self.path = path
+        self.title = title
+        self.author = author
+        self.language = language
+        self.toc_title = toc_title
+        self.identifier = f"urn:uuid:{uuid.uuid4()}"
+        self.closed = False
+
+        self._manifest: list[_ManifestItem] = []
+        self._chapters: list[tuple[str, str, str]] = []  # (uid, file name, title)
+        self._names: set[str] = set()
+
+        # Only supplies the chapter template and language to ``EpubHtml``;
+        # no items are ever added to it
+        self._template_book = epub.EpubBook()
+        self._template_book.set_language(language)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        # mimetype must be the first entry and stored uncompressed
+        self._zip.writestr(
+            "mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED
+        )
+        self._zip.writestr("META-INF/container.xml", CONTAINER_XML)
+
+    def __enter__(self) -> StreamingEpubBook:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self) -> int:
+        return len(self._chapters)
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self._names
+
+    def _register(self, item: _ManifestItem) -> None:
+        if item.file_name in self._names:
+            raise ValueError(f"{item.file_name} was already added to the book")
+        self._names.add(item.file_name)
+        self._manifest.append(item)
+
+    def add_item(
+        self, file_name: str, content: str | bytes, media_type: str, uid: str | None = None
+    ) -> None:
+        """Write a resource such as a stylesheet into the book.
+
+        Args:
+            file_name: Path inside the book, relative to the chapters
+            content: File content
+            media_type: MIME type of the file
+            uid: Manifest id, derived from the position when None
+        """
+        self._register(_ManifestItem(uid or f"item_{len(self._manifest)}", file_name, media_type))
+        self._zip.writestr(f"{FOLDER_NAME}/{file_name}", content)
+
+    def add_file(
+        self, file_name: str, source_path: str, media_type: str, uid: str | None = None
+    ) -> None:
+        """Copy a file from disk into the book without reading it into memory.
+
+        Args:
+            file_name: Path inside the book, relative to the chapters
+            source_path: File on disk
+            media_type: MIME type of the file
+            uid: Manifest id, derived from the position when None
+        """
+        self._register(_ManifestItem(uid or f"item_{len(self._manifest)}", file_name, media_type))
+        self._zip.write(source_path, f"{FOLDER_NAME}/{file_name}")
+
+    def add_chapter(
+        self,
+        title: str,
+        html_text: str,
+        file_name: str | None = None,
+        uid: str | None = None,
+        stylesheets: tuple[str, ...] = (),
+    ) -> str:
+        """Convert a chapter to XHTML and write it into the book.
+
+        Chapters appear in the reading order and the table of contents in
+        the order they are added.
+
+        Args:
+            title: Chapter title
+            html_text: Chapter HTML
+            file_name: Path inside the book, ``chapter_<n>.xhtml`` when None
+            uid: Manifest id, ``chapter_<n>`` when None
+            stylesheets: Stylesheets (paths inside the book) linked from the
+                chapter's ``<head>``
+
+        Returns:
+            File name of the chapter inside the book
+        """
+        index = len(self._chapters)
+        uid = uid or f"chapter_{index}"
+        file_name = file_name or f"chapter_{index:03d}.xhtml"
+
+        item = epub.EpubHtml(title=title, file_name=file_name, uid=uid, lang=self.language)
+        item.book = self._template_book
+        for href in stylesheets:
+            item.add_link(href=href, rel="stylesheet", type="text/css")
+        item.content = html_text
+
+        self._register(_ManifestItem(uid, file_name, "application/xhtml+xml"))
+        self._zip.writestr(f"{FOLDER_NAME}/{file_name}", item.get_content())
+        self._chapters.append((uid, file_name, title))
+        return file_name
+
+    def _ncx(self) -> str:
+        points = "\n".join(
+            f'      <navPoint id={quoteattr(uid)}><navLabel><text>{escape(title)}</text></navLabel>'
+            f"<content src={quoteattr(file_name)}/></navPoint>"
+            for uid, file_name, title in self._chapters
+        )
+        if self.toc_title and self._chapters:
+            points = (
+                f'    <navPoint id="section_0"><navLabel><text>{escape(self.toc_title)}</text></navLabel>'
+                f"<content src={quoteattr(self._chapters[0][1])}/>\n{points}\n    </navPoint>"
+            )
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE ncx PUBLIC "-//NISO//DTD ncx 2005-1//EN" "http://www.daisy.org/z3986/2005/ncx-2005-1.dtd">
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head>
+    <meta name="dtb:uid" content={quoteattr(self.identifier)}/>
+    <meta name="dtb:depth" content="{2 if self.toc_title else 1}"/>
+    <meta name="dtb:totalPageCount" content="0"/>
+    <meta name="dtb:maxPageNumber" content="0"/>
+  </head>
+  <docTitle><text>{escape(self.title)}</text></docTitle>
+  <navMap>
+{points}
+  </navMap>
+</ncx>
+"""
+
+    def _nav(self) -> str:
+        links = "\n".join(
+            f"        <li><a href={quoteattr(file_name)}>{escape(title)}</a></li>"
+            for _, file_name, title in self._chapters
+        )
+        entries = f"      <ol>\n{links}\n      </ol>" if self._chapters else ""
+        if self.toc_title and self._chapters:
+            entries = (
+                f"      <ol>\n        <li><span>{escape(self.toc_title)}</span>\n"
+                f"{textwrap.indent(entries, '    ')}\n        </li>\n      </ol>"
+            )
+        lang = quoteattr(self.language)
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang={lang} xml:lang={lang}>
+  <head>
+    <title>{escape(self.title)}</title>
+  </head>
+  <body>
+    <nav epub:type="toc" id="id" role="doc-toc">
+      <h2>{escape(self.title)}</h2>
+{entries}
+    </nav>
+  </body>
+</html>
+"""
+
+    def _opf(self) -> str:
+        modified = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        author = (
+            f'\n    <dc:creator id="creator">{escape(self.author)}</dc:creator>'
+            if self.author
+            else ""
+        )
+        items = [
+            _ManifestItem("ncx", NCX_NAME, "application/x-dtbncx+xml"),
+            _ManifestItem("nav", NAV_NAME, "application/xhtml+xml", "nav"),
+            *self._manifest,
+        ]
+        manifest = "\n".join(
+            f"    <item href={quoteattr(item.file_name)} id={quoteattr(item.uid)} "
+            f"media-type={quoteattr(item.media_type)}"
+            + (f" properties={quoteattr(item.properties)}" if item.properties else "")
+            + "/>"
+            for item in items
+        )
+        spine = "\n".join(
+            f"    <itemref idref={quoteattr(uid)}/>"
+            for uid in ["nav", *(uid for uid, _, _ in self._chapters)]
+        )
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0" prefix="rendition: http://www.idpf.org/vocab/rendition/#">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+    <meta property="dcterms:modified">{modified}</meta>
+    <dc:identifier id="id">{escape(self.identifier)}</dc:identifier>
+    <dc:title>{escape(self.title)}</dc:title>
+    <dc:language>{escape(self.language)}</dc:language>{author}
+  </metadata>
+  <manifest>
+{manifest}
+  </manifest>
+  <spine toc="ncx">
+{spine}
+  </spine>
+</package>
+"""
+
+    def close(self) -> None:
+        """Write the table of contents and the package document, then close the file.
+
+        Closing a finished book again does nothing.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._zip.writestr(f"{FOLDER_NAME}/{NAV_NAME}", self._nav())
+        self._zip.writestr(f"{FOLDER_NAME}/{NCX_NAME}", self._ncx())
+        self._zip.writestr(f"{FOLDER_NAME}/content.opf", self._opf())
+        self._zip.close()
+
+    def abort(self) -> None:
+        """Close and delete the unfinished file."""
+        if self.closed:
+            return
+        self.closed = True
+        self._zip.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
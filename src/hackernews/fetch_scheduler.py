@@ -0,0 +1,254 @@
+"""Politeness scheduler for origin page and image requests.
+
+Every origin fetch (httpx and Playwright) and every image download takes a
+slot from the scheduler first:
+
+- a per-host semaphore limits concurrent requests to one site,
+- a per-host token bucket limits the request rate,
+- a global semaphore limits requests in flight overall.
+
+Responses with ``429`` (or ``503`` carrying ``Retry-After``) block the host
+for the requested time and are retried, instead of turning into error
+chapters. Handlers declare limits for their domains through
+``handlers.register_handler(domain, max_concurrency=..., rate=...)``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import email.utils
+import time
+from contextlib import asynccontextmanager
+from typing import Any
+from urllib.parse import urlparse
+
+import httpx
+
+import http_client
+from instrumentation import count
+
+# Requests in flight across all hosts
+_GLOBAL_CONCURRENCY = 32
+
+# Limits of hosts nobody declared limits for
+_DEFAULT_LIMITS: dict[str, Any] = {"max_concurrency": 4, "rate": None}
+
+# Domain -> {"max_concurrency": int, "rate": float | None}. A domain also
+# covers its subdomains, which then share one semaphore and bucket.
+_HOST_LIMITS: dict[str, dict[str, Any]] = {
+    "github.com": {"max_concurrency": 2, "rate": 1.0},
+    "githubusercontent.com": {"max_concurrency": 2, "rate": 2.0},
+    "medium.com": {"max_concurrency": 1, "rate": 0.5},
+    "substack.com": {"max_concurrency": 2, "rate": 1.0},
+}
+
+# Retries of a request answered with 429 / Retry-After
+MAX_THROTTLE_RETRIES = 3
+
+# Wait before retrying a 429 without Retry-After, doubled per retry
+THROTTLE_BACKOFF = 5.0
+
+# Longest Retry-After that is honoured; longer ones give up right away
+MAX_RETRY_AFTER = 120.0
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float | None, burst: float = 1.0):
+        """
+        Args:
+            rate: Tokens added per second, None for no rate limit
+            burst: Maximum number of tokens saved up
+        """
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def block(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` (after a ``Retry-After``)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def _delay(self) -> float:
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.rate is None:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        while True:
+            delay = self._delay()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+
+class _HostState:
+
+    def __init__(self, max_concurrency: int, rate: float | None):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, burst=max_concurrency)
+
+
+# Scheduler state is bound to the event loop it was created on
+_hosts: dict[str, _HostState] = {}
+_global_semaphore: asyncio.Semaphore | None = None
+_state_loop: asyncio.AbstractEventLoop | None = None
+
+
+def configure_scheduler(
+    global_concurrency: int | None = None,
+    max_concurrency: int | None = None,
+    rate: float | None = None,
+) -> None:
+    """Configure the global limit and the defaults for undeclared hosts.
+
+    Call before fetching starts; state of earlier requests is discarded.
+
+    Args:
+        global_concurrency: Requests in flight across all hosts
+        max_concurrency: Concurrent requests per undeclared host
+        rate: Requests per second per undeclared host, None for unlimited
+    """
+    global _GLOBAL_CONCURRENCY, _state_loop
+    if global_concurrency is not None:
+        _GLOBAL_CONCURRENCY = global_concurrency
+    if max_concurrency is not None:
+        _DEFAULT_LIMITS["max_concurrency"] = max_concurrency
+    if rate is not None:
+        _DEFAULT_LIMITS["rate"] = rate
+    _state_loop = None
+
+
+def set_host_limits(
+    domain: str, max_concurrency: int | None = None, rate: float | None = None
+) -> None:
+    """Declare limits for a domain and its subdomains.
+
+    Args:
+        domain: Domain such as ``"medium.com"``
+        max_concurrency: Concurrent requests to the domain
+        rate: Requests per second to the domain
+    """
+    limits = _HOST_LIMITS.setdefault(domain.lower(), dict(_DEFAULT_LIMITS))
+    if max_concurrency is not None:
+        limits["max_concurrency"] = max_concurrency
+    if rate is not None:
+        limits["rate"] = rate
+    _hosts.pop(domain.lower(), None)
+
+
+def _limits_for(host: str) -> tuple[str, dict[str, Any]]:
+    # Most specific declared domain covering the host, else the host itself
+    parts = host.split(".")
+    for i in range(len(parts) - 1):
+        domain = ".".join(parts[i:])
+        if domain in _HOST_LIMITS:
+            return domain, _HOST_LIMITS[domain]
+    return host, _DEFAULT_LIMITS
+
+
+def _get_state(url: str) -> tuple[_HostState, asyncio.Semaphore]:
+    global _global_semaphore, _state_loop
+
+    loop = asyncio.get_running_loop()
+    if _state_loop is not loop:
+        _hosts.clear()
+        _global_semaphore = asyncio.Semaphore(_GLOBAL_CONCURRENCY)
+        _state_loop = loop
+
+    host = urlparse(url).hostname or ""
+    key, limits = _limits_for(host.lower())
+    state = _hosts.get(key)
+    if state is None:
+        state = _HostState(limits["max_concurrency"], limits["rate"])
+        _hosts[key] = state
+    return state, _global_semaphore
+
+
+@asynccontextmanager
+async def slot(url: str):
+    """Hold a request slot for the host of ``url``.
+
+    Used around requests that do not go through ``request``, such as
+    Playwright page loads.
+    """
+    state, global_semaphore = _get_state(url)
+    async with state.semaphore:
+        await state.bucket.acquire()
+        async with global_semaphore:
+            yield
+
+
+def block_host(url: str, seconds: float) -> None:
+    """Stop sending requests to the host of ``url`` for ``seconds``."""
+    state, _ = _get_state(url)
+    state.bucket.block(seconds)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait according to a ``Retry-After`` header, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+async def request(
+    method: str, url: str, verify: bool = True, **kwargs
+) -> httpx.Response:
+    """Send a request through the pooled client once the host has a slot.
+
+    Throttled responses block the host and are retried up to
+    ``MAX_THROTTLE_RETRIES`` times.
+
+    Args:
+        method: HTTP method
+        url: Request URL
+        verify: Whether to verify TLS certificates
+        **kwargs: Passed on to ``httpx.AsyncClient.request``
+
+    Returns:
+        The last response
+    """
+    client = http_client.get_client(url, verify=verify)
+    attempt = 0
+    while True:
+        async with slot(url):
+            response = await client.request(method, url, **kwargs)
+
+        if response.status_code not in (429, 503) or attempt >= MAX_THROTTLE_RETRIES:
+            return response
+
+        delay = parse_retry_after(response.headers.get("retry-after"))
+        if delay is None:
+            if response.status_code == 503:
+                return response
+            delay = THROTTLE_BACKOFF * 2**attempt
+        if delay > MAX_RETRY_AFTER:
+            return response
+
+        print(
+            f"throttled by {urlparse(url).netloc} ({response.status_code}), retrying in {delay:.0f}s"
+        )
+        count("http.throttled")
+        block_host(url, delay)
+        attempt += 1
@@ -2,18 +2,51 @@ import asyncio
 import datetime
 import html
 import json
+import mimetypes
 import os
-import random as rnd
+import re
+
+from collections.abc import AsyncIterable
 
 import aiofiles
-import ebooklib.epub as epub
-import httpx
+import rich_click as click
 import tqdm
+from bs4 import BeautifulSoup
 
+import http_client
+import instrumentation
 import origin_page_spider as originSpider
+from algolia_search import search_stories
+from browser_pool import close_browser_pools
+from build_manifest import BuildManifest, input_hash
 from concat_htmls import html_files_to_pdf
-from html_generator import HTMLGenerator
-from html_img_embedder import embed_images_in_html_string
+from epub_writer import StreamingEpubBook
+from html_generator import (
+    STORY_CSS,
+    STYLESHEET_NAME,
+    HTMLGenerator,
+    write_stylesheet,
+)
+from hn_models import Comment, Story
+from html_img_embedder import IMAGE_HREF_PREFIX, embed_images_in_html_string
+from image_cache import configure_image_cache
+from instrumentation import count, span
+from item_cache import (
+    DEFAULT_CACHE_DIR,
+    configure_item_cache,
+    get_cached_item,
+    put_cached_item,
+)
+from item_stream import fetch_pruned_item
+from pipeline import Stage, run_pipeline
+from profiling import DEFAULT_SLOW_CALLBACK, profiled
+from retry_policy import (
+    call_with_retries,
+    configure_retries,
+    deadline_scope,
+    story_deadline,
+)
+from run_journal import RunJournal
 from utils import get_time_range_last_week
 
 URL_ENDPOINT = "https://hn.algolia.com/api/v1"
@@ -21,55 +54,115 @@ HN_API_ENDPOINT = "https://hacker-news.firebaseio.com/v0"
 
 generator = HTMLGenerator(max_depth=3, max_comments_per_level=[5, 2, 1])
 
+# Maximum concurrent Firebase requests while ranking one story's comments
+RANK_CONCURRENCY = 16
+
+# Workers per download pipeline stage
+STAGE_CONCURRENCY = {
+    "fetch": 8,
+    "rank": 4,
+    "render": 1,
+    "origin": 6,
+    "embed": 4,
+    "record": 1,
+}
+
+# Stories held between entering the pipeline and being consumed
+MAX_STORIES_IN_FLIGHT = 12
+
+# Image files referenced by chapters rendered with inline_images=False
+IMAGE_REF_PATTERN = re.compile(
+    r"""src=["']""" + re.escape(IMAGE_HREF_PREFIX) + r"""([^"'/]+)["']"""
+)
+
+# <link> tags in a chapter's <head> and their attributes
+LINK_TAG_PATTERN = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+TAG_ATTRIBUTE_PATTERN = re.compile(
+    r"""([\w-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))"""
+)
+
+# EPUB written by the weekly build
+EPUB_OUTPUT = "outs/HackerNews.epub"
+
 HEADERS = {
     "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0",
 }
 
 
 async def get_comment_rank(item_id: int) -> list:
-    item_url = HN_API_ENDPOINT + f"/item/{item_id}.json"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(item_url, timeout=30)
-        item_data = resp.json()
-        return item_data.get("kids", [])
-    return []
+    item_data = get_cached_item("firebase", item_id)
+    if item_data is None:
+        item_url = HN_API_ENDPOINT + f"/item/{item_id}.json"
+        client = http_client.get_client(item_url)
+
+        async def fetch_item() -> dict:
+            resp = await client.get(item_url, timeout=30)
+            resp.raise_for_status()
+            return resp.json()
+
+        item_data = await call_with_retries(fetch_item, f"firebase item {item_id}")
+        put_cached_item("firebase", item_id, item_data)
+    return item_data.get("kids", [])
 
 
 async def sort_comments_recursively(
-    comments: list[dict],
+    comments: list[Comment],
     parent_id: int,
     current_depth: int,
     max_depth: int,
+    max_comments_per_level: list[int] | None = None,
+    concurrency: int = RANK_CONCURRENCY,
 ) -> None:
-    """Recursively sort comments by Hacker News official API order.
+    """Sort comments by Hacker News official API order, one depth level at a time.
+
+    Every sibling group of a level is ranked concurrently (bounded by
+    ``concurrency``) before descending to the next level. When
+    ``max_comments_per_level`` is given, only the children of comments that
+    will actually be rendered are ranked.
 
     Args:
-        comments: List of comment dictionaries to sort
+        comments: List of comments to sort
         parent_id: ID of the parent item (story or comment)
         current_depth: Current nesting depth (0 for first-level comments)
         max_depth: Maximum depth to sort
+        max_comments_per_level: Number of comments rendered per level, used
+            to prune subtrees that will never be displayed
+        concurrency: Maximum number of concurrent Firebase requests
     """
-    if current_depth >= max_depth or not comments:
-        return
-
-    # Get official ranking order from HN API
-    comment_ranks = await get_comment_rank(parent_id)
-
-    # Set sorting weight for each comment
-    for comm in comments:
-        if comm["id"] in comment_ranks:
-            comm["points"] = comment_ranks.index(comm["id"])
-
-    # Sort by weight
-    comments.sort(key=lambda x: x.get("points", None) or -999999999)
-
-    # Recursively process children of each comment
-    for comm in comments:
-        children = comm.get("children", [])
-        if children:
-            await sort_comments_recursively(
-                children, comm["id"], current_depth + 1, max_depth
-            )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def rank_siblings(siblings: list[Comment], sibling_parent_id: int) -> None:
+        # Get official ranking order from HN API
+        async with semaphore:
+            comment_ranks = await get_comment_rank(sibling_parent_id)
+        positions = {comment_id: pos for pos, comment_id in enumerate(comment_ranks)}
+
+        # Set sorting weight for each comment
+        for comm in siblings:
+            if comm.id in positions:
+                comm.points = positions[comm.id]
+
+        # Sort by weight
+        siblings.sort(key=lambda x: x.get("points", None) or -999999999)
+
+    level = [(comments, parent_id)] if comments else []
+    depth = current_depth
+    while level and depth < max_depth:
+        await asyncio.gather(*(rank_siblings(sib, pid) for sib, pid in level))
+
+        limit = None
+        if max_comments_per_level is not None:
+            limit = max_comments_per_level[depth]
+
+        # Only descend into comments that will be rendered
+        next_level = []
+        for siblings, _ in level:
+            for comm in siblings[:limit]:
+                if comm.children:
+                    next_level.append((comm.children, comm.id))
+
+        level = next_level
+        depth += 1
 
 
 async def search_stories_byTimeRange(
@@ -78,220 +171,454 @@ async def search_stories_byTimeRange(
     end_time: int,
     title: str = None,
 ):
-    SEARCH_ENDPOINT = "/search"
-    search_url = URL_ENDPOINT + SEARCH_ENDPOINT
-
-    hits = []
-    page = 0
-    async with httpx.AsyncClient() as client:
-        while len(hits) < num_stories:
-            # start_time, end_time = await get_time_range_last_week()
-            params = {
-                "tags": "story",
-                "numericFilters": f"created_at_i>{start_time},created_at_i<{end_time}",
-                "page": page,
-            }
-            if title is not None and title:
-                params["query"] = title
-            response = await client.get(search_url, params=params)
+    return await search_stories(num_stories, start_time, end_time, title)
 
-            print(
-                f"Fetched {response.url} - {response.status_code}: {response.text if len(response.text) < 1000 else 'maybe normal'}"
+
+async def fetch_story(hit_id: int) -> dict:
+    """Fetch a story from Algolia (or the item cache), with its comment tree
+    pruned to the levels the generator renders."""
+    get_story_url = f"{URL_ENDPOINT}/items/"
+    story_id = hit_id
+    # Pruned items depend on the depth they were pruned to
+    source = f"algolia-d{generator.max_depth}"
+    with span("story.fetch", story_id=str(story_id)) as attributes:
+        story = get_cached_item(source, story_id)
+        attributes["cached"] = story is not None
+        if story is None:
+            story_url = get_story_url + str(story_id)
+            story = await call_with_retries(
+                lambda: fetch_pruned_item(story_url, generator.max_depth, timeout=25),
+                f"story {story_id}",
             )
+            put_cached_item(source, story_id, story)
+    return story
 
-            hits += response.json()["hits"]
-            page += 1
-    return hits[:num_stories]
 
+async def rank_story(story: Story) -> None:
+    """Sort the comments of a story by HN official API order, then drop the
+    comments that will not be rendered."""
+    with span("story.rank", story_id=str(story.get("id"))):
+        await sort_comments_recursively(
+            story.children,
+            story.id,
+            0,
+            generator.max_depth,
+            generator.max_comments_per_level,
+        )
+        story.prune(generator.max_comments_per_level)
 
-async def get_story(hit_id: int):
-    get_story_url = f"{URL_ENDPOINT}/items/"
-    await asyncio.sleep(rnd.random() * 2)
-    async with httpx.AsyncClient(timeout=25) as client:
-        story_id = hit_id
-        story_url = get_story_url + str(story_id)
-        story = await client.get(story_url)
-        story = story.json()
-
-    # Recursively sort comments by HN official API order
-    await sort_comments_recursively(
-        story["children"],
-        story_id,
-        0,
-        generator.max_depth,
-    )
 
-    print(f"get story {story.get("title", None) or story_id:>80} done.")
+async def get_story(hit_id: int) -> Story:
+    with deadline_scope(story_deadline()):
+        story = Story.from_item(await fetch_story(hit_id), generator.max_depth)
+        await rank_story(story)
+
+    print(f"get story {story.get("title", None) or hit_id:>80} done.")
     return story
 
 
-async def download_stories(
-    hits: list, save_to_file: bool = False, output_dir: str = "stories/"
+def get_story_dir(output_dir: str = "stories/") -> str:
+    """Dated folder (``YYYY-M/``) chapters of the current run are written to."""
+    current_date = datetime.datetime.now().date()
+    return output_dir + f"{current_date.year}-{current_date.month}/"
+
+
+async def iter_chapters(
+    hits: list,
+    save_to_file: bool = False,
+    output_dir: str = "stories/",
+    inline_images: bool = True,
+    journal: RunJournal | None = None,
 ):
     """
-    Download Hacker News stories and their original content using given ids.
+    Stream EPUB chapters of the given stories through the download pipeline.
+
+    Every story goes through fetch → rank → render → fetch origin → embed
+    images → record, each stage with its own concurrency limit (see
+    ``STAGE_CONCURRENCY``). Chapters are yielded in the order of ``hits`` as
+    soon as they are ready; at most ``MAX_STORIES_IN_FLIGHT`` stories are held
+    in memory at once.
+
+    When saving to files, chapters are written as soon as they are rendered.
+    A ``BuildManifest`` in the story folder lets unchanged discussion chapters
+    and successfully fetched origin pages be reused from disk instead of being
+    rebuilt, and a ``RunJournal`` (if given) records every finished stage so an
+    interrupted run can be resumed.
 
     Args:
         hits: 待下载的 Hacker News ID | list of story IDs to download
         save_to_file: 是否保存 HTML 内容到文件 | Whether to save HTML content to files
-
+        output_dir: 保存目录 | Directory the dated story folder is created in
+        inline_images: 是否将图片内嵌为 base64 | Inline images as data URIs.
+            When False, images are written once to ``<story folder>/images/``
+            and referenced relatively, see ``construct_epub_book(image_dir=...)``
+        journal: 运行日志 | Journal of this run, only used when saving to files
+
+    Yields:
+        (title, html) tuples, the origin page first, then the HN discussion
     """
-
-    current_date = datetime.datetime.now().date()
-    html_texts = []
-
-    target_dir = output_dir + f"{current_date.year}-{current_date.month}/"
+    target_dir = get_story_dir(output_dir)
     os.makedirs(target_dir, exist_ok=True)
+    image_dir = None if inline_images else os.path.join(target_dir, "images")
+
+    # Chapters unchanged since the last build are reused from disk
+    manifest = BuildManifest(target_dir) if save_to_file else None
+    if save_to_file:
+        # Rendered chapters link the shared stylesheet instead of inlining it
+        write_stylesheet(target_dir)
+    else:
+        journal = None
+    settings = {
+        "max_depth": generator.max_depth,
+        "max_comments_per_level": generator.max_comments_per_level,
+    }
 
-    tasks = [
-        asyncio.create_task(get_story(hit))
-        for hit in hits
-        # if not os.path.exists(os.path.join(target_dir, f"{hit['objectID']}.html"))
-    ]
-    stories = await asyncio.gather(*tasks)
-    story_texts = []
-    for idx, story in tqdm.tqdm(enumerate(stories), total=len(stories)):
+    async def read_file(file_name: str) -> str:
+        async with aiofiles.open(
+            os.path.join(target_dir, file_name), "r", encoding="utf-8"
+        ) as fp:
+            return await fp.read()
+
+    async def write_file(file_name: str, content: str) -> None:
+        async with aiofiles.open(
+            os.path.join(target_dir, file_name), "w", encoding="utf-8"
+        ) as fp:
+            await fp.write(content)
+
+    def journaled(job: dict, stage: str) -> dict | None:
+        # Stage finished in the interrupted run and its artifact survived
+        data = journal.stage_data(job["hit"], stage) if journal else None
+        if data is None or not os.path.exists(os.path.join(target_dir, data["file"])):
+            return None
+        return data
+
+    async def fetch(job: dict) -> dict:
+        job["html_file"] = f"{job['id']}.html"
+        job["origin_file"] = f"{job['id']}_ori.html"
+        # Fetching and ranking a story share one retry deadline
+        job["deadline"] = story_deadline()
+
+        rendered = journaled(job, "render")
+        if rendered is not None:
+            job["story"] = None
+            job["url"] = rendered["url"]
+            job["title"] = rendered["title"]
+            job["input_hash"] = rendered["input_hash"]
+            job["html_cached"] = True
+        else:
+            try:
+                with deadline_scope(job["deadline"]):
+                    item = await fetch_story(job["id"])
+            except Exception as err:
+                # 单个故事超时或重试耗尽时只输出错误章节，不中断整个运行
+                print(f"fetch story {job['id']} failed: {err!r}")
+                count("stories.fetch_failed")
+                job.update(
+                    story=None,
+                    url=None,
+                    title=f"HN Story_{job['idx']}",
+                    input_hash=None,
+                    html_cached=False,
+                    origin_cached=False,
+                    fetch_error=repr(err),
+                )
+                if journal:
+                    journal.record(job["hit"], "fetch", error=job["fetch_error"])
+                return job
+            story = Story.from_item(item, generator.max_depth)
+            job["story"] = story
+            job["url"] = story.get("url")
+            job["title"] = story.get("title", f"HN Story_{job['idx']}")
+
+        fetched = journaled(job, "origin")
+        job["origin_cached"] = (fetched is not None and not fetched["error"]) or (
+            manifest is not None
+            and manifest.origin_reusable(job["id"], job["url"], inline_images)
+        )
+        if journal:
+            journal.record(job["hit"], "fetch")
+        return job
+
+    async def rank(job: dict) -> dict:
+        story = job["story"]
+        # 中断前已渲染的章节和获取失败的故事无需排序
+        if story is not None:
+            try:
+                with deadline_scope(job["deadline"]):
+                    await rank_story(story)
+            except Exception as err:
+                # 排序失败时按 Algolia 返回的顺序渲染评论
+                print(f"rank story {job['id']} failed, keeping Algolia order: {err!r}")
+                count("stories.rank_failed")
+                story.prune(generator.max_comments_per_level)
+                job["rank_error"] = repr(err)
+            # 排序之后再计算哈希：官方评论顺序变化时章节需要重新渲染
+            job["input_hash"] = input_hash(story.to_dict(), settings)
+            job["html_cached"] = manifest is not None and manifest.is_current(
+                job["id"], job["input_hash"]
+            )
+        print(f"get story {job['title'] or job['id']:>80} done.")
+        return job
+
+    async def render(job: dict) -> dict:
+        story = job.pop("story")
+        if job.get("fetch_error"):
+            job["html"] = (
+                f"<html><body><h1> ERROR </h1><p>Hacker News story {job['id']} "
+                f"could not be fetched: {html.escape(job['fetch_error'])}</p></body></html>"
+            )
+            return job
+        if job["html_cached"]:
+            job["html"] = await read_file(job["html_file"])
+            return job
+
+        # 仅在写出 style.css 时链接它，否则内联样式
+        with span("render", story_id=str(job["id"])):
+            job["html"] = generator.generate_html(
+                story, stylesheet_href=STYLESHEET_NAME if save_to_file else None
+            )
         if save_to_file:
-            generator.save_html(story, os.path.join(target_dir, f"{story['id']}.html"))
+            await write_file(job["html_file"], job["html"])
+        # 未按官方顺序排序的章节不记录，恢复运行时重新获取
+        if journal and not job.get("rank_error"):
+            journal.record(
+                job["hit"],
+                "render",
+                file=job["html_file"],
+                title=job["title"],
+                url=job["url"],
+                input_hash=job["input_hash"],
+            )
+        return job
 
-        html_text = generator.generate_html(story)
-        story_texts.append((story.get("title", f"HN Story_{idx}"), html_text))
+    async def fetch_origin(job: dict) -> dict:
+        if job.get("fetch_error"):
+            job["origin"] = (
+                "<html><body><h1> ERROR </h1><p>Origin page unknown, the story "
+                "could not be fetched.</p></body></html>"
+            )
+            job["origin_error"] = True
+        elif job["origin_cached"]:
+            job["origin"] = await read_file(job["origin_file"])
+            job["origin_error"] = False
+        else:
+            job["origin"], job["origin_error"] = await fetch_original_page(job["url"])
+        return job
+
+    async def embed(job: dict) -> dict:
+        if job["origin_cached"] or job.get("fetch_error"):
+            return job
+
+        job["origin"] = await embed_images_in_html_string(
+            job["origin"], job["url"], image_dir=image_dir
+        )
+        if save_to_file:
+            await write_file(job["origin_file"], job["origin"])
+        if journal:
+            journal.record(
+                job["hit"], "origin", file=job["origin_file"], error=job["origin_error"]
+            )
+        return job
+
+    async def record(job: dict) -> dict:
+        if job.get("fetch_error"):
+            print(f"story {job['id']} skipped: {job['fetch_error']}")
+            return job
+        # 降级渲染的章节不记入清单，下次构建时重新生成
+        if manifest is not None and not job.get("rank_error"):
+            manifest.record(
+                job["id"],
+                job["input_hash"],
+                job["title"],
+                job["url"],
+                {"html": job["html_file"], "origin": job["origin_file"]},
+                job["origin_error"],
+                inline_images,
+            )
 
-    origin_page_tasks = [
-        asyncio.create_task(
-            get_original_page(target_dir, hit["url"], hit["id"], save_to_file)
+        count("chapters.html_reused", int(job["html_cached"]))
+        count("chapters.origin_reused", int(job["origin_cached"]))
+        reused = " (reused)" if job["html_cached"] and job["origin_cached"] else ""
+        print(
+            f"get original {str(job['url'])[8:50]:>45} done. error?: {job['origin_error']}{reused}"
         )
-        for hit in stories
+        return job
+
+    stages = [
+        Stage(name, func, STAGE_CONCURRENCY[name])
+        for name, func in [
+            ("fetch", fetch),
+            ("rank", rank),
+            ("render", render),
+            ("origin", fetch_origin),
+            ("embed", embed),
+            ("record", record),
+        ]
     ]
-    origin_pages = await asyncio.gather(*origin_page_tasks)
+    jobs = ({"idx": idx, "hit": hit, "id": hit} for idx, hit in enumerate(hits))
 
-    for hn, ori in zip(story_texts, origin_pages):
-        html_texts.append((hn[0], ori))
-        html_texts.append(hn)
-
-    return html_texts
+    try:
+        async for job in run_pipeline(jobs, stages, MAX_STORIES_IN_FLIGHT):
+            yield job["title"], job["origin"]
+            yield job["title"], job["html"]
+        if journal:
+            journal.finish()
+    finally:
+        if journal:
+            journal.close()
+        await close_browser_pools()
 
 
-def construct_epub_book(html_texts: list[str, str]):
+async def download_stories(
+    hits: list,
+    save_to_file: bool = False,
+    output_dir: str = "stories/",
+    inline_images: bool = True,
+    journal: RunJournal | None = None,
+):
     """
-    构建包含 Hacker News 故事的 EPUB 电子书
+    Download Hacker News stories and their original content using given ids.
 
     Args:
-        html_texts: 包含 HTML 内容的字符串列表
-    """
-    book = epub.EpubBook()
-    book.set_title(f"Hacker News - {datetime.datetime.now().strftime('%Y-%m-%d')}")
-    book.add_author("SnowFox4004")
-
-    # 必须先添加导航组件
-    book.add_item(epub.EpubNcx())
-    book.add_item(epub.EpubNav())
-
-    spine = ["nav"]
-    toc = []
-
-    # 创建CSS样式文件
-    css_content = """
-    body {
-        font-family: Georgia, serif;
-        font-size: 12pt;
-        line-height: 1.4;
-        margin: 20px;
-        color: #000000;
-    }
-    h1 {
-        font-size: 18pt;
-    }
-    .story-info {
-        font-size: 10pt;
-        color: #666666;
-        margin: 10px 0;
-    }
-    .comment {
-        border-left: 1px solid #cccccc;
-        margin: 10px 0;
-        padding-left: 10px;
-    }
-    .comment-header {
-        font-size: 10pt;
-        font-weight: bold;
-        margin-bottom: 5px;
-    }
-    .comment-text {
-        margin: 5px 0;
-    }
-    .comment-level-0 { margin-left: 0; }
-    .comment-level-1 { margin-left: 20px; }
-    .comment-level-2 { margin-left: 40px; }
-    .comment-level-3 { margin-left: 60px; }
-    .comment-level-4 { margin-left: 80px; }
-    .comment-level-5 { margin-left: 100px; }
-    table {
-        border-collapse: collapse;
-        width: 100%;
-        margin: 10px 0;
-    }
-    th, td {
-        border: 1px solid #999999;
-        padding: 8px;
-        text-align: left;
-    }
-    th {
-        background-color: #f0f0f0;
-        font-weight: bold;
-    }
+        hits: 待下载的 Hacker News ID | list of story IDs to download
+        save_to_file: 是否保存 HTML 内容到文件 | Whether to save HTML content to files
+        inline_images: 是否将图片内嵌为 base64 | Inline images as data URIs
+        journal: 运行日志，用于中断后恢复 | Journal of this run, for resuming
+
     """
+    html_texts = []
+    with tqdm.tqdm(total=len(hits) * 2) as progress:
+        async for chapter in iter_chapters(
+            hits, save_to_file, output_dir, inline_images, journal
+        ):
+            html_texts.append(chapter)
+            progress.update(1)
 
-    # 创建EPUB CSS项目
-    nav_css = epub.EpubItem(
-        uid="style_nav",
-        file_name="style/nav.css",
-        media_type="text/css",
-        content=css_content,
-    )
+    return html_texts
 
-    # 添加CSS到书籍
-    book.add_item(nav_css)
 
-    for i, (title, html_text) in tqdm.tqdm(
-        enumerate(html_texts), total=len(html_texts)
-    ):
-        title = title or f"Story #{i+1}"
-        file_name = f"story_{i:03d}.xhtml"
-        item_id = f"story_{i}"
+def _open_epub_book(output_filename: str) -> StreamingEpubBook:
+    book = StreamingEpubBook(
+        output_filename,
+        title=f"Hacker News - {datetime.datetime.now().strftime('%Y-%m-%d')}",
+        author="SnowFox4004",
+        toc_title="Hacker News Weekly Digest",
+    )
+    # 所有讨论章节共用一个样式表
+    book.add_item(STYLESHEET_NAME, STORY_CSS, "text/css", uid="style_story")
+    return book
+
+
+def _linked_stylesheets(html_text: str, book: StreamingEpubBook) -> tuple[str, ...]:
+    """章节 <head> 中链接、且已打包进 EPUB 的样式表"""
+    head_end = html_text.lower().find("</head>")
+    head = html_text[:head_end] if head_end != -1 else ""
+    stylesheets = []
+    for tag in LINK_TAG_PATTERN.findall(head):
+        attributes = {
+            name.lower(): "".join(value)
+            for name, *value in TAG_ATTRIBUTE_PATTERN.findall(tag)
+        }
+        href = attributes.get("href")
+        if "stylesheet" in attributes.get("rel", "").lower().split() and href in book:
+            stylesheets.append(href)
+    return tuple(stylesheets)
+
+
+def _add_epub_chapter(
+    book: StreamingEpubBook,
+    title: str | None,
+    html_text: str,
+    image_dir: str | None,
+) -> None:
+    """将一个章节及其引用的图片写入 EPUB，每张图片只打包一次"""
+    i = len(book)
+    # ebooklib 会重建 <head>，样式表链接需单独传入；
+    # 内联 STORY_CSS 的章节（未保存到文件）同样改为链接共享样式表
+    stylesheets = _linked_stylesheets(html_text, book)
+    if not stylesheets and STORY_CSS in html_text:
+        stylesheets = (STYLESHEET_NAME,)
+    with span("epub.chapter", chars=len(html_text)):
+        book.add_chapter(
+            title or f"Story #{i+1}",
+            html_text,
+            file_name=f"story_{i:03d}.xhtml",
+            uid=f"story_{i}",
+            stylesheets=stylesheets,
+        )
 
-        item = epub.EpubHtml(title=title, file_name=file_name, uid=item_id, lang="en")
+        if image_dir is None:
+            return
+        for image_name in IMAGE_REF_PATTERN.findall(html_text):
+            file_name = IMAGE_HREF_PREFIX + image_name
+            image_path = os.path.join(image_dir, image_name)
+            if file_name in book or not os.path.exists(image_path):
+                continue
+            book.add_file(
+                file_name,
+                image_path,
+                mimetypes.guess_type(image_name)[0] or "application/octet-stream",
+            )
 
-        html_text = html.unescape(html_text)
-        if "<style>" in html_text:
-            # 样式放在body内才会在epub.write_epub()中保留
 
-            html_text = html_text.replace(
-                "<body>",
-                f"<body><style>{css_content}</style>",
-                1,
-            )
+def construct_epub_book(
+    html_texts: list[tuple[str, str]],
+    image_dir: str | None = None,
+    output_filename: str = EPUB_OUTPUT,
+) -> str:
+    """
+    构建包含 Hacker News 故事的 EPUB 电子书
 
-        # if i == 1:
-        #     print(html_text)
+    Args:
+        html_texts: (标题, HTML) 章节列表
+        image_dir: 章节中 images/ 引用所指向的图片目录，每张图片只打包一次
+        output_filename: 输出的 EPUB 文件
+
+    Returns:
+        EPUB 文件路径
+    """
+    try:
+        with _open_epub_book(output_filename) as book:
+            for title, html_text in tqdm.tqdm(html_texts, total=len(html_texts)):
+                _add_epub_chapter(book, title, html_text, image_dir)
+            with span("epub.write", chapters=len(book)):
+                book.close()
+        print(f"EPUB 生成成功: {output_filename}")
+        return output_filename
+    except Exception as e:
+        print(f"EPUB 生成失败: {str(e)}")
+        raise
 
-        item.content = html_text
-        book.add_item(item)
 
-        # 添加到 spine 和目录
-        spine.append(item)
-        toc.append(epub.Link(file_name, title, item_id))
+async def stream_epub_book(
+    chapters: AsyncIterable[tuple[str, str]],
+    image_dir: str | None = None,
+    output_filename: str = EPUB_OUTPUT,
+    total: int | None = None,
+) -> str:
+    """
+    边下载边构建 EPUB：每个章节到达后立即写入 zip 文件，内存中只保留目录信息
 
-    # 修复关键点：正确设置 TOC 结构
-    book.toc = [(epub.Section("Hacker News Weekly Digest"), toc)]
+    章节的 XHTML 转换和写入在线程中执行，不阻塞事件循环中的下载。
 
-    # 设置 spine（内容阅读顺序）
-    book.spine = spine
+    Args:
+        chapters: (标题, HTML) 章节的异步迭代器，例如 ``iter_chapters(...)``
+        image_dir: 章节中 images/ 引用所指向的图片目录，每张图片只打包一次
+        output_filename: 输出的 EPUB 文件
+        total: 预计的章节数，用于显示进度
 
-    # 生成 EPUB 文件
-    output_filename = "outs/" + f"HackerNews.epub"
+    Returns:
+        EPUB 文件路径
+    """
     try:
-        epub.write_epub(output_filename, book)
+        with _open_epub_book(output_filename) as book, tqdm.tqdm(total=total) as progress:
+            async for title, html_text in chapters:
+                await asyncio.to_thread(
+                    _add_epub_chapter, book, title, html_text, image_dir
+                )
+                progress.update(1)
+            with span("epub.write", chapters=len(book)):
+                await asyncio.to_thread(book.close)
         print(f"EPUB 生成成功: {output_filename}")
         return output_filename
     except Exception as e:
@@ -299,55 +626,141 @@ def construct_epub_book(html_texts: list[str, str]):
         raise
 
 
-async def get_original_page(target_dir: str, url: str, id: str, save_flag: bool):
+async def fetch_original_page(url: str) -> tuple[str | BeautifulSoup, bool]:
+    """Fetch the origin page of a story, turning failures into an error page.
+
+    Args:
+        url: Story URL
 
+    Returns:
+        Tuple of (content, is_error). Content is usually the parsed document
+        from the handler, which ``embed_images_in_html_string`` serializes.
+    """
     result = f"<html><body><h1> ERROR </h1><br><a href={url}>{url}</a></body></html>"
     err_flag = False
     try:
-        async with httpx.AsyncClient(timeout=20, verify=False) as client:
-            blog_content, err_flag = await originSpider.get_origin(url, HEADERS)
+        blog_content, err_flag = await originSpider.get_origin(url, HEADERS)
 
-            result = blog_content
+        result = blog_content
 
-            if result is None:
-                print(
-                    f"{url} 's trafilatura.extract() result is None. \n\n{blog_content[:1000]}"
-                )
-                result = f"<html><body><h1> ERROR </h1><br><a href={url}>{url}</a><p> result is None.</p></body></html>"
+        if result is None:
+            print(
+                f"{url} 's trafilatura.extract() result is None. \n\n{blog_content[:1000]}"
+            )
+            result = f"<html><body><h1> ERROR </h1><br><a href={url}>{url}</a><p> result is None.</p></body></html>"
 
     except Exception as err:
         err_flag = True
         result = f"<html><body><h1> ERROR </h1><br><a href={url}>{url}</a><br><p>{str(err)}</p></body></html>"
 
-    result = await embed_images_in_html_string(result, url)
+    return result, err_flag
+
+
+@click.command()
+@click.option(
+    "--cache-dir",
+    type=str,
+    help="Directory of the local item and image caches, relative to the working directory (empty string disables caching)",
+    default=DEFAULT_CACHE_DIR,
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue the last unfinished run of this month instead of starting over",
+)
+@click.option(
+    "--retries",
+    type=int,
+    help="Tries per Algolia/Firebase request, including the first one",
+    default=None,
+)
+@click.option(
+    "--story-deadline",
+    "deadline_seconds",
+    type=float,
+    help="Seconds a story may spend fetching and ranking, retries included (0 disables)",
+    default=None,
+)
+@click.option(
+    "--hedge-after",
+    type=float,
+    help="Send a duplicate Algolia/Firebase request after this many seconds without an answer (0 disables)",
+    default=None,
+)
+@click.option(
+    "--metrics-json",
+    type=str,
+    help="Write spans and counters of the run to this file as OTLP/JSON",
+    default=None,
+)
+@click.option(
+    "--profile",
+    type=str,
+    help="Profile the run and write <PROFILE>.prof, .folded (flame graph stacks) and .loop.json (event loop timing)",
+    default=None,
+)
+@click.option(
+    "--slow-callback",
+    type=float,
+    help="With --profile, report event loop callbacks blocking longer than this many seconds",
+    default=DEFAULT_SLOW_CALLBACK,
+)
+def main(
+    cache_dir: str,
+    resume: bool,
+    retries: int | None,
+    deadline_seconds: float | None,
+    hedge_after: float | None,
+    metrics_json: str | None,
+    profile: str | None,
+    slow_callback: float,
+):
+    configure_item_cache(cache_dir)
+    configure_image_cache(cache_dir)
+    configure_retries(
+        attempts=retries, story_deadline=deadline_seconds, hedge_after=hedge_after
+    )
+    with profiled(profile, slow_callback):
+        os.makedirs("outs/", exist_ok=True)
+
+        target_path = get_story_dir("stories/")
+
+        journal = RunJournal.resume(target_path) if resume else None
+        if journal is not None:
+            weekly = journal.hits
+        else:
+            start_time, end_time = asyncio.run(get_time_range_last_week())
+            weekly = http_client.run(search_stories_byTimeRange(15, start_time, end_time))
+            weekly = [hit.get("objectID") for hit in weekly]
+            journal = RunJournal.start(target_path, weekly)
+
+        print("get", len(weekly), "top stories.")
+        # 章节边下载边写入 EPUB，不在内存中保留整本书
+        http_client.run(
+            stream_epub_book(
+                iter_chapters(
+                    weekly, save_to_file=True, inline_images=False, journal=journal
+                ),
+                image_dir=os.path.join(target_path, "images"),
+                total=len(weekly) * 2,
+            )
+        )
 
-    if save_flag:
-        async with aiofiles.open(
-            os.path.join(target_dir, f"{id}_ori.html"), "w+", encoding="utf-8"
-        ) as fp:
-            await fp.write(result)
+        html_files_to_pdf(
+            [
+                os.path.join(target_path, i)
+                for i in os.listdir(target_path)
+                if i.endswith(".html")
+            ],
+            "outs/output.pdf",
+            paper_size="A5",
+            workers=os.cpu_count() or 1,
+        )
 
-    print(f"get original {str(url)[8:50]:>45} done. error?: {err_flag}")
-    return result
+    instrumentation.print_summary()
+    if metrics_json:
+        instrumentation.export_json(metrics_json)
 
 
 if __name__ == "__main__":
-    os.makedirs("outs/", exist_ok=True)
-
-    start_time, end_time = asyncio.run(get_time_range_last_week())
-    weekly = asyncio.run(search_stories_byTimeRange(15, start_time, end_time))
-    weekly = [hit.get("objectID") for hit in weekly]
-
-    print("get", len(weekly), "top stories.")
-    downloaded = asyncio.run(download_stories(weekly, save_to_file=True))
-    print("downloaded", len(downloaded), "stories.")
-
-    construct_epub_book(downloaded)
-
-    current_date = datetime.datetime.now().date()
-    target_path = "stories/" + f"{current_date.year}-{current_date.month}/"
-    html_files_to_pdf(
-        [os.path.join(target_path, i) for i in os.listdir(target_path)],
-        "outs/output.pdf",
-        paper_size="A5",
-    )
+    main()
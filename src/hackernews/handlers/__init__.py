@@ -10,11 +10,14 @@ from collections.abc import Awaitable, Callable
 from urllib.parse import urlparse
 from typing import TYPE_CHECKING
 
+from fetch_scheduler import set_host_limits
+
 if TYPE_CHECKING:
-    pass
+    from bs4 import BeautifulSoup
 
-# Type alias for origin page handlers
-OriginHandler = Callable[[str, dict], Awaitable[tuple[str, bool]]]
+# Type alias for origin page handlers. Handlers return the extracted page
+# either as HTML or as an already parsed document, see html_document.
+OriginHandler = Callable[[str, dict], Awaitable[tuple["str | BeautifulSoup", bool]]]
 
 # Registry: domain -> handler function
 _ORIGIN_HANDLERS: dict[str, OriginHandler] = {}
@@ -23,20 +26,30 @@ _ORIGIN_HANDLERS: dict[str, OriginHandler] = {}
 _default_handler: OriginHandler | None = None
 
 
-def register_handler(domain: str) -> Callable[[OriginHandler], OriginHandler]:
+def register_handler(
+    domain: str,
+    max_concurrency: int | None = None,
+    rate: float | None = None,
+) -> Callable[[OriginHandler], OriginHandler]:
     """Decorator to register a handler for a specific domain.
 
     Args:
         domain: The domain to match (e.g., "x.com", "twitter.com")
+        max_concurrency: Concurrent requests allowed to the domain, see
+            fetch_scheduler (default: scheduler default)
+        rate: Requests per second allowed to the domain (default: scheduler default)
 
     Returns:
         Decorator function
 
     Example:
-        @register_handler("x.com")
+        @register_handler("x.com", max_concurrency=1, rate=0.5)
         async def x_handler(url: str, headers: dict) -> tuple[str, bool]:
             ...
     """
+    if max_concurrency is not None or rate is not None:
+        set_host_limits(domain, max_concurrency=max_concurrency, rate=rate)
+
     def decorator(func: OriginHandler) -> OriginHandler:
         _ORIGIN_HANDLERS[domain] = func
         return func
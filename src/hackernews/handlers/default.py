@@ -1,24 +1,28 @@
 """Default origin page handler using trafilatura + playwright fallback.
 
 This handler uses httpx + trafilatura as primary method,
-and falls back to playwright for dynamic pages.
+and falls back to playwright for dynamic pages. Extraction runs in a worker
+pool (see ``content_extraction``).
 """
 
 from __future__ import annotations
 
-import asyncio
+from urllib.parse import urlparse
 
-import httpx
-import trafilatura
 from bs4 import BeautifulSoup
-from patchright.async_api import async_playwright
 from playwright_stealth import Stealth
 
+import fetch_scheduler
+from browser_pool import get_browser_pool, wait_for_content_ready
 from handlers import set_default_handler
+from content_extraction import extract_content
+from content_quality import score_content
+from html_document import ensure_body, parse_html
+from instrumentation import count, span
 
 
-def convert_trafilatura_tables(html_content: str) -> str:
-    """Convert trafilatura-style tables to standard HTML tables.
+def convert_trafilatura_tables(document: BeautifulSoup) -> BeautifulSoup:
+    """Convert trafilatura-style tables to standard HTML tables, in place.
 
     Trafilatura extracts tables using non-standard tags:
     - <row> instead of <tr>
@@ -28,21 +32,15 @@ def convert_trafilatura_tables(html_content: str) -> str:
     This function converts them to standard HTML for EPUB compatibility.
 
     Args:
-        html_content: HTML content possibly containing trafilatura tables
+        document: Parsed page possibly containing trafilatura tables
 
     Returns:
-        HTML content with standard table markup
+        The same document, with standard table markup
     """
-    tgt = html_content.find("th")
-    # print("sdsddsdsdsdssssssssssssssssssssss")
-    # print(html_content[2000:4000])
+    if document.find("row") is None:
+        return document
 
-    if not html_content or "<row" not in html_content:
-        return html_content
-
-    soup = BeautifulSoup(html_content, "html.parser")
-
-    for table in soup.find_all("table"):
+    for table in document.find_all("table"):
         # Skip tables that already use standard HTML
         if table.find("tr"):
             continue
@@ -54,7 +52,7 @@ def convert_trafilatura_tables(html_content: str) -> str:
         # Process each row
         for row_idx, row in enumerate(rows):
             # Create new tr element
-            new_tr = soup.new_tag("tr")
+            new_tr = document.new_tag("tr")
 
             # Note: We ignore the 'span' attribute as trafilatura's span
             # semantics differ from HTML rowspan. Direct conversion would
@@ -65,10 +63,10 @@ def convert_trafilatura_tables(html_content: str) -> str:
             for cell_idx, cell in enumerate(cells):
                 # First row uses <th>, others use <td>
                 if row_idx == 0:
-                    new_td = soup.new_tag("th")
+                    new_td = document.new_tag("th")
 
                 else:
-                    new_td = soup.new_tag("td")
+                    new_td = document.new_tag("td")
 
                 # Extract content, removing <p> wrapper if present
                 # Use extract() instead of copy.copy() to properly move content
@@ -83,11 +81,11 @@ def convert_trafilatura_tables(html_content: str) -> str:
             # Replace old row with new tr
             row.replace_with(new_tr)
 
-    return str(soup)
+    return document
 
 
 async def get_page_content_playwright(url: str, headless: bool = True) -> str | None:
-    """Fetch page content using Playwright browser.
+    """Fetch page content using a page from the shared Playwright browser pool.
 
     Args:
         url: Target URL
@@ -97,35 +95,25 @@ async def get_page_content_playwright(url: str, headless: bool = True) -> str |
     Returns:
         Extracted HTML content or None on failure
     """
-    async with async_playwright() as pw:
-        browser = await pw.chromium.launch(headless=headless)
-        page = await browser.new_page()
-
+    async with get_browser_pool(headless).page() as page:
         await page.set_extra_http_headers(
             {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
         )
         try:
-            await page.goto(url, wait_until="networkidle", timeout=60000)
-            await asyncio.sleep(10)
-            await page.wait_for_load_state("networkidle")
+            async with fetch_scheduler.slot(url):
+                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+                await wait_for_content_ready(page)
         except Exception as err:
             print("Time limit exceeded in playwright", f"{str(url)[8:50]:>45}")
             await page.wait_for_load_state("domcontentloaded")
-            await asyncio.sleep(5)
+            await wait_for_content_ready(page, timeout=5.0)
             return await page.content()
 
         content = await page.content()
-        content = trafilatura.extract(
-            content,
-            output_format="html",
-            include_formatting=False,  # Must be False to preserve table content with bold tags
-            favor_recall=True,
-            include_images=True,
-        )
-        await browser.close()
-        return content
+
+    return await extract_content(content, url)
 
 
 async def get_page_content_requests(url: str, headers: dict) -> str:
@@ -138,45 +126,41 @@ async def get_page_content_requests(url: str, headers: dict) -> str:
     Returns:
         Extracted HTML content or error message
     """
-    async with httpx.AsyncClient(
-        timeout=30.0, verify=False, follow_redirects=True
-    ) as client:
-        try:
-            response = await client.get(url, headers=headers, follow_redirects=True)
-            response.raise_for_status()
-        except Exception as err:
-            return f"HTTPX Error: {err}"
-        blog_content = response.text
-        result = trafilatura.extract(
-            blog_content,
-            output_format="html",
-            include_formatting=False,  # Must be False to preserve table content with bold tags
-            favor_recall=True,
-            include_tables=True,
-            include_images=True,
+    try:
+        response = await fetch_scheduler.request(
+            "GET",
+            url,
+            verify=False,
+            headers=headers,
+            timeout=30.0,
+            follow_redirects=True,
         )
+        response.raise_for_status()
+    except Exception as err:
+        return f"HTTPX Error: {err}"
+    result = await extract_content(response.text, url)
 
-        if result is None:
-            result = f"<html><body><h1> ERROR </h1><br><a href={url}>{url}</a><p> result is None.</p></body></html>"
-        return result
+    if result is None:
+        result = f"<html><body><h1> ERROR </h1><br><a href={url}>{url}</a><p> result is None.</p></body></html>"
+    return result
 
 
-async def concat_htmls(html_list: list[tuple[str, str]]) -> str:
-    """Concatenate multiple HTML contents.
+def concat_documents(documents: list[tuple[str, BeautifulSoup]]) -> BeautifulSoup:
+    """Merge parsed pages into the first one that has a body.
 
     Args:
-        html_list: List of (title, html_content) tuples
+        documents: List of (title, document) tuples
 
     Returns:
-        Merged HTML string
+        Merged document
     """
-    htmls = [(html[0], BeautifulSoup(html[1], "html.parser")) for html in html_list]
     idx = 0
-    while idx < len(htmls) and not htmls[idx][1].body:
+    while idx < len(documents) - 1 and not documents[idx][1].body:
         idx += 1
-    concated = htmls[idx][max(idx, len(htmls) - 1)]
+    concated = documents[idx][1]
+    body = ensure_body(concated)
 
-    for method_id, (title, html) in enumerate(htmls):
+    for method_id, (title, document) in enumerate(documents):
         if method_id == idx:
             continue
 
@@ -184,23 +168,25 @@ async def concat_htmls(html_list: list[tuple[str, str]]) -> str:
         heading = concated.new_tag("h2")
         heading.string = f"Content from method {title}"
 
-        concated.body.append(hr_tag)
-        concated.body.append(heading)
+        body.append(hr_tag)
+        body.append(heading)
 
-        if html.body:
-            for element in html.body.children:
-                concated.body.append(element.extract())
-        else:
-            for element in html.children:
-                concated.body.append(element.extract())
+        source = document.body or document
+        for element in list(source.children):
+            body.append(element.extract())
 
-    return str(concated)
+    return concated
 
 
-async def default_handler(url: str, headers: dict, headless: bool = True) -> tuple[str, bool]:
+async def default_handler(
+    url: str, headers: dict, headless: bool = True
+) -> tuple[BeautifulSoup, bool]:
     """Default handler for origin page extraction.
 
-    Uses httpx + trafilatura first, falls back to playwright if content is too short.
+    Uses httpx + trafilatura first, falls back to playwright if the extracted
+    content does not look like an article (see ``content_quality``).
+    Every page is parsed once; the checks and the table conversion work on
+    that tree, which is returned without serializing it.
 
     Args:
         url: Target URL to fetch
@@ -210,35 +196,39 @@ async def default_handler(url: str, headers: dict, headless: bool = True) -> tup
 
     Returns:
         Tuple of (content, is_error)
-        - content: Extracted HTML content
+        - content: Parsed document of the extracted content
         - is_error: True if extraction failed
     """
     is_error = False
     try:
         content = await get_page_content_requests(url, headers)
+        document = parse_html(content)
 
-        text_len = BeautifulSoup(content, "html.parser").text
-        if content is None or len(str(text_len)) < 500:
+        score = score_content(content)
+        if not score.is_good:
             print(
-                f"simple request result of {str(url)[8:50]:>45} seems bad. trying to use playwright..."
+                f"simple request result of {str(url)[8:50]:>45} seems bad ({score.words} words). trying to use playwright..."
             )
-            pw_content = await get_page_content_playwright(url, headless=headless)
-            content = await concat_htmls(
-                [("request", content), ("playwright", pw_content)]
+            count("origin.playwright_fallbacks")
+            with span("origin.playwright", host=urlparse(url).netloc):
+                pw_content = await get_page_content_playwright(url, headless=headless)
+            document = concat_documents(
+                [("request", document), ("playwright", parse_html(pw_content))]
             )
 
-            text_len = BeautifulSoup(content, "html.parser").text
-            if content is None or len(text_len) < 500:
+            if not score_content(pw_content).is_good:
                 is_error = True
     except Exception as e:
         print(f"Error processing {str(url)[8:50]:>45}: {e}")
         is_error = True
-        content = f"<h1> ERROR </h1><br><a href={url}>{url}</a><p> get origin Exception occurred: {e}</p>"
+        document = parse_html(
+            f"<h1> ERROR </h1><br><a href={url}>{url}</a><p> get origin Exception occurred: {e}</p>"
+        )
 
     # Convert trafilatura-style tables to standard HTML tables
-    content = convert_trafilatura_tables(content)
+    convert_trafilatura_tables(document)
 
-    return content, is_error
+    return document, is_error
 
 
 # Register as default handler
@@ -8,13 +8,19 @@ from __future__ import annotations
 
 import re
 
+from bs4 import BeautifulSoup
+
+from fetch_scheduler import set_host_limits
 from handlers import register_handler
 from handlers.default import default_handler
 
+# Requests are sent to the proxy, which rate-limits aggressively
+set_host_limits("xcancel.com", max_concurrency=1, rate=0.5)
+
 
 @register_handler("x.com")
 @register_handler("twitter.com")
-async def xcancel_handler(url: str, headers: dict) -> tuple[str, bool]:
+async def xcancel_handler(url: str, headers: dict) -> tuple[BeautifulSoup, bool]:
     """Handle x.com and twitter.com URLs by redirecting to xcancel.com.
 
     Uses non-headless browser mode to bypass human verification challenges.
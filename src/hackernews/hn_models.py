@@ -0,0 +1,133 @@
+"""Compact story and comment models built from Algolia ``/items/`` responses.
+
+Only the fields that are ranked or rendered are kept, in ``__slots__``
+instead of per-item dicts. Branches deeper than the generator's
+``max_depth`` are dropped while the tree is built, and ``Story.prune`` drops
+comments beyond ``max_comments_per_level`` once the tree has been ranked.
+
+Fields missing from the response are left unset, so ``get`` falls back to
+its default exactly like ``dict.get`` did for the raw response.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+
+class _Item:
+
+    __slots__ = ()
+
+    # Fields copied from the response, in addition to children
+    _FIELDS: tuple[str, ...] = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Read a field like ``dict.get``, returning ``default`` if it was missing."""
+        return getattr(self, key, default)
+
+    def to_dict(self) -> dict:
+        """Convert back to a plain dict with the same shape as the response."""
+        data = {
+            field: getattr(self, field)
+            for field in self._FIELDS
+            if hasattr(self, field)
+        }
+        data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+
+class Comment(_Item):
+
+    __slots__ = ("id", "author", "text", "points", "children")
+
+    _FIELDS = ("id", "author", "text", "points")
+
+    @classmethod
+    def from_item(cls, item: dict, max_depth: int, depth: int = 0) -> Comment:
+        """
+        Build a comment subtree from a response item.
+
+        Args:
+            item: Comment item of the ``/items/`` response
+            max_depth: Number of comment levels that are rendered
+            depth: Level of this comment (0 for first-level comments)
+
+        Returns:
+            Comment whose subtree stops at ``max_depth``
+        """
+        comment = cls.__new__(cls)
+        for field in cls._FIELDS:
+            if field in item:
+                setattr(comment, field, item[field])
+
+        children = item.get("children") or []
+        if depth + 1 < max_depth:
+            comment.children = [
+                cls.from_item(child, max_depth, depth + 1) for child in children
+            ]
+        else:
+            comment.children = []
+        return comment
+
+
+class Story(_Item):
+
+    __slots__ = (
+        "id",
+        "title",
+        "url",
+        "author",
+        "points",
+        "created_at",
+        "text",
+        "children",
+    )
+
+    _FIELDS = ("id", "title", "url", "author", "points", "created_at", "text")
+
+    @classmethod
+    def from_item(cls, item: dict, max_depth: int) -> Story:
+        """
+        Build a story and its comment tree from a response item.
+
+        Args:
+            item: Story item of the ``/items/`` response
+            max_depth: Number of comment levels that are rendered
+
+        Returns:
+            Story whose comment tree stops at ``max_depth``
+        """
+        story = cls.__new__(cls)
+        for field in cls._FIELDS:
+            if field in item:
+                setattr(story, field, item[field])
+
+        children = item.get("children") or []
+        if max_depth > 0:
+            story.children = [
+                Comment.from_item(child, max_depth) for child in children
+            ]
+        else:
+            story.children = []
+        return story
+
+    def prune(self, max_comments_per_level: list[int]) -> None:
+        """
+        Drop comments that will not be rendered. Call after ranking.
+
+        Args:
+            max_comments_per_level: Number of comments kept per level
+        """
+        level: list[_Item] = [self]
+        for limit in max_comments_per_level:
+            next_level = []
+            for node in level:
+                del node.children[limit:]
+                next_level.extend(node.children)
+            if not next_level:
+                return
+            level = next_level
+
+        # Anything below the last level is not rendered either
+        for node in level:
+            node.children = []
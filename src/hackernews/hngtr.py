@@ -4,8 +4,19 @@ import datetime
 import asyncio
 import os
 
+import http_client
+import instrumentation
+from content_extraction import EXTRACTION_MODES, configure_extraction
+from fetch_scheduler import configure_scheduler
+from html_img_embedder import configure_image_pool
+from image_cache import configure_image_cache
+from profiling import DEFAULT_SLOW_CALLBACK, profiled
+from item_cache import DEFAULT_CACHE_DIR, configure_item_cache
 from utils import get_time_range_last_week
-from hacker_spider import search_stories_byTimeRange, download_stories
+from concat_htmls import html_files_to_pdf
+from hacker_spider import get_story_dir, iter_chapters, search_stories_byTimeRange
+from retry_policy import configure_retries
+from run_journal import RunJournal
 import rich
 
 console = rich.console.Console()
@@ -20,8 +31,126 @@ def get_timestamp(date_: str) -> int:
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--cache-dir",
+    type=str,
+    help="Directory of the local item and image caches, relative to the working directory (empty string disables caching)",
+    default=DEFAULT_CACHE_DIR,
+)
+@click.option(
+    "--image-workers",
+    type=int,
+    help="Processes used to compress large images (0 compresses in the main process)",
+    default=None,
+)
+@click.option(
+    "--extract-mode",
+    type=click.Choice(EXTRACTION_MODES),
+    help="Run trafilatura extraction in worker processes or threads",
+    default=None,
+)
+@click.option(
+    "--extract-workers",
+    type=int,
+    help="Workers extracting article content (0 extracts in the event loop)",
+    default=None,
+)
+@click.option(
+    "--extract-timeout",
+    type=float,
+    help="Seconds one page may spend in extraction before it is given up on",
+    default=None,
+)
+@click.option(
+    "--max-per-host",
+    type=int,
+    help="Concurrent origin page and image requests per site without declared limits",
+    default=None,
+)
+@click.option(
+    "--max-requests",
+    type=int,
+    help="Concurrent origin page and image requests across all sites",
+    default=None,
+)
+@click.option(
+    "--retries",
+    type=int,
+    help="Tries per Algolia/Firebase request, including the first one",
+    default=None,
+)
+@click.option(
+    "--story-deadline",
+    type=float,
+    help="Seconds a story may spend fetching and ranking, retries included (0 disables)",
+    default=None,
+)
+@click.option(
+    "--hedge-after",
+    type=float,
+    help="Send a duplicate Algolia/Firebase request after this many seconds without an answer (0 disables)",
+    default=None,
+)
+@click.option(
+    "--metrics-json",
+    type=str,
+    help="Write spans and counters of the run to this file as OTLP/JSON",
+    default=None,
+)
+@click.option(
+    "--summary/--no-summary",
+    help="Print where the run spent its time when the command finishes",
+    default=True,
+)
+@click.option(
+    "--profile",
+    type=str,
+    help="Profile the run and write <PROFILE>.prof, .folded (flame graph stacks) and .loop.json (event loop timing)",
+    default=None,
+)
+@click.option(
+    "--slow-callback",
+    type=float,
+    help="With --profile, report event loop callbacks blocking longer than this many seconds",
+    default=DEFAULT_SLOW_CALLBACK,
+)
+@click.pass_context
+def cli(
+    ctx: click.Context,
+    cache_dir: str,
+    image_workers: int | None,
+    extract_mode: str | None,
+    extract_workers: int | None,
+    extract_timeout: float | None,
+    max_per_host: int | None,
+    max_requests: int | None,
+    retries: int | None,
+    story_deadline: float | None,
+    hedge_after: float | None,
+    metrics_json: str | None,
+    summary: bool,
+    profile: str | None,
+    slow_callback: float,
+):
+    configure_item_cache(cache_dir)
+    configure_image_cache(cache_dir)
+    configure_image_pool(max_workers=image_workers)
+    configure_extraction(
+        mode=extract_mode, max_workers=extract_workers, timeout=extract_timeout
+    )
+    configure_scheduler(global_concurrency=max_requests, max_concurrency=max_per_host)
+    configure_retries(
+        attempts=retries, story_deadline=story_deadline, hedge_after=hedge_after
+    )
+
+    def report():
+        if summary:
+            instrumentation.print_summary(console)
+        if metrics_json:
+            instrumentation.export_json(metrics_json)
+
+    ctx.call_on_close(report)
+    ctx.with_resource(profiled(profile, slow_callback, console=console))
 
 
 @cli.command()
@@ -58,7 +187,7 @@ def search(title: str, num: int, before: str, after: str, last_week: bool):
     \nbefore [bold yellow]'{before_timestamp} ( {datetime.datetime.fromtimestamp(before_timestamp).isoformat()} )'[/bold yellow]\
     \nafter [bold yellow]'{after_timestamp}' ( {datetime.datetime.fromtimestamp(after_timestamp).isoformat()} )[bold yellow]"
     )
-    hits = asyncio.run(
+    hits = http_client.run(
         search_stories_byTimeRange(
             num_stories=num,
             start_time=after_timestamp,
@@ -75,15 +204,58 @@ def search(title: str, num: int, before: str, after: str, last_week: bool):
 @cli.command()
 @click.argument("item_id", type=int, nargs=-1)
 @click.option("-o", "--output", type=str, help="Output directory", default="./")
-def download(item_id: list[int], output: str):
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue the last unfinished download in the output directory",
+)
+def download(item_id: list[int], output: str, resume: bool):
+    assert os.path.isdir(output), f"Output directory {output} does not exist"
+
+    target_dir = get_story_dir(output)
+    journal = RunJournal.resume(target_dir) if resume else None
+    if journal is not None:
+        item_id = journal.hits
+    else:
+        journal = RunJournal.start(target_dir, item_id)
+
     click.echo(f"Downloading items with IDs: ", nl=False)
     console.print(f"[cyan]{item_id}[/cyan]")
 
     console.print(f"Output directory: [red]{output}[/red]")
 
-    assert os.path.isdir(output), f"Output directory {output} does not exist"
+    async def download_all():
+        # 章节写入文件后即丢弃，不在内存中保留
+        async for _ in iter_chapters(
+            item_id, save_to_file=True, output_dir=output, journal=journal
+        ):
+            pass
+
+    http_client.run(download_all())
+
 
-    asyncio.run(download_stories(item_id, save_to_file=True, output_dir=output))
+@cli.command()
+@click.argument("story_dir", type=str)
+@click.option("-o", "--output", type=str, help="Output PDF file", default="outs/output.pdf")
+@click.option("--paper-size", type=str, help="Paper size, e.g. A4, A5, Letter", default="A5")
+@click.option(
+    "--workers",
+    type=int,
+    help="Processes rendering chapters in parallel (1 renders serially)",
+    default=os.cpu_count() or 1,
+)
+def pdf(story_dir: str, output: str, paper_size: str, workers: int):
+    assert os.path.isdir(story_dir), f"Story directory {story_dir} does not exist"
+
+    html_files = [
+        os.path.join(story_dir, name)
+        for name in os.listdir(story_dir)
+        if name.endswith(".html")
+    ]
+    console.print(
+        f"Rendering [bold yellow]{len(html_files)}[/bold yellow] chapters with [cyan]{workers}[/cyan] workers"
+    )
+    html_files_to_pdf(html_files, output, paper_size=paper_size, workers=workers)
 
 
 if __name__ == "__main__":
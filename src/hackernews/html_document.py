@@ -0,0 +1,40 @@
+"""Shared parsing of origin pages.
+
+An origin page is parsed once into a BeautifulSoup tree. Table conversion
+and image embedding both work on that tree, and it is serialized once when
+the chapter is written.
+"""
+
+from __future__ import annotations
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+
+    HTML_PARSER = "lxml"
+except ImportError:  # 未安装 lxml 时退回到纯 Python 解析器
+    HTML_PARSER = "html.parser"
+
+
+def parse_html(content: str | BeautifulSoup | None) -> BeautifulSoup:
+    """Parse HTML into a document tree, passing parsed documents through.
+
+    Args:
+        content: HTML string, already parsed document, or None
+
+    Returns:
+        Parsed document
+    """
+    if isinstance(content, BeautifulSoup):
+        return content
+    return BeautifulSoup(content or "", HTML_PARSER)
+
+
+def ensure_body(document: BeautifulSoup):
+    """Return the ``<body>`` of a document, creating ``<html>``/``<body>`` if missing."""
+    if document.html is None:
+        document.append(document.new_tag("html"))
+    if document.body is None:
+        document.html.append(document.new_tag("body"))
+    return document.body
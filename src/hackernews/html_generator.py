@@ -3,10 +3,128 @@ HTML Generator for Hacker News Stories to EPUB format
 Generates clean HTML suitable for Kindle devices from Hacker News JSON data
 """
 
+import io
 import json
-from typing import Dict, List, Union, Optional
+import os
+import re
+from typing import Dict, Iterator, List, Optional, TextIO, Union
+from hn_models import Comment, Story
 from utils import iso_to_string, convert_utc_to_local_v2
 
+# Stylesheet shared by all story chapters, written once per story folder and
+# once per EPUB instead of being repeated in every chapter
+STYLESHEET_NAME = "style.css"
+
+STORY_CSS = """
+body {
+    font-family: Georgia, serif;
+    font-size: 12pt;
+    line-height: 1.4;
+    margin: 20px;
+    color: #000000;
+}
+h1 {
+    font-size: 18pt;
+}
+.story-info {
+    font-size: 10pt;
+    color: #666666;
+    margin: 10px 0;
+}
+.comment {
+    border-left: 1px solid #cccccc;
+    margin: 10px 0;
+    padding-left: 10px;
+}
+.comment-header {
+    font-size: 10pt;
+    font-weight: bold;
+    margin-bottom: 5px;
+}
+.comment-text {
+    margin: 5px 0;
+}
+.comment-level-0 { margin-left: 0; }
+.comment-level-1 { margin-left: 20px; }
+.comment-level-2 { margin-left: 40px; }
+.comment-level-3 { margin-left: 60px; }
+.comment-level-4 { margin-left: 80px; }
+.comment-level-5 { margin-left: 100px; }
+table {
+    border-collapse: collapse;
+    width: 100%;
+    margin: 10px 0;
+}
+th, td {
+    border: 1px solid #999999;
+    padding: 8px;
+    text-align: left;
+}
+th {
+    background-color: #f0f0f0;
+    font-weight: bold;
+}
+"""
+
+
+def stylesheet_link(href: str = STYLESHEET_NAME) -> str:
+    """The ``<link>`` tag chapters use to reference the shared stylesheet."""
+    return f'    <link rel="stylesheet" type="text/css" href="{href}">'
+
+
+def write_stylesheet(target_dir: str) -> str:
+    """
+    Write ``STORY_CSS`` next to the chapters linking it, if not there yet
+
+    Args:
+        target_dir: Folder holding the chapters
+
+    Returns:
+        Path of the stylesheet
+    """
+    path = os.path.join(target_dir, STYLESHEET_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            if fp.read() == STORY_CSS:
+                return path
+    except OSError:
+        pass
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(STORY_CSS)
+    return path
+
+
+# Inline HN markup tokens: escaped asterisk, <URL>, bare URL, asterisk
+_INLINE_TOKEN = re.compile(
+    r"(?P<escape>\\\*)"
+    r"|<(?P<angle_url>https?://[^>]+)>"
+    r"|(?P<url>https?://[^\s<>)\]]+)"
+    r"|(?P<star>\*)"
+)
+
+_ITALIC_BLOCKERS = (" ", "\t", "\n", "*")
+_WORD_BOUNDARIES = (" ", "\t", "\n", "<", ">")
+
+
+def _italic_marker(prev_char, next_char):
+    """
+    Render one asterisk given its neighbours (None at the line edges)
+
+    Args:
+        prev_char: Character before the asterisk
+        next_char: Character after the asterisk
+
+    Returns:
+        Opening tag, closing tag or a literal asterisk
+    """
+    if next_char is not None and next_char not in _ITALIC_BLOCKERS:
+        if prev_char is None or prev_char in _WORD_BOUNDARIES:
+            return " <i>"
+    if prev_char is not None and prev_char not in _ITALIC_BLOCKERS:
+        if next_char is None or next_char in _WORD_BOUNDARIES:
+            return "</i> "
+    return "*"
+
 
 class HTMLGenerator:
 
@@ -31,140 +149,134 @@ class HTMLGenerator:
             raise ValueError()
         # self.max_comments_per_level = max_comments_per_level
 
-    def generate_html(self, story_data: Dict) -> str:
+    def generate_html(
+        self, story_data: Union[Dict, Story], stylesheet_href: Optional[str] = None
+    ) -> str:
         """
         Generate HTML from story data
 
         Args:
-            story_data: Dictionary containing the story data from Hacker News API
+            story_data: Story model, or dictionary containing the story data
+                from Hacker News API
+            stylesheet_href: Link to a shared stylesheet holding ``STORY_CSS``;
+                the styles are inlined when None
 
         Returns:
             String containing the generated HTML
         """
-        html = [
-            "<!DOCTYPE html>",
-            '<html lang="en">',
-            "<head>",
-            '    <meta charset="UTF-8">',
-            '    <meta name="viewport" content="width=device-width, initial-scale=1.0">',
+        buffer = io.StringIO()
+        self.write_html(story_data, buffer, stylesheet_href)
+        return buffer.getvalue()
+
+    def write_html(
+        self,
+        story_data: Union[Dict, Story],
+        out: TextIO,
+        stylesheet_href: Optional[str] = None,
+    ):
+        """
+        Render a story chapter into a file-like sink, piece by piece
+
+        Args:
+            story_data: Story model or dictionary containing the story data
+            out: Anything with a ``write(str)`` method
+            stylesheet_href: Link to a shared stylesheet holding ``STORY_CSS``;
+                the styles are inlined when None
+        """
+        write = out.write
+        for line in self._iter_story_lines(story_data, stylesheet_href):
+            write(line)
+            write("\n")
+
+    def _iter_story_lines(
+        self, story_data: Union[Dict, Story], stylesheet_href: Optional[str]
+    ) -> Iterator[str]:
+        """
+        Generate the HTML lines of a story chapter
+
+        Args:
+            story_data: Story model or dictionary containing the story data
+            stylesheet_href: Link to a shared stylesheet, or None to inline it
+
+        Yields:
+            Lines of HTML, without line breaks
+        """
+        yield "<!DOCTYPE html>"
+        yield '<html lang="en">'
+        yield "<head>"
+        yield '    <meta charset="UTF-8">'
+        yield '    <meta name="viewport" content="width=device-width, initial-scale=1.0">'
+        yield (
             "    <title>"
             + self._escape_html(story_data.get("title", "Hacker News Story"))
-            + "</title>",
-            "    <style>",
-            "        body {",
-            "            font-family: Georgia, serif;",
-            "            font-size: 12pt;",
-            "            line-height: 1.4;",
-            "            margin: 20px;",
-            "            color: #000000;",
-            "        }",
-            "        h1 {",
-            "            font-size: 18pt;",
-            "        }",
-            "        .story-info {",
-            "            font-size: 10pt;",
-            "            color: #666666;",
-            "            margin: 10px 0;",
-            "        }",
-            "        .comment {",
-            "            border-left: 1px solid #cccccc;",
-            "            margin: 10px 0;",
-            "            padding-left: 10px;",
-            "        }",
-            "        .comment-header {",
-            "            font-size: 10pt;",
-            "            font-weight: bold;",
-            "            margin-bottom: 5px;",
-            "        }",
-            "        .comment-text {",
-            "            margin: 5px 0;",
-            "        }",
-            "        .comment-level-0 { margin-left: 0; }",
-            "        .comment-level-1 { margin-left: 20px; }",
-            "        .comment-level-2 { margin-left: 40px; }",
-            "        .comment-level-3 { margin-left: 60px; }",
-            "        .comment-level-4 { margin-left: 80px; }",
-            "        .comment-level-5 { margin-left: 100px; }",
-            "    </style>",
-            "</head>",
-            "<body>",
-        ]
+            + "</title>"
+        )
+        if stylesheet_href is None:
+            yield f"    <style>{STORY_CSS}</style>"
+        else:
+            yield stylesheet_link(stylesheet_href)
+        yield "</head>"
+        yield "<body>"
 
         # Add story title and info
-        html.extend(
-            [
-                f"<a href='{story_data.get('url', '#')}'>jump to url</a>"
-                f"<h1>{self._escape_html(story_data.get('title', 'Untitled'))}</h1>",
-                f'<div class="story-info">',
-                f"  <p>Author: {self._escape_html(story_data.get('author', 'Unknown'))} | ",
-                f"  Points: {story_data.get('points', 0)} | ",
-                f"  Posted: {convert_utc_to_local_v2(story_data.get('created_at', '1999-09-09T11:45:14.000Z'))}</p>",
-                f"</div>",
-            ]
+        yield (
+            f"<a href='{story_data.get('url', '#')}'>jump to url</a>"
+            f"<h1>{self._escape_html(story_data.get('title', 'Untitled'))}</h1>"
         )
+        yield '<div class="story-info">'
+        yield f"  <p>Author: {self._escape_html(story_data.get('author', 'Unknown'))} | "
+        yield f"  Points: {story_data.get('points', 0)} | "
+        yield f"  Posted: {convert_utc_to_local_v2(story_data.get('created_at', '1999-09-09T11:45:14.000Z'))}</p>"
+        yield "</div>"
 
         # Add story text if available
         story_text = story_data.get("text")
         if story_text:
-            html.append(
-                f'<div class="story-text">{self._format_text(story_text)}</div>'
-            )
+            yield f'<div class="story-text">{self._format_text(story_text)}</div>'
 
         # Add comments
-        children = story_data.get("children", [])
-        html.append('<div class="comments-section">')
-        html.append("<h2>Comments</h2>")
-        html.append(self._generate_comments_html(children, 0))
-        html.append("</div>")
+        yield '<div class="comments-section">'
+        yield "<h2>Comments</h2>"
+        yield from self._iter_comment_lines(story_data.get("children", []), 0)
+        yield "</div>"
 
-        # Close HTML
-        html.extend(["</body>", "</html>"])
+        yield "</body>"
+        yield "</html>"
 
-        return "\n".join(html)
-
-    def _generate_comments_html(self, comments: List[Dict], level: int) -> str:
+    def _iter_comment_lines(
+        self, comments: List[Union[Dict, Comment]], level: int
+    ) -> Iterator[str]:
         """
-        Generate HTML for comments recursively
+        Generate HTML lines for comments recursively
 
         Args:
-            comments: List of comment dictionaries
+            comments: List of comment models or dictionaries
             level: Current nesting level
 
-        Returns:
-            String containing the generated HTML for comments
+        Yields:
+            Lines of HTML for the comments and their replies
         """
         if level >= self.max_depth:
-            return ""
-
-        html = []
-        comments_to_process = comments[: self.max_comments_per_level[level]]
+            return
 
-        for comment in comments_to_process:
+        for comment in comments[: self.max_comments_per_level[level]]:
             # Comment header with author and metadata
-            html.extend(
-                [
-                    f'<div class="comment comment-level-{level}">',
-                    f'  <div class="comment-header">',
-                    f"    {self._escape_html(comment.get('author', 'Anonymous'))}",
-                    f"  </div>",
-                ]
-            )
+            yield f'<div class="comment comment-level-{level}">'
+            yield '  <div class="comment-header">'
+            yield f"    {self._escape_html(comment.get('author', 'Anonymous'))}"
+            yield "  </div>"
 
             # Comment text
             comment_text = comment.get("text")
             if comment_text:
-                html.append(
-                    f'  <div class="comment-text">{self._format_text(comment_text)}</div>'
-                )
+                yield f'  <div class="comment-text">{self._format_text(comment_text)}</div>'
 
             # Process child comments recursively
             children = comment.get("children", [])
             if children and level < self.max_depth - 1:
-                html.append(self._generate_comments_html(children, level + 1))
-
-            html.append("</div>")
+                yield from self._iter_comment_lines(children, level + 1)
 
-        return "\n".join(html)
+            yield "</div>"
 
     def _escape_html(self, text: str) -> str:
         """
@@ -255,6 +367,12 @@ class HTMLGenerator:
         """
         Process inline markup within a line (italics, URLs, escapes)
 
+        Single pass over the tokens matched by ``_INLINE_TOKEN``. An asterisk
+        is rendered as italics depending only on its neighbours, where a link
+        counts as surrounded by spaces and an escaped asterisk as a word
+        character, so the output matches what ``_parse_italics`` produces on
+        the fully substituted line.
+
         Args:
             line: Single line of text
 
@@ -264,48 +382,90 @@ class HTMLGenerator:
         if not line:
             return ""
 
-        import re
-
-        # First, handle escapes (\* for literal asterisk)
-        # Need to process this before handling italics
-        result = line.replace('\\*', 'ESCAPED_ASTERISK')
-
-        # Handle URLs in <angle brackets> first - replace with a temporary marker
-        # This prevents nested <a> tags
-        def angle_bracket_url_replacer(match):
-            url = match.group(1)
-            # Create a unique marker
-            marker = f'__URL_MARKER_{len(url)}_{hash(url)}__'
-            # Store the URL for later replacement
-            if not hasattr(self, '_url_markers'):
-                self._url_markers = {}
-            self._url_markers[marker] = url
-            return f' {marker} '
-
-        result = re.sub(r'<(https?://[^>]+)>', angle_bracket_url_replacer, result)
-
-        # Handle regular URLs - convert to links
-        def url_replacer(match):
-            url = match.group(1)
-            return f' <a href="{url}">{url}</a> '
+        tokens = list(_INLINE_TOKEN.finditer(line))
+        if not tokens:
+            return line
 
-        url_pattern = r'(https?://[^\s<>)\]]+)'
-        result = re.sub(url_pattern, url_replacer, result)
+        result = []
+        pos = 0
+        length = len(line)
+        for idx, match in enumerate(tokens):
+            start, end = match.span()
+            if start > pos:
+                result.append(line[pos:start])
+            pos = end
+
+            kind = match.lastgroup
+            if kind == "escape":
+                result.append("*")
+            elif kind == "angle_url":
+                url = match.group("angle_url").replace("\\*", "*")
+                result.append(f'  <a href="{url}">{url}</a>  ')
+            elif kind == "url":
+                result.append(self._render_url(match.group("url")))
+            else:
+                prev_char = self._neighbour_char(
+                    line, tokens, idx - 1, start - 1, before=True
+                )
+                next_char = (
+                    self._neighbour_char(line, tokens, idx + 1, end, before=False)
+                    if end < length
+                    else None
+                )
+                result.append(_italic_marker(prev_char, next_char))
 
-        # Handle italics (*text*)
-        # Need to find matching asterisk pairs
-        result = self._parse_italics(result)
+        if pos < length:
+            result.append(line[pos:])
+        return "".join(result)
 
-        # Convert URL markers back to links
-        if hasattr(self, '_url_markers'):
-            for marker, url in self._url_markers.items():
-                result = result.replace(marker, f' <a href="{url}">{url}</a> ')
-            self._url_markers.clear()
+    @staticmethod
+    def _neighbour_char(line, tokens, token_idx, char_idx, before):
+        """
+        Character next to an asterisk as seen by the italics rules
 
-        # Convert escaped asterisks back
-        result = result.replace('ESCAPED_ASTERISK', '*')
+        Args:
+            line: Line being processed
+            tokens: All inline tokens of the line
+            token_idx: Index of the token that may cover ``char_idx``
+            char_idx: Position of the neighbouring character in ``line``
+            before: Whether the neighbour precedes the asterisk
 
-        return result
+        Returns:
+            The neighbouring character, or None at the start of the line
+        """
+        if char_idx < 0:
+            return None
+        if 0 <= token_idx < len(tokens):
+            token = tokens[token_idx]
+            covered = (
+                token.end() == char_idx + 1 if before else token.start() == char_idx
+            )
+            if covered:
+                kind = token.lastgroup
+                if kind in ("angle_url", "url"):
+                    return " "
+                if kind == "escape":
+                    # Escaped asterisks behave like a word character
+                    return "E"
+        return line[char_idx]
+
+    def _render_url(self, url: str) -> str:
+        """
+        Render a bare URL as a link
+
+        Args:
+            url: URL as written in the text
+
+        Returns:
+            Link HTML, padded with spaces
+        """
+        if "*" not in url:
+            return f' <a href="{url}">{url}</a> '
+
+        # Rare: asterisks inside the link are still subject to italics
+        escaped = url.replace("\\*", "\x00")
+        link = self._parse_italics(f' <a href="{escaped}">{escaped}</a> ')
+        return link.replace("\x00", "*")
 
     def _parse_italics(self, text: str) -> str:
         """
@@ -379,17 +539,22 @@ class HTMLGenerator:
 
         return result
 
-    def save_html(self, story_data: Dict, filename: str):
+    def save_html(
+        self,
+        story_data: Union[Dict, Story],
+        filename: str,
+        stylesheet_href: Optional[str] = None,
+    ):
         """
         Generate HTML from story data and save to file
 
         Args:
-            story_data: Dictionary containing the story data
+            story_data: Story model or dictionary containing the story data
             filename: Output filename
+            stylesheet_href: Link to a shared stylesheet, see ``write_html``
         """
-        html_content = self.generate_html(story_data)
         with open(filename, "w", encoding="utf-8") as f:
-            f.write(html_content)
+            self.write_html(story_data, f, stylesheet_href)
 
 
 # Example usage
@@ -1,32 +1,133 @@
 import asyncio
 import base64
+import hashlib
 import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-import httpx
 from PIL import Image
 from io import BytesIO
 
+import fetch_scheduler
+import image_cache
+from html_document import ensure_body, parse_html
+from instrumentation import count, span
+
+# 独立图片文件在章节 HTML 中的引用前缀，相对于章节文件所在目录
+IMAGE_HREF_PREFIX = "images/"
+
+MIME_TO_EXTENSION = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/svg+xml": ".svg",
+    "image/webp": ".webp",
+    "image/x-icon": ".ico",
+    "image/bmp": ".bmp",
+    "image/avif": ".avif",
+}
+
+# 图片压缩进程池配置：小于 inline_threshold 字节的图片直接在事件循环中压缩
+_IMAGE_POOL_CONFIG = {
+    "max_workers": os.cpu_count() or 1,
+    "inline_threshold": 256 * 1024,
+}
+_image_pool: ProcessPoolExecutor | None = None
+
+
+def configure_image_pool(max_workers=None, inline_threshold=None):
+    """
+    配置图片压缩进程池
+
+    Args:
+        max_workers: 进程数，0 表示始终在当前进程内压缩
+        inline_threshold: 小于该字节数的图片不进入进程池
+    """
+    global _image_pool
+    if max_workers is not None:
+        _IMAGE_POOL_CONFIG["max_workers"] = max_workers
+        if _image_pool is not None:
+            _image_pool.shutdown(wait=False)
+            _image_pool = None
+    if inline_threshold is not None:
+        _IMAGE_POOL_CONFIG["inline_threshold"] = inline_threshold
+
+
+def get_image_pool():
+    """获取共享的图片压缩进程池，未启用时返回 None"""
+    global _image_pool
+    if _IMAGE_POOL_CONFIG["max_workers"] <= 0:
+        return None
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=_IMAGE_POOL_CONFIG["max_workers"])
+    return _image_pool
+
+
+def compress_image_data(image_data, max_image_size):
+    """
+    压缩图片大小，可在子进程中运行
+    :param image_data: 原始图片数据
+    :param max_image_size: 最大尺寸 (width, height)
+    :return: (结果数据, 压缩后大小, CPU耗时秒数)，压缩后更大时结果为原始数据
+    """
+    start = time.process_time()
+    image = Image.open(BytesIO(image_data))
+
+    # 按比例压缩图片
+    if image.size[0] > max_image_size[0] or image.size[1] > max_image_size[1]:
+        image.thumbnail(max_image_size, Image.Resampling.LANCZOS)
+
+    # 保持图片格式不变，保留透明度
+    output = BytesIO()
+    if image.format:
+        image.save(output, format=image.format, optimize=True, compress_level=5)
+    else:
+        image.save(output, format="JPEG", quality=75, optimize=True)
+
+    compressed_data = output.getvalue()
+    output.close()
+    cpu_time = time.process_time() - start
+
+    # 只有当压缩后的数据更小时才返回压缩后的数据
+    if len(compressed_data) < len(image_data):
+        return compressed_data, len(compressed_data), cpu_time
+    return image_data, len(compressed_data), cpu_time
+
+
+def write_image_once(image_dir, file_path, image_data):
+    """写入图片文件，已存在的文件（相同内容哈希）不重复写入；在线程中运行"""
+    if os.path.exists(file_path):
+        return
+    os.makedirs(image_dir, exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(image_data)
+
 
 class HTMLImageEmbedder:
 
-    def __init__(self, base_url, timeout=30, max_image_size=(900, 1200)):
+    def __init__(
+        self, base_url, timeout=30, max_image_size=(900, 1200), image_dir=None
+    ):
         self.base_url = base_url
         self.timeout = timeout
         self.max_image_size = max_image_size  # 适用于Kindle设备的最大图片尺寸
-        self.client = None
+        # 设置后图片保存为独立文件（EPUB 资源），不再内嵌为 base64
+        self.image_dir = image_dir
         self.total_images = 0
         self.successful_downloads = 0
         self.compression_ratios = []
+        self.bytes_saved = 0
+        self.compress_cpu_time = 0.0
 
     async def __aenter__(self):
-        self.client = httpx.AsyncClient(timeout=self.timeout)
+        # 连接由 http_client 的共享连接池管理，每个主机的并发和速率由
+        # fetch_scheduler 限制，这里无需创建客户端
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.client:
-            await self.client.aclose()
+        pass
 
     def is_data_uri(self, src):
         """检查是否已经是data URI"""
@@ -48,55 +149,93 @@ class HTMLImageEmbedder:
 
     def compress_image(self, image_data):
         """
-        压缩图片大小
+        压缩图片大小（同步执行）
         :param image_data: 原始图片数据
-        :param max_size: 最大尺寸 (width, height)
         :return: 压缩后的图片数据
         """
-        image = Image.open(BytesIO(image_data))
-
-        # 保存原始模式
-        original_mode = image.mode
-
-        # 按比例压缩图片
-        if (
-            image.size[0] > self.max_image_size[0]
-            or image.size[1] > self.max_image_size[1]
-        ):
-            image.thumbnail(self.max_image_size, Image.Resampling.LANCZOS)
-        # image.thumbnail(self.max_image_size, Image.Resampling.LANCZOS)
-
-        # 保持图片模式不变，保留透明度
-        output = BytesIO()
-        # if image.format == "PNG" or original_mode in ("RGBA", "LA", "P"):
-        #     # 对于PNG或带透明度的图片，保存为PNG格式以保留透明度
-        #     image.save(output, format="PNG", optimize=True, compress_level=3)
-        #     self.mime_type = "image/png"
-        # else:
-        #     # 对于其他格式，保存为JPEG
-        #     image.save(output, format="JPEG", quality=85, optimize=True)
-        #     self.mime_type = "image/jpeg"
-        if image.format:
-            image.save(output, format=image.format, optimize=True, compress_level=5)
-        else:
-            image.save(output, format="JPEG", quality=75, optimize=True)
+        result, compressed_size, cpu_time = compress_image_data(
+            image_data, self.max_image_size
+        )
+        self.record_compression(len(image_data), result, compressed_size, cpu_time)
+        return result
 
-        compressed_data = output.getvalue()
-        output.close()
+    async def compress_image_async(self, image_data):
+        """
+        压缩图片大小，大图片交给进程池处理以免阻塞事件循环
+        :param image_data: 原始图片数据
+        :return: 压缩后的图片数据
+        """
+        pool = get_image_pool()
+        if pool is None or len(image_data) < _IMAGE_POOL_CONFIG["inline_threshold"]:
+            return self.compress_image(image_data)
 
-        # 只有当压缩后的数据更小时才返回压缩后的数据
-        compression_ratio = len(compressed_data) / len(image_data)
-        print(f"图片压缩比 {compression_ratio:.2f}")
+        loop = asyncio.get_running_loop()
+        result, compressed_size, cpu_time = await loop.run_in_executor(
+            pool, compress_image_data, image_data, tuple(self.max_image_size)
+        )
+        self.record_compression(len(image_data), result, compressed_size, cpu_time)
+        return result
+
+    def record_compression(self, original_size, result, compressed_size, cpu_time):
+        """记录单张图片的压缩比、节省字节数和CPU耗时"""
+        compression_ratio = compressed_size / original_size
+        bytes_saved = original_size - len(result)
+        print(
+            f"图片压缩比 {compression_ratio:.2f} 节省 {bytes_saved / 1024:.1f}KB CPU {cpu_time * 1000:.0f}ms"
+        )
         self.compression_ratios.append(compression_ratio)
-        if len(compressed_data) < len(image_data):
-            return compressed_data
-        else:
-            return image_data
+        self.bytes_saved += bytes_saved
+        self.compress_cpu_time += cpu_time
 
     async def download_image(self, url):
-        """下载并压缩图片，返回base64编码的data URI"""
+        """下载并压缩图片，返回base64编码的data URI；设置了 image_dir 时返回图片文件的相对路径"""
+        image = await self.fetch_image(url)
+        if image is None:
+            return None
+
+        image_data, content_type = image
+        if self.image_dir is None:
+            return self.to_data_uri(image_data, content_type)
+        return await self.store_image_file(image_data, content_type)
+
+    async def fetch_image(self, url):
+        """下载并压缩图片，返回 (压缩后的数据, MIME类型)
+
+        已缓存的图片直接从 image_cache 读取压缩结果；过期的缓存通过
+        ETag/Last-Modified 重新验证，未变化时无需重新下载和压缩。
+        """
         try:
-            response = await self.client.get(url, follow_redirects=True)
+            meta = image_cache.get_url_meta(url)
+            if meta is not None and image_cache.is_fresh(meta):
+                cached = image_cache.get_variant(meta["hash"], self.max_image_size)
+                if cached is not None:
+                    return cached, meta["content_type"]
+
+            request_headers = image_cache.revalidation_headers(meta) if meta else {}
+            response = await fetch_scheduler.request(
+                "GET",
+                url,
+                headers=request_headers,
+                timeout=self.timeout,
+                follow_redirects=True,
+            )
+
+            if response.status_code == 304 and meta is not None:
+                cached = image_cache.get_variant(meta["hash"], self.max_image_size)
+                if cached is not None:
+                    image_cache.put_url_meta(
+                        url,
+                        meta["hash"],
+                        meta["content_type"],
+                        meta.get("etag"),
+                        meta.get("last_modified"),
+                    )
+                    return cached, meta["content_type"]
+                # 压缩结果已被淘汰，重新完整下载
+                response = await fetch_scheduler.request(
+                    "GET", url, timeout=self.timeout, follow_redirects=True
+                )
+
             response.raise_for_status()
 
             # 获取图片的MIME类型
@@ -106,23 +245,53 @@ class HTMLImageEmbedder:
 
             # 获取原始图片数据
             image_data = response.content
-
-            try:
-                # 使用新的压缩方法处理图片
-                compressed_image_data = self.compress_image(image_data)
-            except Exception as e:
-                # 如果处理图片时出错，使用原始图片数据
-                print(f"压缩图片失败 {str(url)[:50]}: {e}")
-                compressed_image_data = image_data
-
-            # 转换为base64
-            image_data_base64 = base64.b64encode(compressed_image_data).decode("utf-8")
-            return f"data:{content_type};base64,{image_data_base64}"
+            image_hash = image_cache.content_hash(image_data)
+
+            # 其他URL可能已经提供过相同内容的图片
+            compressed_image_data = image_cache.get_variant(
+                image_hash, self.max_image_size
+            )
+            if compressed_image_data is None:
+                try:
+                    # 使用新的压缩方法处理图片
+                    compressed_image_data = await self.compress_image_async(
+                        image_data
+                    )
+                except Exception as e:
+                    # 如果处理图片时出错，使用原始图片数据
+                    print(f"压缩图片失败 {str(url)[:50]}: {e}")
+                    compressed_image_data = image_data
+                image_cache.put_variant(
+                    image_hash, self.max_image_size, compressed_image_data
+                )
+
+            image_cache.put_url_meta(
+                url,
+                image_hash,
+                content_type,
+                response.headers.get("etag"),
+                response.headers.get("last-modified"),
+            )
+            return compressed_image_data, content_type
 
         except Exception as e:
             print(f"下载图片失败 {str(url)[:50]}: {e}")
             return None
 
+    def to_data_uri(self, image_data, content_type):
+        """将图片数据转换为base64编码的data URI"""
+        image_data_base64 = base64.b64encode(image_data).decode("utf-8")
+        return f"data:{content_type};base64,{image_data_base64}"
+
+    async def store_image_file(self, image_data, content_type):
+        """将图片按内容哈希写入 image_dir，相同图片只保存一次，返回相对路径"""
+        extension = MIME_TO_EXTENSION.get(content_type.split(";")[0].strip(), ".img")
+        file_name = hashlib.sha256(image_data).hexdigest()[:24] + extension
+        file_path = os.path.join(self.image_dir, file_name)
+        # 文件系统操作放到线程中，不阻塞事件循环
+        await asyncio.to_thread(write_image_once, self.image_dir, file_path, image_data)
+        return IMAGE_HREF_PREFIX + file_name
+
     def guess_mime_type(self, url):
         """根据文件扩展名猜测MIME类型"""
         extension_to_mime = {
@@ -141,8 +310,10 @@ class HTMLImageEmbedder:
 
     async def process_html(self, html_content):
         """处理HTML内容，嵌入图片"""
-        soup = BeautifulSoup(html_content, "html.parser")
+        return str(await self.process_soup(parse_html(html_content)))
 
+    async def process_soup(self, soup):
+        """在已解析的文档上原地嵌入图片，返回同一文档"""
         img_srcs = [(label, label.get("src", "")) for label in soup.find_all("img")]
         graphic_srcs = [
             (label, label.get("src", "")) for label in soup.find_all("graphic")
@@ -209,7 +380,7 @@ class HTMLImageEmbedder:
                 # print(f"保留原链接: {url}")
                 pass
 
-        return str(soup)
+        return soup
 
     async def process_html_string(self, html_string):
         """
@@ -242,6 +413,8 @@ class HTMLImageEmbedder:
         <li style="margin-bottom: 5px;"><strong>探测到的图片标签数:</strong> {self.total_images}</li>
         <li style="margin-bottom: 5px;"><strong>成功获取的图片数:</strong> {self.successful_downloads}</li>
         <li style="margin-bottom: 5px;"><strong>图片平均压缩率:</strong> {avg_compression:.2%}</li>
+        <li style="margin-bottom: 5px;"><strong>压缩节省:</strong> {self.bytes_saved / 1024:.1f} KB</li>
+        <li style="margin-bottom: 5px;"><strong>压缩CPU耗时:</strong> {self.compress_cpu_time:.2f} s</li>
         <li style="margin-bottom: 5px;"><strong>本页URL:</strong> <a href="{page_url}" style="color: #0066cc;">{page_url}</a></li>
     </ul>
 </div>
@@ -250,34 +423,25 @@ class HTMLImageEmbedder:
 
     def embed_stats(self, html_content, stats_html):
         """将统计信息嵌入HTML中"""
-        soup = BeautifulSoup(html_content, "html.parser")
-        # print(html_content[:100])
+        return str(self.append_stats(parse_html(html_content), stats_html))
+
+    def append_stats(self, soup, stats_html):
+        """将统计信息原地追加到已解析文档的 body 末尾，返回同一文档"""
         # 创建包装div并设置样式
         wrapper_div = soup.new_tag("div")
         wrapper_div["style"] = (
             "margin-top: 40px; padding: 15px; background-color: #f5f5f5; border-top: 2px solid #ccc; font-family: Arial, sans-serif;"
         )
 
-        # 解析stats_html为BeautifulSoup对象
+        # 解析stats_html为BeautifulSoup对象（片段，不补全 html/body）
         stats_soup = BeautifulSoup(stats_html, "html.parser")
 
         # 将统计信息添加到包装div中
         wrapper_div.append(stats_soup)
 
-        if soup.html is None:
-            # 如果没有html标签，创建一个
-            html_tag = soup.new_tag("html")
-            soup.append(html_tag)
-
-        # 确保body标签存在
-        if soup.body is None:
-            # 如果没有body标签，创建一个
-            body_tag = soup.new_tag("body")
-            soup.html.append(body_tag)
-
-        # 将包装div插入到body的末尾
-        soup.body.append(wrapper_div)
-        return str(soup)
+        # 将包装div插入到body的末尾，缺少 html/body 标签时先创建
+        ensure_body(soup).append(wrapper_div)
+        return soup
 
 
 # deprecated
@@ -318,17 +482,21 @@ async def embed_images_in_html(
     return output_file_path
 
 
-async def embed_images_in_html_string(html_string, url, max_image_size=(900, 1200)):
+async def embed_images_in_html_string(
+    html_string, url, max_image_size=(900, 1200), image_dir=None
+):
     """
     主函数：将HTML字符串中的图片转换为内嵌base64格式
 
     Args:
-        html_string: 输入的HTML字符串
+        html_string: 输入的HTML字符串，或 handler 已解析好的文档（不再重复解析）
         url: 原始页面的完整URL
         max_image_size: 图片最大尺寸（宽，高），默认为(1200, 1600)适用于Kindle设备
+        image_dir: 图片保存目录。设置后图片写入该目录并以 images/<哈希>.<扩展名>
+            引用，供 EPUB 作为独立资源打包，而不是内嵌为 base64
 
     Returns:
-        处理后的HTML字符串，其中图片已转换为base64内嵌格式
+        处理后的HTML字符串，其中图片已转换为base64内嵌格式或本地文件引用
     """
     # 解析URL，获取完整的页面路径作为base_url
     # 这样urljoin可以正确处理：
@@ -339,14 +507,21 @@ async def embed_images_in_html_string(html_string, url, max_image_size=(900, 120
     base_url = str(parsed_url.scheme) + "://" + str(parsed_url.netloc) + str(parsed_url.path)
 
     # 处理HTML
-    async with HTMLImageEmbedder(base_url, max_image_size=max_image_size) as embedder:
-        processed_html = await embedder.process_html_string(html_string)
-        # 在HTML末尾添加统计信息
-        stats_html = embedder.generate_stats_html(url)
-        # processed_html = processed_html.rstrip() + "\n" + stats_html
-        processed_html = embedder.embed_stats(processed_html, stats_html)
-
-    return processed_html
+    async with HTMLImageEmbedder(
+        base_url, max_image_size=max_image_size, image_dir=image_dir
+    ) as embedder:
+        with span("origin.embed_images", host=parsed_url.netloc) as attributes:
+            # 图片嵌入与统计信息都在同一棵文档树上进行，最后只序列化一次
+            document = await embedder.process_soup(parse_html(html_string))
+            # 在HTML末尾添加统计信息
+            embedder.append_stats(document, embedder.generate_stats_html(url))
+            attributes["images"] = embedder.total_images
+            attributes["embedded"] = embedder.successful_downloads
+        count("images.found", embedder.total_images)
+        count("images.embedded", embedder.successful_downloads)
+        count("images.bytes_saved", embedder.bytes_saved)
+
+    return str(document)
 
 
 # 使用示例
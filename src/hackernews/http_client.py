@@ -0,0 +1,186 @@
+"""Process-wide pooled HTTP clients.
+
+Every Algolia, Firebase, origin page and image request goes through
+``get_client`` so that connections to the same host are kept alive and
+reused instead of paying a TCP/TLS handshake per request.
+
+One ``httpx.AsyncClient`` is kept per (host, verify) pair, which gives every
+host its own connection pool. HTTP/2 is enabled automatically when the
+optional ``h2`` package is installed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Coroutine
+from typing import Any, TypeVar
+from urllib.parse import urlparse
+
+import httpx
+
+import instrumentation
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+T = TypeVar("T")
+
+# Pool settings, applied to clients created after ``configure_clients``
+_CLIENT_CONFIG: dict[str, Any] = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+    "http2": HTTP2_AVAILABLE,
+    "timeout": 30.0,
+}
+
+# Transport shared by new clients instead of real connections, see
+# ``set_transport`` (used by the offline benchmarks to replay fixtures)
+_transport: httpx.AsyncBaseTransport | None = None
+
+# Creates the event loop of ``run``, see ``set_loop_factory`` (used by the
+# profiler when it cannot time loop callbacks itself)
+_loop_factory: Callable[[], asyncio.AbstractEventLoop] | None = None
+
+# Registry: (host, verify) -> client
+_CLIENTS: dict[tuple[str, bool], httpx.AsyncClient] = {}
+
+# Clients are bound to the event loop they were created on
+_clients_loop: asyncio.AbstractEventLoop | None = None
+
+
+def configure_clients(
+    max_connections: int | None = None,
+    max_keepalive_connections: int | None = None,
+    keepalive_expiry: float | None = None,
+    http2: bool | None = None,
+    timeout: float | None = None,
+) -> None:
+    """Configure connection pool limits for clients created from now on.
+
+    Args:
+        max_connections: Maximum concurrent connections per host
+        max_keepalive_connections: Maximum idle keep-alive connections per host
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Whether to negotiate HTTP/2 (ignored if ``h2`` is missing)
+        timeout: Default request timeout in seconds
+    """
+    updates = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "http2": http2,
+        "timeout": timeout,
+    }
+    for key, value in updates.items():
+        if value is not None:
+            _CLIENT_CONFIG[key] = value
+
+    if not HTTP2_AVAILABLE:
+        _CLIENT_CONFIG["http2"] = False
+
+
+def set_transport(transport: httpx.AsyncBaseTransport | None) -> None:
+    """Route every request through ``transport`` instead of the network.
+
+    Clients created before the call keep their transport, so call this before
+    the first request of a run. ``None`` restores real connections.
+
+    Args:
+        transport: Transport handling all requests, or None
+    """
+    global _transport
+    _transport = transport
+    _CLIENTS.clear()
+
+
+def set_loop_factory(
+    factory: Callable[[], asyncio.AbstractEventLoop] | None,
+) -> None:
+    """Create the event loops of ``run`` with ``factory``.
+
+    Args:
+        factory: Returns a new event loop, or None for the default loop
+    """
+    global _loop_factory
+    _loop_factory = factory
+
+
+def _new_client(verify: bool) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=_CLIENT_CONFIG["max_connections"],
+        max_keepalive_connections=_CLIENT_CONFIG["max_keepalive_connections"],
+        keepalive_expiry=_CLIENT_CONFIG["keepalive_expiry"],
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        http2=_CLIENT_CONFIG["http2"],
+        timeout=_CLIENT_CONFIG["timeout"],
+        verify=verify,
+        transport=_transport,
+        event_hooks={
+            "request": [instrumentation.on_request],
+            "response": [instrumentation.on_response],
+        },
+    )
+
+
+def get_client(url: str, verify: bool = True) -> httpx.AsyncClient:
+    """Get the shared client for the host of ``url``.
+
+    Must be called from inside a running event loop. Clients left over from
+    a previous (closed) loop are discarded and recreated.
+
+    Args:
+        url: Any URL on the target host
+        verify: Whether to verify TLS certificates
+
+    Returns:
+        Pooled ``httpx.AsyncClient`` for that host
+    """
+    global _clients_loop
+
+    loop = asyncio.get_running_loop()
+    if _clients_loop is not loop:
+        _CLIENTS.clear()
+        _clients_loop = loop
+
+    key = (urlparse(url).netloc.lower(), verify)
+    client = _CLIENTS.get(key)
+    if client is None or client.is_closed:
+        client = _new_client(verify)
+        _CLIENTS[key] = client
+    return client
+
+
+async def close_clients() -> None:
+    """Close every pooled client of the current event loop."""
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    await asyncio.gather(
+        *(client.aclose() for client in clients), return_exceptions=True
+    )
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    """Run ``coro`` like ``asyncio.run`` and close pooled clients afterwards.
+
+    Args:
+        coro: Top-level coroutine of an entry point
+
+    Returns:
+        Result of ``coro``
+    """
+
+    async def _runner() -> T:
+        try:
+            return await coro
+        finally:
+            await close_clients()
+
+    with asyncio.Runner(loop_factory=_loop_factory) as runner:
+        return runner.run(_runner())
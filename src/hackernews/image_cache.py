@@ -0,0 +1,135 @@
+"""Persistent cross-story cache of compressed images.
+
+Two kinds of entries share one size-bounded ``DiskCache``:
+
+- ``url:<url>`` holds the response metadata of an image URL: content hash,
+  MIME type, ``ETag`` and ``Last-Modified`` for revalidation.
+- ``variant:<hash>:<w>x<h>`` holds the already-compressed bytes of an image
+  for one ``max_image_size``. Different URLs serving the same bytes share
+  their variants.
+
+The cache is ``images.sqlite3`` in the item cache directory (``cache/`` under
+the working directory unless ``--cache-dir`` says otherwise).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+
+from disk_cache import DiskCache
+from instrumentation import count
+from item_cache import DEFAULT_CACHE_DIR
+
+# URL metadata younger than this is trusted without revalidation
+FRESH_SECONDS = 60 * 60 * 24 * 7
+
+_cache_dir: str | None = DEFAULT_CACHE_DIR
+_max_bytes = 1024 * 1024 * 1024
+_cache: DiskCache | None = None
+
+
+def configure_image_cache(
+    cache_dir: str | None, max_bytes: int = 1024 * 1024 * 1024
+) -> None:
+    """Set where images are cached.
+
+    Args:
+        cache_dir: Cache directory, or None / empty string to disable caching
+        max_bytes: Maximum cache size before LRU eviction
+    """
+    global _cache_dir, _max_bytes, _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+    _cache_dir = cache_dir or None
+    _max_bytes = max_bytes
+
+
+def _get_cache() -> DiskCache | None:
+    global _cache
+    if _cache is None and _cache_dir is not None:
+        _cache = DiskCache(os.path.join(_cache_dir, "images.sqlite3"), _max_bytes)
+    return _cache
+
+
+def content_hash(data: bytes) -> str:
+    """Hash of raw image bytes, used to share variants between URLs."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_url_meta(url: str) -> dict | None:
+    """
+    Look up what is known about an image URL.
+
+    Returns:
+        Dict with ``hash``, ``content_type``, ``etag``, ``last_modified`` and
+        ``checked_at``, or None on a miss
+    """
+    cache = _get_cache()
+    if cache is None:
+        return None
+    value = cache.get(f"url:{url}")
+    return json.loads(value) if value is not None else None
+
+
+def put_url_meta(
+    url: str,
+    image_hash: str,
+    content_type: str,
+    etag: str | None = None,
+    last_modified: str | None = None,
+) -> None:
+    """Record the response metadata of an image URL."""
+    cache = _get_cache()
+    if cache is None:
+        return
+    meta = {
+        "hash": image_hash,
+        "content_type": content_type,
+        "etag": etag,
+        "last_modified": last_modified,
+        "checked_at": time.time(),
+    }
+    cache.set(f"url:{url}", json.dumps(meta).encode("utf-8"))
+
+
+def is_fresh(meta: dict) -> bool:
+    """Whether URL metadata can be used without revalidating."""
+    return time.time() - meta.get("checked_at", 0) < FRESH_SECONDS
+
+
+def revalidation_headers(meta: dict) -> dict:
+    """Conditional request headers for a cached URL."""
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def _variant_key(image_hash: str, max_image_size: tuple[int, int]) -> str:
+    return f"variant:{image_hash}:{max_image_size[0]}x{max_image_size[1]}"
+
+
+def get_variant(image_hash: str, max_image_size: tuple[int, int]) -> bytes | None:
+    """Get compressed bytes of an image for one target size."""
+    cache = _get_cache()
+    if cache is None:
+        return None
+    value = cache.get(_variant_key(image_hash, max_image_size))
+    count("image_cache.hit" if value is not None else "image_cache.miss")
+    return value
+
+
+def put_variant(
+    image_hash: str, max_image_size: tuple[int, int], data: bytes
+) -> None:
+    """Store compressed bytes of an image for one target size."""
+    cache = _get_cache()
+    if cache is None:
+        return
+    cache.set(_variant_key(image_hash, max_image_size), data)
@@ -0,0 +1,239 @@
+"""Spans and counters describing where a run spends its time.
+
+Pipeline stages open spans (``with span("story.fetch", story_id=...)``) and
+bump counters (``count("item_cache.hit")``); HTTP requests, response bytes
+and statuses are counted by ``http_client`` through httpx event hooks.
+Spans nest through a context variable, so concurrent stories keep separate
+parents.
+
+At the end of a run ``print_summary`` shows a table per span name and
+counter, and ``export_json`` writes everything in the OTLP/JSON layout
+(``resourceSpans`` / ``resourceMetrics``) that OpenTelemetry collectors and
+viewers accept.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextvars
+import json
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Any
+
+import rich.console
+import rich.table
+
+SERVICE_NAME = "hackernews"
+
+# Finished spans, in the order they ended
+_spans: list[dict[str, Any]] = []
+_counters: collections.Counter[str] = collections.Counter()
+_trace_id = secrets.token_hex(16)
+
+_current_span: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def reset() -> None:
+    """Forget all spans and counters and start a new trace."""
+    global _trace_id
+    _spans.clear()
+    _counters.clear()
+    _trace_id = secrets.token_hex(16)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add ``value`` to a counter."""
+    _counters[name] += value
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Time a block as a span.
+
+    Args:
+        name: Span name such as ``"story.fetch"``
+        **attributes: Details recorded with the span; more can be added to
+            the yielded dict inside the block
+
+    Yields:
+        The span's attribute dict
+    """
+    span_id = secrets.token_hex(8)
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as err:
+        error = repr(err)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _spans.append(
+            {
+                "name": name,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "start_ns": start_ns,
+                "end_ns": start_ns + int(duration * 1e9),
+                "duration": duration,
+                "attributes": attributes,
+                "error": error,
+            }
+        )
+
+
+async def on_request(request) -> None:
+    """httpx request hook: count requests per host."""
+    count("http.requests")
+    count(f"http.requests.{request.url.host}")
+
+
+async def on_response(response) -> None:
+    """httpx response hook: count statuses and declared response bytes."""
+    count(f"http.status.{response.status_code // 100}xx")
+    length = response.headers.get("content-length")
+    if length and length.isdigit():
+        count("http.bytes", int(length))
+        count(f"http.bytes.{response.request.url.host}", int(length))
+
+
+def summary() -> dict[str, Any]:
+    """Aggregate spans per name.
+
+    Returns:
+        ``{"spans": {name: stats}, "counters": {name: value}}``. ``total_s``
+        sums overlapping spans, ``window_s`` is first start to last end.
+    """
+    grouped: dict[str, list[dict[str, Any]]] = collections.defaultdict(list)
+    for item in _spans:
+        grouped[item["name"]].append(item)
+
+    spans = {}
+    for name, items in grouped.items():
+        durations = [item["duration"] for item in items]
+        spans[name] = {
+            "count": len(items),
+            "errors": sum(1 for item in items if item["error"]),
+            "total_s": sum(durations),
+            "mean_s": sum(durations) / len(durations),
+            "max_s": max(durations),
+            "window_s": (
+                max(item["end_ns"] for item in items)
+                - min(item["start_ns"] for item in items)
+            )
+            / 1e9,
+        }
+    return {"spans": spans, "counters": dict(sorted(_counters.items()))}
+
+
+def print_summary(console: rich.console.Console | None = None) -> None:
+    """Print the run summary tables."""
+    console = console or rich.console.Console()
+    data = summary()
+
+    table = rich.table.Table(title="Run summary")
+    for column in ("span", "count", "errors", "total s", "mean s", "max s", "window s"):
+        table.add_column(column, justify="left" if column == "span" else "right")
+    for name, stats in sorted(data["spans"].items(), key=lambda kv: -kv[1]["window_s"]):
+        table.add_row(
+            name,
+            str(stats["count"]),
+            str(stats["errors"]),
+            f"{stats['total_s']:.2f}",
+            f"{stats['mean_s']:.3f}",
+            f"{stats['max_s']:.2f}",
+            f"{stats['window_s']:.2f}",
+        )
+    console.print(table)
+
+    if data["counters"]:
+        counters = rich.table.Table(title="Counters")
+        counters.add_column("counter")
+        counters.add_column("value", justify="right")
+        for name, value in data["counters"].items():
+            counters.add_row(name, f"{value:,}")
+        console.print(counters)
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)}
+        for key, value in attributes.items()
+        if value is not None
+    ]
+
+
+def to_otlp() -> dict[str, Any]:
+    """Spans and counters in the OTLP/JSON layout."""
+    resource = {
+        "attributes": _otlp_attributes(
+            {"service.name": SERVICE_NAME, "process.pid": os.getpid()}
+        )
+    }
+    scope = {"name": SERVICE_NAME}
+    spans = []
+    for item in _spans:
+        otlp_span = {
+            "traceId": _trace_id,
+            "spanId": item["span_id"],
+            "name": item["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(item["start_ns"]),
+            "endTimeUnixNano": str(item["end_ns"]),
+            "attributes": _otlp_attributes(item["attributes"]),
+            "status": (
+                {"code": 2, "message": item["error"]} if item["error"] else {"code": 1}
+            ),
+        }
+        if item["parent_id"]:
+            otlp_span["parentSpanId"] = item["parent_id"]
+        spans.append(otlp_span)
+
+    now = str(time.time_ns())
+    metrics = [
+        {
+            "name": name,
+            "sum": {
+                "dataPoints": [{"asInt": str(value), "timeUnixNano": now}],
+                "aggregationTemporality": 2,
+                "isMonotonic": True,
+            },
+        }
+        for name, value in sorted(_counters.items())
+    ]
+    return {
+        "resourceSpans": [
+            {"resource": resource, "scopeSpans": [{"scope": scope, "spans": spans}]}
+        ],
+        "resourceMetrics": [
+            {"resource": resource, "scopeMetrics": [{"scope": scope, "metrics": metrics}]}
+        ],
+    }
+
+
+def export_json(path: str) -> None:
+    """Write spans and counters as OTLP/JSON to ``path``."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(to_otlp(), fp, ensure_ascii=False, indent=1)
@@ -3,7 +3,9 @@ import os
 import json
 import dateutil
 import time
-import httpx
+
+import http_client
+from algolia_search import search_stories
 
 URL_ENDPOINT = "https://hn.algolia.com/api/v1"
 HEADERS = {
@@ -12,26 +14,7 @@ HEADERS = {
 
 
 def get_titles_byTimeRange(num_stories: int, start_time: int, end_time: int):
-    SEARCH_ENDPOINT = "/search"
-    search_url = URL_ENDPOINT + SEARCH_ENDPOINT
-
-    hits = []
-    page = 0
-    with httpx.Client() as client:
-        while len(hits) < num_stories:
-            params = {
-                "tags": "story",
-                "numericFilters": f"created_at_i>{start_time},created_at_i<{end_time}",
-                "page": page,
-            }
-            response = client.get(search_url, params=params)
-
-            # print(
-            #     f"Fetched {response.url} - {response.status_code}: {response.text if len(response.text) < 1000 else 'maybe normal'}"
-            # )
-
-            hits += response.json()["hits"]
-            page += 1
+    hits = http_client.run(search_stories(num_stories, start_time, end_time))
     # import json
 
     # json.dump(hits, open("outs/hits.json", "w"))
@@ -0,0 +1,113 @@
+"""Persistent cache for Algolia ``/items/`` and Firebase ``/item/`` responses.
+
+Items are keyed by source and item ID. How long an entry stays valid depends
+on the age of the item: fresh stories still collect comments and votes, while
+stories older than two weeks are archived by Hacker News and never change.
+
+By default the cache is ``cache/items.sqlite3`` under the current working
+directory. ``hacker_spider`` and ``hngtr`` take ``--cache-dir`` to move it;
+an empty string disables caching.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+import zlib
+
+from disk_cache import DiskCache
+from instrumentation import count
+
+DEFAULT_CACHE_DIR = "cache/"
+
+# (maximum item age, ttl) pairs in seconds, checked in order
+_AGE_TTLS = [
+    (60 * 60 * 24, 60 * 10),
+    (60 * 60 * 24 * 3, 60 * 60),
+    (60 * 60 * 24 * 14, 60 * 60 * 24),
+]
+
+_cache_dir: str | None = DEFAULT_CACHE_DIR
+_max_bytes = 512 * 1024 * 1024
+_cache: DiskCache | None = None
+
+
+def configure_item_cache(
+    cache_dir: str | None, max_bytes: int = 512 * 1024 * 1024
+) -> None:
+    """Set where items are cached.
+
+    Args:
+        cache_dir: Cache directory, or None / empty string to disable caching
+        max_bytes: Maximum cache size before LRU eviction
+    """
+    global _cache_dir, _max_bytes, _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+    _cache_dir = cache_dir or None
+    _max_bytes = max_bytes
+
+
+def _get_cache() -> DiskCache | None:
+    global _cache
+    if _cache is None and _cache_dir is not None:
+        _cache = DiskCache(os.path.join(_cache_dir, "items.sqlite3"), _max_bytes)
+    return _cache
+
+
+def item_ttl(item: dict) -> float | None:
+    """Compute how long an item may be cached, based on its age.
+
+    Args:
+        item: Algolia or Firebase item
+
+    Returns:
+        TTL in seconds, or None if the item is old enough to be immutable
+    """
+    created = item.get("created_at_i") or item.get("time")
+    if not created:
+        return _AGE_TTLS[0][1]
+
+    age = time.time() - created
+    for max_age, ttl in _AGE_TTLS:
+        if age < max_age:
+            return ttl
+    return None
+
+
+def get_cached_item(source: str, item_id: int | str) -> dict | None:
+    """Look up a cached item.
+
+    Args:
+        source: Response source, e.g. "algolia" or "firebase"
+        item_id: Hacker News item ID
+
+    Returns:
+        Cached item, or None on a miss
+    """
+    cache = _get_cache()
+    if cache is None:
+        return None
+    value = cache.get(f"{source}:{item_id}")
+    if value is None:
+        count(f"item_cache.{source}.miss")
+        return None
+    count(f"item_cache.{source}.hit")
+    return json.loads(zlib.decompress(value))
+
+
+def put_cached_item(source: str, item_id: int | str, item: dict) -> None:
+    """Store an item with an age-dependent TTL.
+
+    Args:
+        source: Response source, e.g. "algolia" or "firebase"
+        item_id: Hacker News item ID
+        item: Item to store
+    """
+    cache = _get_cache()
+    if cache is None or not item:
+        return
+    value = zlib.compress(json.dumps(item, separators=(",", ":")).encode("utf-8"))
+    cache.set(f"{source}:{item_id}", value, ttl=item_ttl(item))
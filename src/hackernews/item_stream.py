@@ -0,0 +1,184 @@
+"""Streaming download of Algolia ``/items/`` responses with early pruning.
+
+Mega-threads return multi-megabyte JSON. The response is parsed
+incrementally with ``ijson`` while it downloads, and comment levels the
+generator never renders are skipped without ever being materialized. In
+environments where ``ijson`` is missing (not synced with the lock file) the
+whole response is parsed and then pruned the same way, so both paths return
+identical items.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import http_client
+from hn_models import Comment, Story
+
+try:
+    import ijson
+except ImportError:  # 未同步依赖的环境，退回完整解析
+    ijson = None
+
+# Keys kept on the story and on comments; created_at_i drives the cache TTL
+STORY_KEYS = frozenset(Story._FIELDS + ("created_at_i", "children"))
+COMMENT_KEYS = frozenset(Comment._FIELDS + ("children",))
+
+
+def prune_item(item: dict, max_depth: int) -> dict:
+    """Prune a fully parsed item to what the streaming parser would keep.
+
+    Args:
+        item: Story item of the ``/items/`` response
+        max_depth: Number of comment levels that are rendered
+
+    Returns:
+        Item with only rendered keys and comment levels
+    """
+
+    def prune_comment(comment: dict, depth: int) -> dict:
+        pruned = {k: v for k, v in comment.items() if k in COMMENT_KEYS}
+        if depth + 1 < max_depth:
+            pruned["children"] = [
+                prune_comment(child, depth + 1)
+                for child in comment.get("children") or []
+            ]
+        else:
+            pruned["children"] = []
+        return pruned
+
+    pruned = {k: v for k, v in item.items() if k in STORY_KEYS}
+    if max_depth > 0:
+        pruned["children"] = [
+            prune_comment(child, 0) for child in item.get("children") or []
+        ]
+    else:
+        pruned["children"] = []
+    return pruned
+
+
+class PrunedItemBuilder:
+    """Builds a pruned item from ``ijson`` basic parse events.
+
+    Values of unused keys and ``children`` arrays below ``max_depth`` are
+    skipped as the events arrive.
+    """
+
+    def __init__(self, max_depth: int):
+        self.max_depth = max_depth
+        self.result: dict | None = None
+        # Open containers: (container, comment depth of the object, key)
+        self._stack: list[list[Any]] = []
+        # Nesting level of the value being skipped, 0 when not skipping
+        self._skip = 0
+
+    def _add(self, value: Any) -> None:
+        if not self._stack:
+            self.result = value
+            return
+        top = self._stack[-1]
+        if isinstance(top[0], list):
+            top[0].append(value)
+        else:
+            top[0][top[2]] = value
+
+    def _child_depth(self) -> int:
+        # Depth of an object about to be opened inside the current container
+        if not self._stack:
+            return -1
+        top = self._stack[-1]
+        if isinstance(top[0], list):
+            return top[1] + 1
+        return top[1]
+
+    def event(self, event: str, value: Any) -> None:
+        """Feed one ``(event, value)`` pair from ``ijson.basic_parse``."""
+        if self._skip:
+            if event in ("start_map", "start_array"):
+                self._skip += 1
+            elif event in ("end_map", "end_array"):
+                self._skip -= 1
+            return
+
+        if event == "map_key":
+            top = self._stack[-1]
+            top[2] = value
+            allowed = STORY_KEYS if top[1] < 0 else COMMENT_KEYS
+            if value not in allowed:
+                top[2] = None
+            elif value == "children" and top[1] + 1 >= self.max_depth:
+                # The whole children array is below the rendered depth
+                top[0]["children"] = []
+                top[2] = None
+            return
+
+        top_key_skipped = (
+            self._stack
+            and isinstance(self._stack[-1][0], dict)
+            and self._stack[-1][2] is None
+        )
+        if top_key_skipped and event not in ("end_map",):
+            if event in ("start_map", "start_array"):
+                self._skip = 1
+            return
+
+        if event == "start_map":
+            container: dict = {}
+            depth = self._child_depth()
+            self._add(container)
+            self._stack.append([container, depth, None])
+        elif event == "start_array":
+            container_list: list = []
+            depth = self._stack[-1][1] if self._stack else -1
+            self._add(container_list)
+            self._stack.append([container_list, depth, None])
+        elif event in ("end_map", "end_array"):
+            self._stack.pop()
+        elif value is None and self._stack and self._stack[-1][2] == "children":
+            # ``"children": null`` means no replies, as in ``prune_item``
+            self._add([])
+        else:
+            self._add(value)
+
+    def finish(self) -> dict:
+        """Return the built item, making sure ``children`` is always set."""
+        if not isinstance(self.result, dict):
+            raise ValueError("item response is not a JSON object")
+        self.result.setdefault("children", [])
+        return self.result
+
+
+async def fetch_pruned_item(url: str, max_depth: int, timeout: float = 25) -> dict:
+    """Download a story item, pruned to the rendered comment levels.
+
+    Args:
+        url: Algolia ``/items/<id>`` URL
+        max_depth: Number of comment levels that are rendered
+        timeout: Request timeout in seconds
+
+    Returns:
+        Pruned item, see ``prune_item``
+    """
+    client = http_client.get_client(url)
+
+    if ijson is None:
+        response = await client.get(url, timeout=timeout)
+        response.raise_for_status()
+        return prune_item(response.json(), max_depth)
+
+    builder = PrunedItemBuilder(max_depth)
+    events = ijson.sendable_list()
+    parser = ijson.basic_parse_coro(events, use_float=True)
+
+    async with client.stream("GET", url, timeout=timeout) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            parser.send(chunk)
+            for event, value in events:
+                builder.event(event, value)
+            del events[:]
+    parser.close()
+    for event, value in events:
+        builder.event(event, value)
+
+    return builder.finish()
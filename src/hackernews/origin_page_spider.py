@@ -7,9 +7,14 @@ the handlers/ subdirectory.
 
 from __future__ import annotations
 
-import asyncio
+from urllib.parse import urlparse
 
+from bs4 import BeautifulSoup
+
+import http_client
+from browser_pool import close_browser_pools
 from handlers import get_handler, list_registered_domains
+from instrumentation import span
 
 
 def get_pathable_text(text: str) -> str:
@@ -39,7 +44,7 @@ def get_pathable_text(text: str) -> str:
     return text[:50].strip()
 
 
-async def get_origin(url: str, headers: dict) -> tuple[str, bool]:
+async def get_origin(url: str, headers: dict) -> tuple[str | BeautifulSoup, bool]:
     """Fetch original page content using domain-specific handler.
 
     This function dispatches to the appropriate handler based on the URL's domain.
@@ -51,11 +56,17 @@ async def get_origin(url: str, headers: dict) -> tuple[str, bool]:
 
     Returns:
         Tuple of (content, is_error)
-        - content: str - Extracted HTML content
+        - content: str | BeautifulSoup - Extracted HTML content, possibly
+          already parsed (see html_document)
         - is_error: bool - True if extraction failed
     """
     handler = get_handler(url)
-    return await handler(url, headers)
+    with span(
+        "origin.fetch", handler=handler.__name__, host=urlparse(url).netloc
+    ) as attributes:
+        content, is_error = await handler(url, headers)
+        attributes["is_error"] = is_error
+    return content, is_error
 
 
 if __name__ == "__main__":
@@ -63,14 +74,18 @@ if __name__ == "__main__":
     print("Registered domains:", list_registered_domains())
 
     url = "https://x.com/Muffinisme/status/2023080167804137713"
-    blog_content = asyncio.run(
-        get_origin(
-            url,
-            {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            },
-        )
-    )
-    open("./outs/test.html", "w", encoding="utf-8").write(blog_content[0])
-    print(f"Content length: {len(blog_content[0])}")
+    async def fetch_once():
+        try:
+            return await get_origin(
+                url,
+                {
+                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+                },
+            )
+        finally:
+            await close_browser_pools()
+
+    blog_content = http_client.run(fetch_once())
+    open("./outs/test.html", "w", encoding="utf-8").write(str(blog_content[0]))
+    print(f"Content length: {len(str(blog_content[0]))}")
     print(f"Is error: {blog_content[1]}")
@@ -0,0 +1,125 @@
+"""Ordered producer/consumer pipeline built on ``asyncio.Queue`` stages.
+
+Items flow through a chain of stages, each with its own worker count.
+Results are yielded in input order, and the number of items in flight is
+bounded so finished results have to be consumed before new items enter.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from typing import Any
+
+StageFunc = Callable[[Any], Awaitable[Any]]
+
+# Marks the end of the input on a stage queue
+_DONE = object()
+
+
+class Stage:
+
+    def __init__(self, name: str, func: StageFunc, concurrency: int = 1):
+        """
+        Args:
+            name: Stage name, used in error messages
+            func: Coroutine function transforming one item
+            concurrency: Number of workers running this stage
+        """
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+
+
+async def run_pipeline(
+    items: Iterable[Any],
+    stages: list[Stage],
+    max_in_flight: int = 8,
+) -> AsyncIterator[Any]:
+    """Run every item through ``stages`` and yield the results in input order.
+
+    Args:
+        items: Input items
+        stages: Stages applied in order
+        max_in_flight: Maximum number of items between entering the first
+            stage and being yielded, bounds peak memory
+
+    Yields:
+        Output of the last stage for each item, in input order
+
+    Raises:
+        Exception: The first exception raised by any stage
+    """
+    queues = [asyncio.Queue(maxsize=max_in_flight) for _ in range(len(stages) + 1)]
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def feed() -> None:
+        for idx, item in enumerate(items):
+            await in_flight.acquire()
+            await queues[0].put((idx, item))
+        await queues[0].put(_DONE)
+
+    async def work(stage_idx: int, finished: list[int]) -> None:
+        stage = stages[stage_idx]
+        in_queue, out_queue = queues[stage_idx], queues[stage_idx + 1]
+        while True:
+            entry = await in_queue.get()
+            if entry is _DONE:
+                # Let sibling workers see the marker too, the last one forwards it
+                finished[0] += 1
+                if finished[0] == stage.concurrency:
+                    await out_queue.put(_DONE)
+                else:
+                    await in_queue.put(_DONE)
+                return
+
+            idx, item = entry
+            try:
+                result = await stage.func(item)
+            except Exception as err:
+                raise RuntimeError(f"pipeline stage {stage.name!r} failed") from err
+            await out_queue.put((idx, result))
+
+    tasks = [asyncio.create_task(feed())]
+    for stage_idx, stage in enumerate(stages):
+        finished = [0]
+        tasks.extend(
+            asyncio.create_task(work(stage_idx, finished))
+            for _ in range(stage.concurrency)
+        )
+
+    pending: dict[int, Any] = {}
+    next_idx = 0
+    getter = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.create_task(queues[-1].get())
+            done, _ = await asyncio.wait(
+                [getter, *tasks], return_when=asyncio.FIRST_COMPLETED
+            )
+            # A worker or the feeder stopped: surface its exception
+            for task in done:
+                if task is not getter:
+                    tasks.remove(task)
+                    task.result()
+            if getter not in done:
+                continue
+
+            entry = getter.result()
+            getter = None
+            if entry is _DONE:
+                break
+
+            idx, result = entry
+            pending[idx] = result
+            while next_idx in pending:
+                in_flight.release()
+                yield pending.pop(next_idx)
+                next_idx += 1
+    finally:
+        if getter is not None:
+            tasks.append(getter)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,424 @@
+"""Profiling mode of the command line entry points.
+
+``profiled(path)`` wraps a run and writes three files next to ``path``:
+
+- ``<name>.prof``: cProfile statistics, for ``snakeviz`` or ``python -m pstats``
+- ``<name>.folded``: sampled call stacks in the collapsed format read by
+  ``flamegraph.pl``, speedscope and inferno
+- ``<name>.loop.json``: event loop timing, i.e. per coroutine how long its
+  tasks ran on the loop versus waited, and every callback that blocked the
+  loop for longer than ``slow_callback`` seconds
+
+While a task runs, the loop can do nothing else: CPU work and blocking calls
+(BeautifulSoup, trafilatura, Pillow) inside a coroutine show up as running
+time and as slow callbacks. Work done in process pools (PDF rendering, image
+compression) is not profiled.
+
+Callbacks are timed by wrapping ``asyncio.events.Handle._run``, a CPython
+internal. Where it is missing, the loops of ``http_client.run`` are put in
+asyncio's debug mode instead: slow callbacks are still reported (as logged
+by asyncio), but there is no per-coroutine timing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import cProfile
+import json
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+
+import rich.console
+import rich.table
+
+import http_client
+
+# Seconds of CPU time between two stack samples
+SAMPLE_INTERVAL = 0.005
+
+# Callbacks blocking the loop for longer than this are reported
+DEFAULT_SLOW_CALLBACK = 0.1
+
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+# Message asyncio's debug mode logs for a slow callback
+_SLOW_CALLBACK_MESSAGE = "Executing %s took %.3f seconds"
+
+
+def _handle_run():
+    # The method every loop callback runs through, None if asyncio changed
+    handle = getattr(asyncio.events, "Handle", None)
+    run = getattr(handle, "_run", None)
+    return run if callable(run) else None
+
+
+def _frame_location(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _coroutine_location(coro) -> str | None:
+    # Innermost frame of an await chain outside asyncio itself, i.e. the
+    # line of our code where the task is suspended
+    location = None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        if not frame.f_code.co_filename.startswith(_ASYNCIO_DIR):
+            location = _frame_location(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return location
+
+
+class StackSampler:
+    """Samples the main thread's call stack every ``interval`` seconds of CPU time."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self._previous_handler = None
+
+    def _sample(self, signum, frame) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(
+                f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> bool:
+        """Start sampling; False where ``SIGPROF`` timers are unavailable."""
+        if not hasattr(signal, "setitimer"):
+            return False
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return True
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def write(self, path: str) -> None:
+        """Write the samples in the collapsed stack format."""
+        with open(path, "w", encoding="utf-8") as fp:
+            for stack, samples in self.stacks.most_common():
+                fp.write(f"{stack} {samples}\n")
+
+
+class _TaskStats:
+    __slots__ = ("coroutine", "started", "running", "steps", "longest")
+
+    def __init__(self, coroutine: str, started: float):
+        self.coroutine = coroutine
+        self.started = started
+        self.running = 0.0
+        self.steps = 0
+        self.longest = 0.0
+
+
+class _SlowCallbackLog(logging.Handler):
+    """Passes the slow callbacks logged by asyncio's debug mode to a monitor."""
+
+    def __init__(self, monitor: LoopMonitor):
+        super().__init__(logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.msg == _SLOW_CALLBACK_MESSAGE and len(record.args) == 2:
+            callback, duration = record.args
+            self.monitor._report_slow(
+                {"duration_s": round(duration, 4), "callback": callback}, callback
+            )
+        else:
+            # Other asyncio warnings would otherwise be swallowed by this handler
+            self.monitor.console.print(self.format(record), markup=False)
+
+
+class LoopMonitor:
+    """Times every callback run by asyncio event loops.
+
+    ``asyncio.events.Handle._run`` is wrapped while the monitor is installed,
+    so loops created later (e.g. by ``http_client.run``) are covered too.
+    Task steps are attributed to the task's coroutine. Without
+    ``Handle._run``, only the slow callbacks of ``http_client.run`` loops are
+    reported, through asyncio's debug mode.
+    """
+
+    def __init__(
+        self,
+        slow_callback: float = DEFAULT_SLOW_CALLBACK,
+        console: rich.console.Console | None = None,
+    ):
+        """
+        Args:
+            slow_callback: Seconds a callback may block the loop before it is
+                reported
+            console: Console slow callbacks are reported on
+        """
+        self.slow_callback = slow_callback
+        self.console = console or rich.console.Console()
+        self.debug_mode = False
+        self.busy = 0.0
+        self.callbacks = 0
+        self.slow: list[dict[str, Any]] = []
+        self.coroutines: dict[str, dict[str, Any]] = {}
+        self._tasks: dict[asyncio.Task, _TaskStats] = {}
+        self._original_run = None
+        self._log_handler: _SlowCallbackLog | None = None
+        self._installed_at = 0.0
+        self._removed_at = None
+
+    def install(self) -> None:
+        original_run = _handle_run()
+        if original_run is None:
+            self._install_debug_mode()
+            return
+
+        self._original_run = original_run
+        monitor = self
+
+        def _run(handle):
+            callback = handle._callback
+            task = getattr(callback, "__self__", None)
+            if not isinstance(task, asyncio.Task):
+                task = None
+            resumed_at = _coroutine_location(task.get_coro()) if task else None
+
+            start = time.perf_counter()
+            try:
+                return original_run(handle)
+            finally:
+                monitor._record(handle, task, resumed_at, time.perf_counter() - start)
+
+        asyncio.events.Handle._run = _run
+        self._installed_at = time.perf_counter()
+
+    def _install_debug_mode(self) -> None:
+        # asyncio 内部实现变化时退回调试模式，由事件循环自行报告慢回调
+        self.debug_mode = True
+        self._log_handler = _SlowCallbackLog(self)
+        logging.getLogger("asyncio").addHandler(self._log_handler)
+        http_client.set_loop_factory(self._new_debug_loop)
+        self._installed_at = time.perf_counter()
+
+    def _new_debug_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.new_event_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.slow_callback
+        return loop
+
+    def remove(self) -> None:
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+        if self._log_handler is not None:
+            logging.getLogger("asyncio").removeHandler(self._log_handler)
+            http_client.set_loop_factory(None)
+            self._log_handler = None
+        self._removed_at = time.perf_counter()
+        for task in list(self._tasks):
+            self._task_done(task)
+
+    def _record(self, handle, task, resumed_at, duration: float) -> None:
+        self.busy += duration
+        self.callbacks += 1
+
+        if task is not None:
+            stats = self._tasks.get(task)
+            first_step = stats is None
+            if first_step:
+                # The task was created just before its first step
+                coroutine = getattr(task.get_coro(), "__qualname__", task.get_name())
+                stats = self._tasks[task] = _TaskStats(
+                    coroutine, time.perf_counter() - duration
+                )
+            stats.running += duration
+            stats.steps += 1
+            stats.longest = max(stats.longest, duration)
+            if task.done():
+                self._task_done(task)
+            elif first_step:
+                task.add_done_callback(self._task_done)
+
+        if duration < self.slow_callback:
+            return
+        entry = {"duration_s": round(duration, 4)}
+        if task is not None:
+            entry.update(
+                task=task.get_name(),
+                coroutine=getattr(task.get_coro(), "__qualname__", None),
+                resumed_at=resumed_at,
+                suspended_at=_coroutine_location(task.get_coro()),
+            )
+            where = entry["resumed_at"] or entry["coroutine"]
+        else:
+            callback = handle._callback
+            entry["callback"] = getattr(callback, "__qualname__", repr(callback))
+            where = entry["callback"]
+        self._report_slow(entry, where)
+
+    def _report_slow(self, entry: dict[str, Any], where: str) -> None:
+        self.slow.append(entry)
+        self.console.print(
+            f"event loop blocked for {entry['duration_s']:.3f}s by {where}", markup=False
+        )
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        stats = self._tasks.pop(task, None)
+        if stats is None:
+            return
+        lifetime = time.perf_counter() - stats.started
+        total = self.coroutines.setdefault(
+            stats.coroutine,
+            {"tasks": 0, "steps": 0, "running_s": 0.0, "waiting_s": 0.0, "longest_step_s": 0.0},
+        )
+        total["tasks"] += 1
+        total["steps"] += stats.steps
+        total["running_s"] += stats.running
+        total["waiting_s"] += max(0.0, lifetime - stats.running)
+        total["longest_step_s"] = max(total["longest_step_s"], stats.longest)
+
+    def report(self) -> dict[str, Any]:
+        end = self._removed_at or time.perf_counter()
+        wall = end - self._installed_at
+        coroutines = sorted(
+            ({"coroutine": name, **stats} for name, stats in self.coroutines.items()),
+            key=lambda item: -item["running_s"],
+        )
+        # Debug mode only sees the slow callbacks, not the time on the loop
+        timed = not self.debug_mode
+        return {
+            "mode": "debug" if self.debug_mode else "handles",
+            "wall_s": round(wall, 4),
+            "busy_s": round(self.busy, 4) if timed else None,
+            "idle_s": round(max(0.0, wall - self.busy), 4) if timed else None,
+            "callbacks": self.callbacks if timed else None,
+            "slow_callback_s": self.slow_callback,
+            "coroutines": [
+                {k: round(v, 4) if isinstance(v, float) else v for k, v in item.items()}
+                for item in coroutines
+            ],
+            "slow_callbacks": sorted(self.slow, key=lambda item: -item["duration_s"]),
+        }
+
+
+def _print_report(
+    console: rich.console.Console, loop_report: dict[str, Any], stats: pstats.Stats, top: int
+) -> None:
+    slow = f"{len(loop_report['slow_callbacks'])} callbacks over {loop_report['slow_callback_s']}s"
+    if loop_report["mode"] == "debug":
+        console.print(
+            f"Event loop (asyncio debug mode, no per-coroutine timing): {slow}"
+        )
+    else:
+        console.print(
+            f"Event loop: [bold]{loop_report['busy_s']:.2f}s[/bold] running callbacks, "
+            f"{loop_report['idle_s']:.2f}s waiting for I/O, {slow}"
+        )
+
+        table = rich.table.Table(title="Coroutines by time on the loop")
+        for column in ("coroutine", "tasks", "steps", "running s", "waiting s", "longest step s"):
+            table.add_column(column, justify="left" if column == "coroutine" else "right")
+        for item in loop_report["coroutines"][:top]:
+            table.add_row(
+                item["coroutine"],
+                str(item["tasks"]),
+                str(item["steps"]),
+                f"{item['running_s']:.3f}",
+                f"{item['waiting_s']:.2f}",
+                f"{item['longest_step_s']:.3f}",
+            )
+        console.print(table)
+
+    if loop_report["slow_callbacks"]:
+        table = rich.table.Table(title="Slowest callbacks")
+        table.add_column("s", justify="right")
+        table.add_column("resumed at")
+        table.add_column("suspended at")
+        for item in loop_report["slow_callbacks"][:top]:
+            table.add_row(
+                f"{item['duration_s']:.3f}",
+                item.get("resumed_at") or item.get("callback") or "",
+                item.get("suspended_at") or "",
+            )
+        console.print(table)
+
+    table = rich.table.Table(title="Functions by own time")
+    for column in ("function", "calls", "own s", "cumulative s"):
+        table.add_column(column, justify="left" if column == "function" else "right")
+    rows = sorted(stats.stats.items(), key=lambda kv: -kv[1][2])[:top]
+    for (filename, line, name), (_, calls, own, cumulative, _) in rows:
+        table.add_row(
+            f"{name} ({os.path.basename(filename)}:{line})",
+            str(calls),
+            f"{own:.3f}",
+            f"{cumulative:.3f}",
+        )
+    console.print(table)
+
+
+@contextmanager
+def profiled(
+    path: str | None,
+    slow_callback: float = DEFAULT_SLOW_CALLBACK,
+    console: rich.console.Console | None = None,
+    top: int = 15,
+):
+    """Profile the block and write the results next to ``path``.
+
+    Args:
+        path: Profile file such as ``outs/run.prof``; None profiles nothing
+        slow_callback: Seconds a callback may block the event loop before it
+            is reported
+        console: Console for the report
+        top: Rows per report table
+    """
+    if not path:
+        yield
+        return
+
+    base = path[: -len(".prof")] if path.endswith(".prof") else path
+    directory = os.path.dirname(base)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    console = console or rich.console.Console()
+    monitor = LoopMonitor(slow_callback, console)
+    sampler = StackSampler()
+    profiler = cProfile.Profile()
+
+    monitor.install()
+    sampling = sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if sampling:
+            sampler.stop()
+        monitor.remove()
+
+        profiler.dump_stats(base + ".prof")
+        if sampling:
+            sampler.write(base + ".folded")
+        loop_report = monitor.report()
+        with open(base + ".loop.json", "w", encoding="utf-8") as fp:
+            json.dump(loop_report, fp, ensure_ascii=False, indent=1)
+
+        _print_report(console, loop_report, pstats.Stats(profiler), top)
+        written = [base + ".prof", base + ".loop.json"]
+        if sampling:
+            written.insert(1, base + ".folded")
+        console.print("Profile written to " + ", ".join(written))
@@ -0,0 +1,177 @@
+"""Retries with jittered backoff, per-story deadlines and hedged requests.
+
+Algolia and Firebase calls go through ``call_with_retries``. Transient
+failures (connection errors, timeouts, 429 and 5xx responses) are retried
+with "full jitter" exponential backoff. A story's fetching and ranking share
+one deadline (``deadline_scope``), so retries can never stall a run for
+longer than that. Optionally, a request that has not answered after
+``hedge_after`` seconds gets a duplicate, and whichever finishes first wins.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import random
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+import httpx
+
+from instrumentation import count
+
+T = TypeVar("T")
+
+# Policy settings, see ``configure_retries``
+_RETRY_CONFIG: dict[str, Any] = {
+    "attempts": 4,
+    "base_delay": 0.5,
+    "max_delay": 8.0,
+    "story_deadline": 180.0,
+    "hedge_after": None,
+}
+
+# Absolute ``time.monotonic()`` deadline of the current story, if any
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "retry_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The per-story deadline passed before a call succeeded."""
+
+
+def configure_retries(
+    attempts: int | None = None,
+    base_delay: float | None = None,
+    max_delay: float | None = None,
+    story_deadline: float | None = None,
+    hedge_after: float | None = None,
+) -> None:
+    """Configure the retry policy.
+
+    Args:
+        attempts: Tries per call, including the first one
+        base_delay: Backoff cap of the first retry in seconds, doubled per retry
+        max_delay: Largest backoff between two tries in seconds
+        story_deadline: Seconds a story may spend fetching and ranking, 0 for
+            no deadline
+        hedge_after: Seconds after which a slow call is duplicated, 0 to
+            disable hedging
+    """
+    updates = {
+        "attempts": attempts,
+        "base_delay": base_delay,
+        "max_delay": max_delay,
+        "story_deadline": story_deadline,
+        "hedge_after": hedge_after,
+    }
+    for key, value in updates.items():
+        if value is not None:
+            _RETRY_CONFIG[key] = value
+
+    # 0 switches the optional features off
+    for key in ("story_deadline", "hedge_after"):
+        _RETRY_CONFIG[key] = _RETRY_CONFIG[key] or None
+
+
+def story_deadline() -> float | None:
+    """Absolute deadline for a story starting now, or None if disabled."""
+    budget = _RETRY_CONFIG["story_deadline"]
+    return time.monotonic() + budget if budget else None
+
+
+@contextmanager
+def deadline_scope(deadline: float | None):
+    """Apply an absolute deadline to every ``call_with_retries`` in the block.
+
+    Tasks created inside the block inherit the deadline.
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def is_retryable(err: BaseException) -> bool:
+    """Whether a failed call is worth trying again."""
+    if isinstance(err, httpx.HTTPStatusError):
+        status = err.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(err, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def backoff_delay(retry: int) -> float:
+    """Full-jitter backoff before retry number ``retry`` (starting at 0)."""
+    cap = min(_RETRY_CONFIG["max_delay"], _RETRY_CONFIG["base_delay"] * 2**retry)
+    return random.uniform(0, cap)
+
+
+async def _hedged(func: Callable[[], Awaitable[T]], hedge_after: float) -> T:
+    # Start a duplicate if the first call is slow; the first success wins
+    tasks = {asyncio.ensure_future(func())}
+    done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+    if not done:
+        count("hedged_requests")
+        tasks.add(asyncio.ensure_future(func()))
+
+    error: BaseException | None = None
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_retries(
+    func: Callable[[], Awaitable[T]], description: str = "request"
+) -> T:
+    """Await ``func()`` and retry it on transient failures.
+
+    Args:
+        func: Creates a fresh awaitable for every try
+        description: What is being fetched, for log messages
+
+    Returns:
+        Result of the first successful try
+
+    Raises:
+        DeadlineExceeded: The story deadline passed
+        Exception: The last error, when it is not transient or tries run out
+    """
+    deadline = _deadline.get()
+    hedge_after = _RETRY_CONFIG["hedge_after"]
+    attempts = max(1, _RETRY_CONFIG["attempts"])
+
+    retry = 0
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"deadline passed while fetching {description}")
+
+        try:
+            attempt = _hedged(func, hedge_after) if hedge_after else func()
+            if remaining is None:
+                return await attempt
+            return await asyncio.wait_for(attempt, remaining)
+        except Exception as err:
+            if retry + 1 >= attempts or not is_retryable(err):
+                raise
+            delay = backoff_delay(retry)
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            count("retries")
+            print(f"{description} failed ({err!r}), retry {retry + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            retry += 1
@@ -0,0 +1,120 @@
+"""Append-only job journal for resumable runs.
+
+Every run writes one JSONL file under ``<story folder>/runs/``. The first
+line records the story IDs of the run, every further line records that one
+pipeline stage finished for one story. A run that crashes leaves a journal
+without a ``finish`` line, which ``RunJournal.resume`` picks up again.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import time
+
+JOURNAL_DIR_NAME = "runs"
+
+
+class RunJournal:
+
+    def __init__(self, path: str, hits: list, completed: dict[str, dict] | None = None):
+        """
+        Args:
+            path: Journal file path
+            hits: Story IDs of the run
+            completed: Story ID -> {stage name -> recorded data}
+        """
+        self.path = path
+        self.hits = hits
+        self.completed = completed or {}
+        self._fp = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def start(cls, target_dir: str, hits: list) -> RunJournal:
+        """Start the journal of a new run.
+
+        Args:
+            target_dir: Story folder the run writes into
+            hits: Story IDs of the run
+
+        Returns:
+            New journal
+        """
+        journal_dir = os.path.join(target_dir, JOURNAL_DIR_NAME)
+        os.makedirs(journal_dir, exist_ok=True)
+        run_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        journal = cls(os.path.join(journal_dir, f"{run_id}.jsonl"), list(hits))
+        journal._append({"event": "start", "hits": journal.hits})
+        return journal
+
+    @classmethod
+    def resume(cls, target_dir: str) -> RunJournal | None:
+        """Reopen the most recent unfinished run of a story folder.
+
+        Args:
+            target_dir: Story folder to look in
+
+        Returns:
+            The journal, or None if the last run finished or none exists
+        """
+        journal_dir = os.path.join(target_dir, JOURNAL_DIR_NAME)
+        if not os.path.isdir(journal_dir):
+            return None
+        names = sorted(n for n in os.listdir(journal_dir) if n.endswith(".jsonl"))
+        if not names:
+            return None
+
+        path = os.path.join(journal_dir, names[-1])
+        hits = None
+        completed: dict[str, dict] = {}
+        with open(path, "r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line may be cut off by the crash
+                    continue
+                event = record.get("event")
+                if event == "start":
+                    hits = record["hits"]
+                elif event == "stage":
+                    completed.setdefault(record["id"], {})[record["stage"]] = record
+                elif event == "finish":
+                    return None
+
+        if hits is None:
+            return None
+        print(f"resuming run {path}: {len(completed)} of {len(hits)} stories started")
+        return cls(path, hits, completed)
+
+    def _append(self, record: dict) -> None:
+        record["time"] = time.time()
+        self._fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fp.flush()
+
+    def stage_data(self, story_id: int | str, stage: str) -> dict | None:
+        """Data recorded when ``stage`` finished for a story, or None."""
+        return self.completed.get(str(story_id), {}).get(stage)
+
+    def record(self, story_id: int | str, stage: str, **data) -> None:
+        """Record that ``stage`` finished for a story.
+
+        Args:
+            story_id: Hacker News story ID
+            stage: Stage name
+            **data: JSON-serializable details needed to resume from here
+        """
+        record = {"event": "stage", "id": str(story_id), "stage": stage, **data}
+        self.completed.setdefault(str(story_id), {})[stage] = record
+        self._append(record)
+
+    def finish(self) -> None:
+        """Mark the run as complete and close the journal."""
+        self._append({"event": "finish"})
+        self.close()
+
+    def close(self) -> None:
+        """Close the journal file."""
+        if not self._fp.closed:
+            self._fp.close()
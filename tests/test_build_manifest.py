@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import build_manifest
+from build_manifest import BuildManifest, input_hash
+
+SETTINGS = {"max_depth": 3, "max_comments_per_level": [5, 2, 1]}
+
+
+@pytest.fixture
+def story_dir(tmp_path):
+    (tmp_path / "1.html").write_text("<html>discussion</html>", encoding="utf-8")
+    (tmp_path / "1_ori.html").write_text("<html>origin</html>", encoding="utf-8")
+    return tmp_path
+
+
+def record(manifest, story_hash="h1", url="https://example.com", origin_error=False):
+    manifest.record(
+        1,
+        story_hash,
+        "Title",
+        url,
+        {"html": "1.html", "origin": "1_ori.html"},
+        origin_error,
+        inline_images=False,
+    )
+
+
+def test_input_hash_ignores_key_order():
+    assert input_hash({"a": 1, "b": 2}, SETTINGS) == input_hash({"b": 2, "a": 1}, SETTINGS)
+
+
+def test_input_hash_changes_with_settings():
+    item = {"id": 1, "children": []}
+    assert input_hash(item, SETTINGS) != input_hash(item, {**SETTINGS, "max_depth": 2})
+
+
+def test_input_hash_changes_with_comment_order():
+    first, second = {"id": 2, "text": "a"}, {"id": 3, "text": "b"}
+    assert input_hash({"id": 1, "children": [first, second]}, SETTINGS) != input_hash(
+        {"id": 1, "children": [second, first]}, SETTINGS
+    )
+
+
+def test_recorded_story_is_reused_after_reload(story_dir):
+    record(BuildManifest(str(story_dir)))
+
+    manifest = BuildManifest(str(story_dir))
+    assert manifest.is_current(1, "h1")
+    assert manifest.is_current("1", "h1")
+    assert manifest.origin_reusable(1, "https://example.com", inline_images=False)
+
+
+def test_changed_input_is_not_current(story_dir):
+    manifest = BuildManifest(str(story_dir))
+    record(manifest)
+    assert not manifest.is_current(1, "h2")
+    assert not manifest.is_current(2, "h1")
+
+
+def test_missing_chapter_file_is_not_current(story_dir):
+    manifest = BuildManifest(str(story_dir))
+    record(manifest)
+    (story_dir / "1.html").unlink()
+    assert not manifest.is_current(1, "h1")
+    # The origin page does not depend on the discussion chapter
+    assert manifest.origin_reusable(1, "https://example.com", inline_images=False)
+
+
+def test_origin_is_refetched_when_url_mode_or_result_changed(story_dir):
+    manifest = BuildManifest(str(story_dir))
+    record(manifest)
+    assert not manifest.origin_reusable(1, "https://example.org", inline_images=False)
+    assert not manifest.origin_reusable(1, "https://example.com", inline_images=True)
+
+    record(manifest, origin_error=True)
+    assert not manifest.origin_reusable(1, "https://example.com", inline_images=False)
+
+
+def test_other_manifest_version_starts_empty(story_dir, monkeypatch):
+    record(BuildManifest(str(story_dir)))
+    monkeypatch.setattr(build_manifest, "MANIFEST_VERSION", build_manifest.MANIFEST_VERSION + 1)
+    assert BuildManifest(str(story_dir)).stories == {}
+
+
+def test_unreadable_manifest_starts_empty(story_dir):
+    (story_dir / build_manifest.MANIFEST_NAME).write_text("{not json", encoding="utf-8")
+    assert BuildManifest(str(story_dir)).stories == {}
+
+
+def test_save_is_valid_json_without_temp_file(story_dir):
+    record(BuildManifest(str(story_dir)))
+    path = story_dir / build_manifest.MANIFEST_NAME
+    assert json.loads(path.read_text(encoding="utf-8"))["stories"]["1"]["title"] == "Title"
+    assert not (story_dir / (build_manifest.MANIFEST_NAME + ".tmp")).exists()
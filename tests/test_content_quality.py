@@ -0,0 +1,62 @@
+from content_quality import (
+    BOILERPLATE_MAX_WORDS,
+    MIN_WORDS,
+    ContentScore,
+    score_content,
+)
+
+
+def article(words: int) -> str:
+    return "<p>" + " ".join(f"word{i}" for i in range(words)) + "</p>"
+
+
+def test_empty_content():
+    assert score_content(None) == ContentScore(0, 0.0, False)
+    assert score_content("") == ContentScore(0, 0.0, False)
+    assert not score_content(None).is_good
+
+
+def test_counts_visible_words_only():
+    content = (
+        "<html><head><style>p { color: red }</style></head><body>"
+        "<!-- hidden comment words --><script>var a = 1;</script>"
+        "<p>one two &amp; three</p></body></html>"
+    )
+    assert score_content(content).words == 3
+
+
+def test_cjk_characters_count_as_half_a_word():
+    assert score_content("<p>你好世界</p>").words == 2
+    assert score_content("<p>hello 你好</p>").words == 2
+
+
+def test_long_article_is_good():
+    score = score_content(article(MIN_WORDS))
+    assert score == ContentScore(MIN_WORDS, 0.0, False)
+    assert score.is_good
+
+
+def test_thin_page_is_not_good():
+    assert not score_content(article(MIN_WORDS - 1)).is_good
+
+
+def test_link_density():
+    links = " ".join(f'<a href="/{i}">link{i}</a>' for i in range(60))
+    score = score_content(f"<nav>{links}</nav>{article(40)}")
+    assert score.link_density == 60 / 100
+    assert not score.is_good
+
+
+def test_boilerplate_only_condemns_short_pages():
+    short = score_content("<h1>Access Denied</h1>" + article(MIN_WORDS))
+    assert short.boilerplate
+    assert not short.is_good
+
+    long = score_content("<h1>404 Not Found</h1>" + article(BOILERPLATE_MAX_WORDS))
+    assert long.boilerplate
+    assert long.is_good
+
+
+def test_boilerplate_without_words():
+    assert score_content("<p>!!!</p>") == ContentScore(0, 0.0, False)
+    assert score_content("<p>Just a moment...</p>").boilerplate
@@ -0,0 +1,85 @@
+import itertools
+
+import pytest
+
+import disk_cache
+from disk_cache import DiskCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Advance time by one second on every call, so access order is strict."""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(disk_cache.time, "time", lambda: float(next(ticks)))
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache" / "test.sqlite3"), max_bytes=30)
+    yield cache
+    cache.close()
+
+
+def test_get_returns_stored_value(cache):
+    cache.set("a", b"value")
+    assert cache.get("a") == b"value"
+    assert cache.get("missing") is None
+
+
+def test_replacing_a_value_updates_the_size(cache):
+    cache.set("a", b"x" * 10)
+    cache.set("a", b"x" * 4)
+    assert cache.total_bytes == 4
+
+
+def test_expired_entries_are_dropped(cache):
+    cache.set("a", b"value", ttl=0.5)
+    assert cache.get("a") is None
+    assert cache.total_bytes == 0
+
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    cache.set("a", b"x" * 10)
+    cache.set("b", b"x" * 10)
+    cache.set("c", b"x" * 10)
+    cache.get("a")  # b is now the least recently used
+
+    cache.set("d", b"x" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.get("d") is not None
+    assert cache.total_bytes == 30
+
+
+def test_expired_entries_are_evicted_before_live_ones(cache):
+    cache.set("a", b"x" * 10)
+    cache.set("stale", b"x" * 10, ttl=1.5)
+    cache.set("b", b"x" * 10)
+
+    cache.set("c", b"x" * 10)
+
+    assert cache.get("a") is not None
+    assert cache.get("stale") is None
+
+
+def test_value_larger_than_the_cache_is_not_kept(cache):
+    cache.set("a", b"x" * 10)
+    cache.set("big", b"x" * 40)
+    assert cache.get("big") is None
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_size_is_restored_when_reopened(tmp_path, clock):
+    path = str(tmp_path / "test.sqlite3")
+    cache = DiskCache(path)
+    cache.set("a", b"x" * 7)
+    cache.set("b", b"x" * 5)
+    cache.delete("a")
+    cache.close()
+
+    reopened = DiskCache(path)
+    assert reopened.total_bytes == 5
+    assert reopened.get("b") == b"x" * 5
+    reopened.close()
@@ -0,0 +1,129 @@
+import zipfile
+
+import pytest
+
+import hacker_spider
+from epub_writer import CONTAINER_XML, StreamingEpubBook
+from html_generator import STORY_CSS, STYLESHEET_NAME, stylesheet_link
+
+CHAPTER = "<html><head><title>t</title></head><body><p>{}</p></body></html>"
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    return tmp_path / "outs" / "book.epub"
+
+
+def write_book(path, **kwargs):
+    with StreamingEpubBook(str(path), "Weekly", "Author", **kwargs) as book:
+        book.add_item("style.css", "p { color: red }", "text/css", uid="style")
+        book.add_chapter("One", CHAPTER.format("first"), stylesheets=("style.css",))
+        book.add_chapter("Two & more", CHAPTER.format("second"))
+    return book
+
+
+def test_zip_layout(book_path):
+    write_book(book_path)
+
+    with zipfile.ZipFile(book_path) as archive:
+        first = archive.infolist()[0]
+        assert first.filename == "mimetype"
+        assert first.compress_type == zipfile.ZIP_STORED
+        assert archive.read("mimetype") == b"application/epub+zip"
+        assert archive.read("META-INF/container.xml").decode() == CONTAINER_XML
+        assert set(archive.namelist()) == {
+            "mimetype",
+            "META-INF/container.xml",
+            "EPUB/style.css",
+            "EPUB/chapter_000.xhtml",
+            "EPUB/chapter_001.xhtml",
+            "EPUB/nav.xhtml",
+            "EPUB/toc.ncx",
+            "EPUB/content.opf",
+        }
+
+        chapter = archive.read("EPUB/chapter_000.xhtml").decode()
+        assert "first" in chapter
+        assert 'href="style.css"' in chapter
+
+        opf = archive.read("EPUB/content.opf").decode()
+        assert '<itemref idref="chapter_0"/>' in opf
+        assert opf.index('idref="chapter_0"') < opf.index('idref="chapter_1"')
+        assert 'href="style.css" id="style" media-type="text/css"' in opf
+        assert "<dc:creator" in opf
+
+        assert "Two &amp; more" in archive.read("EPUB/nav.xhtml").decode()
+        assert "Two &amp; more" in archive.read("EPUB/toc.ncx").decode()
+
+
+def test_toc_section(book_path):
+    write_book(book_path, toc_title="Digest")
+    with zipfile.ZipFile(book_path) as archive:
+        assert "<span>Digest</span>" in archive.read("EPUB/nav.xhtml").decode()
+        assert 'id="section_0"' in archive.read("EPUB/toc.ncx").decode()
+
+
+def test_len_and_contains(book_path):
+    with StreamingEpubBook(str(book_path), "Weekly") as book:
+        book.add_item("style.css", "", "text/css")
+        assert len(book) == 0
+        assert book.add_chapter("One", CHAPTER.format(1)) == "chapter_000.xhtml"
+        assert len(book) == 1
+        assert "style.css" in book
+        assert "chapter_000.xhtml" in book
+        assert "missing.css" not in book
+
+
+def test_duplicate_file_name(book_path):
+    with StreamingEpubBook(str(book_path), "Weekly") as book:
+        book.add_chapter("One", CHAPTER.format(1), file_name="a.xhtml")
+        with pytest.raises(ValueError):
+            book.add_item("a.xhtml", "", "text/css")
+
+
+def test_close_is_idempotent(book_path):
+    book = write_book(book_path)
+    size = book_path.stat().st_size
+    book.close()
+    book.abort()
+    assert book_path.stat().st_size == size
+
+
+def test_abort_removes_the_file(book_path):
+    book = StreamingEpubBook(str(book_path), "Weekly")
+    book.add_chapter("One", CHAPTER.format(1))
+    book.abort()
+    assert not book_path.exists()
+    book.abort()
+
+
+def test_exception_in_block_aborts(book_path):
+    with pytest.raises(RuntimeError):
+        with StreamingEpubBook(str(book_path), "Weekly") as book:
+            book.add_chapter("One", CHAPTER.format(1))
+            raise RuntimeError("download failed")
+    assert book.closed
+    assert not book_path.exists()
+
+
+def test_construct_epub_book_links_the_shared_stylesheet(tmp_path):
+    linked = f"<html><head>\n{stylesheet_link()}\n</head><body>linked</body></html>"
+    respelled = (
+        f"<html><HEAD><Link HREF='{STYLESHEET_NAME}' rel='alternate Stylesheet'>"
+        "</HEAD><body>respelled</body></html>"
+    )
+    inline = f"<html><head><style>{STORY_CSS}</style></head><body>inline</body></html>"
+    unstyled = "<html><head><link rel='stylesheet' href='other.css'></head><body>x</body></html>"
+    output = tmp_path / "HackerNews.epub"
+
+    hacker_spider.construct_epub_book(
+        [("a", linked), ("b", respelled), ("c", inline), ("d", unstyled)],
+        output_filename=str(output),
+    )
+
+    with zipfile.ZipFile(output) as archive:
+        assert archive.read(f"EPUB/{STYLESHEET_NAME}").decode() == STORY_CSS
+        chapters = [archive.read(f"EPUB/story_{i:03d}.xhtml").decode() for i in range(4)]
+    for chapter in chapters[:3]:
+        assert f'href="{STYLESHEET_NAME}"' in chapter
+    assert "stylesheet" not in chapters[3]
@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+import email.utils
+
+import pytest
+
+import fetch_scheduler
+from fetch_scheduler import TokenBucket, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(fetch_scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_unlimited_bucket_never_waits(clock):
+    bucket = TokenBucket(None)
+    assert [bucket._delay() for _ in range(5)] == [0.0] * 5
+
+
+def test_bucket_spends_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2.0, burst=2)
+    assert bucket._delay() == 0.0
+    assert bucket._delay() == 0.0
+    assert bucket._delay() == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert bucket._delay() == 0.0
+    assert bucket._delay() == pytest.approx(0.5)
+
+
+def test_bucket_does_not_save_beyond_burst(clock):
+    bucket = TokenBucket(rate=1.0, burst=1)
+    assert bucket._delay() == 0.0
+    clock[0] += 60
+    assert bucket._delay() == 0.0
+    assert bucket._delay() == pytest.approx(1.0)
+
+
+def test_block_overrides_rate(clock):
+    bucket = TokenBucket(None)
+    bucket.block(30)
+    assert bucket._delay() == pytest.approx(30)
+    # A shorter block does not shorten the running one
+    bucket.block(5)
+    clock[0] += 10
+    assert bucket._delay() == pytest.approx(20)
+    clock[0] += 20
+    assert bucket._delay() == 0.0
+
+
+def test_acquire_sleeps_until_a_token_is_free(clock, monkeypatch):
+    slept = []
+
+    async def fake_sleep(delay):
+        slept.append(delay)
+        clock[0] += delay
+
+    monkeypatch.setattr(fetch_scheduler.asyncio, "sleep", fake_sleep)
+    bucket = TokenBucket(rate=4.0)
+
+    async def main():
+        for _ in range(3):
+            await bucket.acquire()
+
+    asyncio.run(main())
+    assert slept == [pytest.approx(0.25), pytest.approx(0.25)]
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 7 ") == 7.0
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "-5", "1.5"])
+def test_parse_retry_after_invalid(value):
+    assert parse_retry_after(value) is None
+
+
+def test_parse_retry_after_http_date():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    future = email.utils.format_datetime(now + datetime.timedelta(seconds=90), usegmt=True)
+    assert parse_retry_after(future) == pytest.approx(90, abs=2)
+
+    past = email.utils.format_datetime(now - datetime.timedelta(hours=1), usegmt=True)
+    assert parse_retry_after(past) == 0.0
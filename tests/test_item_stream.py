@@ -0,0 +1,91 @@
+import json
+import random
+
+import pytest
+
+from item_stream import PrunedItemBuilder, prune_item
+
+ijson = pytest.importorskip("ijson")
+
+
+def random_comment(rng, depth):
+    comment = {
+        "id": rng.randrange(10**8),
+        "author": rng.choice(["alice", "bob", None]),
+        "text": rng.choice(["<p>hi</p>", "ünïcode ✓", "", None]),
+        "points": rng.choice([None, 0, 3]),
+        "created_at": "2024-01-01T00:00:00.000Z",
+        "parent_id": rng.randrange(10**8),
+        # Unused keys holding containers must be skipped entirely
+        "options": {"nested": [1, {"children": [{"id": 1}]}], "score": 0.5},
+        "_tags": ["comment", ["x"]],
+    }
+    if depth < 5 and rng.random() < 0.8:
+        comment["children"] = [random_comment(rng, depth + 1) for _ in range(rng.randrange(4))]
+    else:
+        comment["children"] = rng.choice([[], None])
+    return comment
+
+
+def random_story(seed):
+    rng = random.Random(seed)
+    return {
+        "id": 40000000 + seed,
+        "title": "Story",
+        "url": "https://example.com/a",
+        "author": "carol",
+        "points": 321,
+        "created_at": "2024-01-01T00:00:00.000Z",
+        "created_at_i": 1704067200,
+        "story_id": 40000000 + seed,
+        "type": "story",
+        "options": [],
+        "children": [random_comment(rng, 0) for _ in range(rng.randrange(1, 6))],
+    }
+
+
+def build(raw: bytes, max_depth: int, chunk_size: int) -> dict:
+    builder = PrunedItemBuilder(max_depth)
+    events = ijson.sendable_list()
+    parser = ijson.basic_parse_coro(events, use_float=True)
+    for start in range(0, len(raw), chunk_size):
+        parser.send(raw[start : start + chunk_size])
+        for event, value in events:
+            builder.event(event, value)
+        del events[:]
+    parser.close()
+    for event, value in events:
+        builder.event(event, value)
+    return builder.finish()
+
+
+@pytest.mark.parametrize("max_depth", [0, 1, 2, 3, 6])
+@pytest.mark.parametrize("seed", range(8))
+def test_streaming_result_matches_prune_item(seed, max_depth):
+    story = random_story(seed)
+    raw = json.dumps(story, ensure_ascii=seed % 2 == 0).encode("utf-8")
+    expected = prune_item(json.loads(raw), max_depth)
+    assert build(raw, max_depth, chunk_size=7 + seed * 13) == expected
+
+
+def test_unused_keys_and_deep_levels_are_dropped():
+    story = random_story(0)
+    pruned = build(json.dumps(story).encode("utf-8"), 1, chunk_size=64)
+    assert "options" not in pruned and "type" not in pruned
+    assert pruned["created_at_i"] == story["created_at_i"]
+    for comment in pruned["children"]:
+        assert comment["children"] == []
+        assert "options" not in comment and "parent_id" not in comment
+
+
+def test_item_without_children_gets_an_empty_list():
+    assert build(b'{"id": 1, "title": "t"}', 3, chunk_size=4) == {
+        "id": 1,
+        "title": "t",
+        "children": [],
+    }
+
+
+def test_non_object_response_is_rejected():
+    with pytest.raises(ValueError):
+        build(b"[1, 2]", 3, chunk_size=4)
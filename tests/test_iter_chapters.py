@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import hacker_spider
+from retry_policy import DeadlineExceeded
+
+
+def item(story_id: int) -> dict:
+    return {
+        "id": story_id,
+        "title": f"Story {story_id}",
+        "url": f"https://example.com/{story_id}",
+        "author": "pg",
+        "children": [
+            {"id": story_id * 10 + i, "author": "a", "text": f"c{i}", "children": []}
+            for i in range(3)
+        ],
+    }
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    # Story 2 cannot be fetched, ranking story 3 runs out of time
+    ranked = []
+
+    async def fetch_story(hit_id):
+        if hit_id == 2:
+            raise DeadlineExceeded("deadline passed while fetching story 2")
+        return item(hit_id)
+
+    async def rank_story(story):
+        if story.id == 3:
+            raise DeadlineExceeded("deadline passed while fetching comment rank")
+        ranked.append(story.id)
+        story.prune(hacker_spider.generator.max_comments_per_level)
+
+    async def fetch_original_page(url):
+        return f"<html><body>{url}</body></html>", False
+
+    async def embed_images_in_html_string(html_text, url, image_dir=None):
+        return html_text
+
+    async def close_browser_pools():
+        pass
+
+    for name, func in [
+        ("fetch_story", fetch_story),
+        ("rank_story", rank_story),
+        ("fetch_original_page", fetch_original_page),
+        ("embed_images_in_html_string", embed_images_in_html_string),
+        ("close_browser_pools", close_browser_pools),
+    ]:
+        monkeypatch.setattr(hacker_spider, name, func)
+    return ranked
+
+
+def collect(hits, output_dir):
+    async def main():
+        return [
+            chapter
+            async for chapter in hacker_spider.iter_chapters(
+                hits, output_dir=f"{output_dir}/"
+            )
+        ]
+
+    return asyncio.run(main())
+
+
+def test_failed_stories_do_not_abort_the_run(offline, tmp_path):
+    chapters = collect([1, 2, 3, 4], tmp_path)
+
+    assert [title for title, _ in chapters] == [
+        "Story 1",
+        "Story 1",
+        "HN Story_1",
+        "HN Story_1",
+        "Story 3",
+        "Story 3",
+        "Story 4",
+        "Story 4",
+    ]
+    assert offline == [1, 4]
+
+    # Unfetchable story: error chapters for the origin page and the discussion
+    assert "ERROR" in chapters[2][1]
+    assert "could not be fetched: DeadlineExceeded" in chapters[3][1]
+
+    # Unranked story: comments are kept in Algolia order
+    assert "https://example.com/3" in chapters[4][1]
+    assert "c0" in chapters[5][1]
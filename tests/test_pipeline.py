@@ -0,0 +1,98 @@
+import asyncio
+import random
+
+import pytest
+
+from pipeline import Stage, run_pipeline
+
+
+def collect(items, stages, max_in_flight=8):
+    async def main():
+        return [result async for result in run_pipeline(items, stages, max_in_flight)]
+
+    return asyncio.run(main())
+
+
+def test_results_keep_input_order_despite_uneven_stage_times():
+    rng = random.Random(0)
+    delays = [rng.uniform(0, 0.01) for _ in range(40)]
+
+    async def slow_double(item):
+        await asyncio.sleep(delays[item])
+        return item * 2
+
+    async def add_one(item):
+        await asyncio.sleep(delays[-1 - item // 2])
+        return item + 1
+
+    stages = [Stage("double", slow_double, 6), Stage("add", add_one, 3)]
+    assert collect(range(40), stages) == [i * 2 + 1 for i in range(40)]
+
+
+def test_empty_input_yields_nothing():
+    async def identity(item):
+        return item
+
+    assert collect([], [Stage("identity", identity, 2)]) == []
+
+
+def test_items_in_flight_are_bounded():
+    running = 0
+    peak = 0
+
+    async def track(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        return item
+
+    async def release(item):
+        nonlocal running
+        running -= 1
+        return item
+
+    async def main():
+        results = []
+        async for result in run_pipeline(
+            range(30), [Stage("track", track, 10), Stage("release", release)], 4
+        ):
+            # A slow consumer must hold back the producer
+            await asyncio.sleep(0.002)
+            results.append(result)
+        return results
+
+    assert asyncio.run(main()) == list(range(30))
+    assert peak <= 4
+
+
+def test_stage_error_is_raised_with_the_stage_name():
+    async def fail_on_three(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    with pytest.raises(RuntimeError, match="'check'") as excinfo:
+        collect(range(10), [Stage("check", fail_on_three, 2)])
+    assert isinstance(excinfo.value.__cause__, ValueError)
+
+
+def test_stage_error_cancels_the_other_workers():
+    started = []
+    cancelled = []
+
+    async def hang_or_fail(item):
+        started.append(item)
+        if item == 0:
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+        return item
+
+    with pytest.raises(RuntimeError):
+        collect(range(4), [Stage("hang", hang_or_fail, 4)])
+    assert sorted(cancelled) == [1, 2, 3]
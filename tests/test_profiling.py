@@ -0,0 +1,72 @@
+import asyncio
+import io
+import time
+
+import pytest
+import rich.console
+
+import http_client
+import profiling
+from profiling import LoopMonitor
+
+
+async def blocking_story():
+    await asyncio.sleep(0)
+    time.sleep(0.05)
+
+
+async def main():
+    await asyncio.create_task(blocking_story())
+
+
+@pytest.fixture
+def output():
+    return io.StringIO()
+
+
+def monitored(output, slow_callback=0.02):
+    console = rich.console.Console(file=output, width=200)
+    monitor = LoopMonitor(slow_callback, console)
+    monitor.install()
+    try:
+        http_client.run(main())
+    finally:
+        monitor.remove()
+    return monitor.report()
+
+
+def test_slow_task_step_is_attributed_to_its_coroutine(output):
+    original_run = asyncio.events.Handle._run
+    report = monitored(output)
+
+    assert asyncio.events.Handle._run is original_run
+    assert report["mode"] == "handles"
+    assert report["busy_s"] >= 0.05
+    [slow] = report["slow_callbacks"]
+    assert slow["coroutine"] == "blocking_story"
+    assert "blocking_story" in slow["resumed_at"]
+    assert "event loop blocked for" in output.getvalue()
+    assert "blocking_story" in [item["coroutine"] for item in report["coroutines"]]
+
+
+def test_falls_back_to_debug_mode_without_handle_run(output, monkeypatch):
+    monkeypatch.setattr(profiling, "_handle_run", lambda: None)
+    original_run = asyncio.events.Handle._run
+    report = monitored(output)
+
+    assert asyncio.events.Handle._run is original_run
+    assert http_client._loop_factory is None
+    assert report["mode"] == "debug"
+    assert report["busy_s"] is None
+    assert report["coroutines"] == []
+    assert any(
+        "blocking_story" in slow["callback"] and slow["duration_s"] >= 0.05
+        for slow in report["slow_callbacks"]
+    )
+    assert "event loop blocked for" in output.getvalue()
+
+
+def test_fast_callbacks_are_not_reported(output):
+    report = monitored(output, slow_callback=1.0)
+    assert report["slow_callbacks"] == []
+    assert output.getvalue() == ""
@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import retry_policy
+from retry_policy import (
+    DeadlineExceeded,
+    backoff_delay,
+    call_with_retries,
+    configure_retries,
+    deadline_scope,
+    is_retryable,
+    story_deadline,
+)
+
+
+@pytest.fixture(autouse=True)
+def retry_config(monkeypatch):
+    # Restore the module defaults after every test; retries do not wait
+    monkeypatch.setattr(retry_policy, "_RETRY_CONFIG", dict(retry_policy._RETRY_CONFIG))
+    configure_retries(base_delay=0.0)
+
+
+def status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://hn.algolia.com/api/v1/items/1")
+    response = httpx.Response(status, request=request)
+    return httpx.HTTPStatusError(str(status), request=request, response=response)
+
+
+def flaky(*outcomes):
+    # Coroutine factory failing with the given errors, then returning "ok"
+    calls = []
+
+    async def func():
+        calls.append(len(calls))
+        if len(calls) <= len(outcomes):
+            raise outcomes[len(calls) - 1]
+        return "ok"
+
+    return func, calls
+
+
+@pytest.mark.parametrize(
+    "err, retryable",
+    [
+        (status_error(429), True),
+        (status_error(503), True),
+        (status_error(404), False),
+        (httpx.ConnectError("refused"), True),
+        (httpx.ReadTimeout("slow"), True),
+        (asyncio.TimeoutError(), True),
+        (ValueError("bad json"), False),
+    ],
+)
+def test_is_retryable(err, retryable):
+    assert is_retryable(err) is retryable
+
+
+def test_backoff_delay_is_capped(monkeypatch):
+    configure_retries(base_delay=0.5, max_delay=3.0)
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    assert [backoff_delay(retry) for retry in range(4)] == [0.5, 1.0, 2.0, 3.0]
+
+
+def test_configure_zero_disables_optional_features():
+    configure_retries(story_deadline=0, hedge_after=0)
+    assert story_deadline() is None
+    assert retry_policy._RETRY_CONFIG["hedge_after"] is None
+
+    configure_retries(story_deadline=30)
+    assert story_deadline() == pytest.approx(time.monotonic() + 30, abs=1)
+
+
+def test_transient_failures_are_retried():
+    func, calls = flaky(httpx.ConnectError("refused"), status_error(502))
+    assert asyncio.run(call_with_retries(func)) == "ok"
+    assert len(calls) == 3
+
+
+def test_permanent_failure_is_not_retried():
+    func, calls = flaky(status_error(404))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(call_with_retries(func))
+    assert len(calls) == 1
+
+
+def test_last_error_raised_when_attempts_run_out():
+    configure_retries(attempts=2)
+    func, calls = flaky(*[httpx.ConnectError(str(i)) for i in range(5)])
+    with pytest.raises(httpx.ConnectError, match="1"):
+        asyncio.run(call_with_retries(func))
+    assert len(calls) == 2
+
+
+def test_passed_deadline_skips_the_call():
+    func, calls = flaky()
+
+    async def main():
+        with deadline_scope(time.monotonic() - 1):
+            await call_with_retries(func, "story 1")
+
+    with pytest.raises(DeadlineExceeded, match="story 1"):
+        asyncio.run(main())
+    assert calls == []
+
+
+def test_deadline_cuts_a_hanging_call():
+    configure_retries(attempts=100)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        with deadline_scope(time.monotonic() + 0.1):
+            await call_with_retries(hang)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert time.monotonic() - started < 2
+
+
+def test_deadline_is_inherited_by_tasks():
+    func, calls = flaky()
+
+    async def main():
+        with deadline_scope(time.monotonic() - 1):
+            task = asyncio.create_task(call_with_retries(func))
+        await task
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+
+
+def test_hedged_request_wins_over_slow_one():
+    configure_retries(hedge_after=0.05)
+    cancelled = []
+
+    async def func():
+        if not cancelled:
+            cancelled.append(False)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled[0] = True
+                raise
+        return "hedge"
+
+    started = time.monotonic()
+    assert asyncio.run(call_with_retries(func)) == "hedge"
+    assert time.monotonic() - started < 2
+    assert cancelled == [True]
+
+
+def test_hedged_request_raises_when_both_fail():
+    configure_retries(attempts=1, hedge_after=0.01)
+
+    async def func():
+        await asyncio.sleep(0.05)
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError, match="broken"):
+        asyncio.run(call_with_retries(func))
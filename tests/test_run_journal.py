@@ -0,0 +1,80 @@
+import os
+
+from run_journal import JOURNAL_DIR_NAME, RunJournal
+
+
+def journal_files(target_dir):
+    return sorted(os.listdir(os.path.join(target_dir, JOURNAL_DIR_NAME)))
+
+
+def test_nothing_to_resume_without_a_journal(tmp_path):
+    assert RunJournal.resume(str(tmp_path)) is None
+
+
+def test_interrupted_run_is_resumed_with_its_stages(tmp_path):
+    journal = RunJournal.start(str(tmp_path), [1, "2", 3])
+    journal.record(1, "fetch")
+    journal.record(1, "render", file="1.html", title="One")
+    journal.record("2", "fetch")
+    journal.close()  # crash: no finish line
+
+    resumed = RunJournal.resume(str(tmp_path))
+    assert resumed is not None
+    assert resumed.hits == [1, "2", 3]
+    assert resumed.stage_data("1", "render")["file"] == "1.html"
+    assert resumed.stage_data(1, "render")["title"] == "One"
+    assert resumed.stage_data(2, "fetch") is not None
+    assert resumed.stage_data(2, "render") is None
+    assert resumed.stage_data(3, "fetch") is None
+    resumed.close()
+
+
+def test_resumed_run_appends_to_the_same_journal(tmp_path):
+    journal = RunJournal.start(str(tmp_path), [1, 2])
+    journal.record(1, "render", file="1.html")
+    journal.close()
+
+    resumed = RunJournal.resume(str(tmp_path))
+    resumed.record(2, "render", file="2.html")
+    resumed.close()
+
+    assert len(journal_files(tmp_path)) == 1
+    again = RunJournal.resume(str(tmp_path))
+    assert again.stage_data(1, "render") is not None
+    assert again.stage_data(2, "render") is not None
+    again.close()
+
+
+def test_finished_run_is_not_resumed(tmp_path):
+    journal = RunJournal.start(str(tmp_path), [1])
+    journal.record(1, "render", file="1.html")
+    journal.finish()
+
+    assert RunJournal.resume(str(tmp_path)) is None
+
+
+def test_line_cut_off_by_a_crash_is_skipped(tmp_path):
+    journal = RunJournal.start(str(tmp_path), [1, 2])
+    journal.record(1, "render", file="1.html")
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as fp:
+        fp.write('{"event": "stage", "id": "2", "sta')
+
+    resumed = RunJournal.resume(str(tmp_path))
+    assert resumed.stage_data(1, "render") is not None
+    assert resumed.stage_data(2, "render") is None
+    resumed.close()
+
+
+def test_only_the_latest_run_is_resumed(tmp_path):
+    journal_dir = tmp_path / JOURNAL_DIR_NAME
+    journal_dir.mkdir()
+    (journal_dir / "20240101-000000-000000.jsonl").write_text(
+        '{"event": "start", "hits": [1]}\n', encoding="utf-8"
+    )
+    (journal_dir / "20240102-000000-000000.jsonl").write_text(
+        '{"event": "start", "hits": [2]}\n{"event": "finish"}\n', encoding="utf-8"
+    )
+
+    # The newest run finished, older unfinished runs are not picked up
+    assert RunJournal.resume(str(tmp_path)) is None